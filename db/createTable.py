@@ -1,9 +1,14 @@
 import sqlite3
 import json
 import os
+import sys
 
-# 数据库文件路径（如果不存在会自动创建）
-db_file = './database.db'
+# 数据库文件路径（如果不存在会自动创建），与后端使用的 db/database.db 一致，不受运行目录影响
+db_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.db')
+
+# 复用后端的数据库迁移（只依赖sqlite3）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sau_backend'))
+from utils.migrations import run_migrations
 
 # 如果数据库已存在，则删除旧的表（可选）
 # if os.path.exists(db_file):
@@ -44,15 +49,25 @@ cursor.execute('''CREATE TABLE IF NOT EXISTS publish_task_records (
     account_name TEXT NOT NULL,           -- 账号名
     platform_name TEXT NOT NULL,          -- 平台名称
     platform_type INTEGER NOT NULL,       -- 平台类型
-    status TEXT NOT NULL DEFAULT '待发布',-- 发布状态：待发布、发布中、发布成功、发布失败
+    status TEXT NOT NULL DEFAULT '待发布',-- 发布状态：待发布、发布中、发布成功、发布失败、已取消、已跳过
     create_time DATETIME DEFAULT CURRENT_TIMESTAMP, -- 创建时间
     update_time DATETIME DEFAULT CURRENT_TIMESTAMP, -- 更新时间
-    error_msg TEXT                        -- 错误信息，发布失败时存储
+    error_msg TEXT,                       -- 错误信息，发布失败时存储
+    group_key TEXT,                       -- 发布队列单元标识，group_key相同的记录作为一个job执行
+    fallback_group TEXT,                  -- 创建时的队列单元标识，重试后不变，同组账号互为备选只需一个发布成功
+    payload TEXT,                         -- 发布参数(JSON)，供后台worker执行发布
+    start_time DATETIME,                  -- 开始上传时间
+    finish_time DATETIME,                 -- 上传结束时间
+    retry_count INTEGER DEFAULT 0,        -- 重试次数
+    idempotency_key TEXT                  -- 幂等键：记录id+重试次数
 )
 ''')
 
 # 提交更改
 conn.commit()
 print("✅ 表创建成功")
+
+# 执行数据库迁移（索引等），并记录数据库版本
+run_migrations(conn)
 # 关闭连接
 conn.close()
\ No newline at end of file
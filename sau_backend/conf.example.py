@@ -4,3 +4,56 @@ BASE_DIR = Path(__file__).parent.resolve()
 XHS_SERVER = "http://127.0.0.1:11901"
 LOCAL_CHROME_PATH = ""   # change me necessary！ for example C:/Program Files/Google/Chrome/Application/chrome.exe
 LOCAL_CHROME_HEADLESS = True
+
+# 浏览器池配置
+BROWSER_POOL_SIZE = 2               # 最多同时保持的浏览器实例数量
+BROWSER_POOL_MAX_CONTEXTS = 4       # 单个浏览器同时打开的上下文（账号）数量上限
+BROWSER_POOL_RECYCLE_AFTER = 50     # 单个浏览器累计分配多少个上下文后回收重启
+
+# 发布引擎并发配置
+PUBLISH_MAX_CONCURRENCY = 6         # 全局同时进行的上传数量上限
+PUBLISH_PLATFORM_CONCURRENCY = 2    # 单个平台同时进行的上传数量上限（平台配置中的max_concurrency优先）
+PUBLISH_ACCOUNT_CONCURRENCY = 1     # 单个账号同时进行的上传数量上限
+
+# 发布队列配置
+PUBLISH_QUEUE_WORKERS = 6           # 后台发布worker数量
+PUBLISH_QUEUE_POLL_INTERVAL = 5     # 队列为空时的轮询间隔（秒）
+
+# 上传流程配置
+UPLOAD_HUMANIZE = False             # 是否开启拟人化等待：开启后各步骤在就绪条件满足后额外等待固定时间，模拟人工操作
+
+# 数据库配置
+DB_BUSY_TIMEOUT = 5000              # 数据库被锁定时的等待时间（毫秒）
+DB_CACHED_STATEMENTS = 256          # 每个连接缓存的预编译SQL语句数量
+DB_POOL_SIZE = 8                    # 数据库连接池最多打开的连接数
+DB_POOL_TIMEOUT = 10                # 连接全部被占用时等待空闲连接的时间（秒）
+
+# 分片上传配置
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024     # 建议的分片大小（字节）
+UPLOAD_SESSION_EXPIRE_HOURS = 24        # 未完成的上传会话保留时间（小时），过期后清理临时文件
+
+# 素材预览配置
+FILE_CACHE_MAX_AGE = 365 * 24 * 3600    # 素材库原始文件（uuid命名且登记在file_records中，内容不会变化）的浏览器缓存时间（秒）
+USE_X_SENDFILE = False                  # 部署在nginx/apache后面时开启，由前端服务器直接发送文件（需配置X-Sendfile/X-Accel-Redirect）
+
+# 素材后台处理配置（封面帧、预览视频、时长分辨率）
+FFMPEG_PATH = "ffmpeg"                  # ffmpeg可执行文件路径
+FFPROBE_PATH = "ffprobe"                # ffprobe可执行文件路径
+MEDIA_PROCESS_WORKERS = 2               # 同时运行的ffmpeg处理任务数量
+MEDIA_PROCESS_TIMEOUT = 1800            # 单个ffmpeg命令的超时时间（秒）
+MEDIA_PREVIEW_HEIGHT = 360              # 预览视频高度（像素），封面帧为其2倍
+MEDIA_PREVIEW_BITRATE = "500k"          # 预览视频码率
+
+# 日志配置
+LOG_DIAGNOSE = False                    # 异常日志是否输出变量值（可能包含cookie等敏感信息，仅在调试时开启）
+
+# 账号有效性检测配置
+COOKIE_CHECK_CONCURRENCY = 8            # 同时检测的账号数量（滑动窗口）
+COOKIE_CHECK_TIMEOUT = 30               # 单个账号检测的截止时间（秒，不含等待浏览器槽位的时间），超时按结果未知处理
+COOKIE_CHECK_LOAD_TIMEOUT = 5000        # 打开个人中心后等待页面load事件的时间（毫秒）
+COOKIE_CHECK_HTTP_TIMEOUT = 10          # HTTP快速检测的请求超时时间（秒）
+
+# 账号健康巡检配置
+ACCOUNT_SWEEP_INTERVAL = 6 * 3600       # 巡检周期（秒），每个周期内所有账号错开检测一次，0为关闭巡检
+ACCOUNT_SWEEP_JITTER = 0.3              # 每个账号检测时间的随机抖动比例（相对于同平台相邻账号的间隔）
+ACCOUNT_DEAD_STREAK = 3                 # 连续检测失效达到该次数的账号视为已失效，发布时直接跳过
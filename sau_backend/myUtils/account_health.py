@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+账号健康巡检
+
+在后端进程内定期检测所有账号的cookie是否有效，不依赖用户打开账号页面或发布失败才发现账号失效。
+每个巡检周期(ACCOUNT_SWEEP_INTERVAL)内，同一平台的账号均匀分布在整个周期中，
+每个平台有各自的随机起始偏移，每个账号再加上随机抖动，避免同一时间集中访问同一个平台。
+检测结果由 account_status.save_result 写回 status、last_checked_at 和 fail_streak（超时或出错时只更新检测时间），并推送给SSE连接。
+"""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from conf import ACCOUNT_SWEEP_INTERVAL, ACCOUNT_SWEEP_JITTER
+from myUtils.account_status import refresh_accounts
+from utils.browser_pool import submit_to_browser_loop
+from utils.db import get_connection
+
+_sweeper = None
+
+
+def plan_sweep(accounts, interval, jitter=ACCOUNT_SWEEP_JITTER, rng=random):
+    """
+    计算一个巡检周期内每个账号的检测时间
+    :param accounts: user_info记录列表（需包含type）
+    :param interval: 巡检周期（秒）
+    :param jitter: 随机抖动比例，相对于同平台相邻账号的间隔
+    :return: 按检测时间排序的 (距周期开始的秒数, 账号) 列表
+    """
+    by_platform = defaultdict(list)
+    for account in accounts:
+        by_platform[account['type']].append(account)
+    schedule = []
+    for platform_accounts in by_platform.values():
+        gap = interval / len(platform_accounts)
+        # 每个平台随机错开起点，不同平台的检测不会对齐
+        offset = rng.uniform(0, gap)
+        for index, account in enumerate(platform_accounts):
+            delay = offset + index * gap + rng.uniform(-jitter, jitter) * gap / 2
+            schedule.append((min(max(delay, 0), interval), account))
+    schedule.sort(key=lambda item: item[0])
+    return schedule
+
+
+def _load_accounts():
+    with get_connection() as conn:
+        rows = conn.execute('SELECT id, type, filePath, last_checked_at FROM user_info').fetchall()
+    return [dict(row) for row in rows]
+
+
+def _load_account(account_id):
+    with get_connection() as conn:
+        row = conn.execute('SELECT id, type, filePath, last_checked_at FROM user_info WHERE id = ?',
+                           [account_id]).fetchone()
+    return dict(row) if row else None
+
+
+async def sweep_once(interval):
+    """
+    执行一个巡检周期：按计划的时间依次提交检测，本周期内已被其他途径检测过的账号跳过
+    """
+    started = time.monotonic()
+    # last_checked_at为SQLite CURRENT_TIMESTAMP写入的UTC时间，格式相同时可直接按字符串比较
+    cycle_start = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    accounts = await asyncio.to_thread(_load_accounts)
+    checked = 0
+    for delay, account in plan_sweep(accounts, interval):
+        await asyncio.sleep(max(0, started + delay - time.monotonic()))
+        account = await asyncio.to_thread(_load_account, account['id'])
+        if account is None or (account['last_checked_at'] or '') >= cycle_start:
+            continue
+        checked += len(refresh_accounts([account]))
+    print(f"✅ 账号巡检周期结束: 共 {len(accounts)} 个账号，提交检测 {checked} 个")
+
+
+async def _sweep_forever(interval):
+    while True:
+        started = time.monotonic()
+        try:
+            await sweep_once(interval)
+        except Exception as e:
+            print(f"❌ 账号巡检失败: {str(e)}")
+        await asyncio.sleep(max(0, started + interval - time.monotonic()))
+
+
+async def _start_sweeper(interval):
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep_forever(interval))
+        print(f"账号巡检已启动，周期 {interval} 秒")
+
+
+def start_account_sweeper(interval=ACCOUNT_SWEEP_INTERVAL):
+    """
+    在浏览器事件循环中启动账号健康巡检（重复调用无副作用），interval为0时不启动
+    """
+    if interval <= 0:
+        return
+    submit_to_browser_loop(_start_sweeper(interval)).result()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+账号有效性缓存
+
+账号状态缓存在 user_info 的 status 和 last_checked_at 列中，每个平台有各自的有效期(cookie_check.ttl)。
+读取账号列表时直接返回缓存的状态，只对过期的账号在后台重新检测(stale-while-revalidate)，
+每个账号检测完成后立即写回数据库，并通过订阅队列推送给SSE连接。
+连续检测失效的次数记录在 fail_streak 列，达到 ACCOUNT_DEAD_STREAK 的账号在发布时直接跳过；
+检测超时或出错（结果未知）不改变 status 和 fail_streak。
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from queue import Queue
+
+from conf import ACCOUNT_DEAD_STREAK
+from myUtils.auth import validate_accounts
+from newFileUpload.platform_configs import get_cookie_check, get_platform_key_by_type
+from utils.browser_pool import submit_to_browser_loop
+from utils.db import get_connection
+
+# 正在检测中的账号ID，避免同一账号重复提交
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# SSE订阅队列
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+
+
+def subscribe():
+    """
+    订阅账号状态更新，返回接收事件的队列
+    """
+    queue = Queue()
+    with _subscribers_lock:
+        _subscribers.add(queue)
+    return queue
+
+
+def unsubscribe(queue):
+    with _subscribers_lock:
+        _subscribers.discard(queue)
+
+
+def publish(event):
+    """
+    向所有订阅者推送一条事件（JSON字符串）
+    """
+    message = json.dumps(event, ensure_ascii=False)
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for queue in subscribers:
+        queue.put(message)
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def is_stale(account, now=None):
+    """
+    账号状态是否已过期：从未检测过，或距上次检测超过平台的有效期
+    :param account: user_info记录（需包含type和last_checked_at）
+    """
+    checked_at = _parse_time(account['last_checked_at'])
+    if checked_at is None:
+        return True
+    ttl = get_cookie_check(get_platform_key_by_type(account['type']))["ttl"]
+    # last_checked_at由SQLite CURRENT_TIMESTAMP写入，为UTC时间
+    return (now or datetime.utcnow()) - checked_at >= timedelta(seconds=ttl)
+
+
+def save_result(account_id, valid):
+    """
+    写回检测结果并推送给订阅者，检测有效时清零连续失效次数，失效时加1
+    :param valid: True为有效，False为确定失效，None为结果未知（超时、检测出错），只更新检测时间
+    """
+    with get_connection() as conn:
+        if valid is None:
+            # 结果未知时保留原状态和连续失效次数，只记录检测时间，避免在有效期内反复重试
+            conn.execute('UPDATE user_info SET last_checked_at = CURRENT_TIMESTAMP WHERE id = ?', [account_id])
+        else:
+            status = 1 if valid else 0
+            conn.execute('''
+                UPDATE user_info
+                SET status = ?, last_checked_at = CURRENT_TIMESTAMP,
+                    fail_streak = CASE WHEN ? THEN 0 ELSE COALESCE(fail_streak, 0) + 1 END
+                WHERE id = ?
+            ''', [status, status, account_id])
+        row = conn.execute('SELECT status, last_checked_at, fail_streak FROM user_info WHERE id = ?',
+                           [account_id]).fetchone()
+    publish({
+        "id": account_id,
+        "status": row['status'] if row else None,
+        "lastCheckedAt": row['last_checked_at'] if row else None,
+        "failStreak": row['fail_streak'] if row else None,
+    })
+
+
+def get_dead_account_files(file_paths):
+    """
+    从cookie文件列表中找出已失效的账号：状态为失效且连续失效次数达到 ACCOUNT_DEAD_STREAK
+    :param file_paths: cookiesFile下的cookie文件名列表
+    :return: 已失效账号的cookie文件名集合
+    """
+    file_paths = list(dict.fromkeys(str(file_path) for file_path in file_paths))
+    if not file_paths:
+        return set()
+    placeholders = ", ".join("?" for _ in file_paths)
+    with get_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT filePath FROM user_info
+            WHERE filePath IN ({placeholders}) AND status = 0 AND fail_streak >= ?
+        ''', [*file_paths, ACCOUNT_DEAD_STREAK]).fetchall()
+    return {row['filePath'] for row in rows}
+
+
+def refresh_accounts(accounts):
+    """
+    在浏览器事件循环中后台检测账号，已在检测中的账号跳过
+    :param accounts: user_info记录列表（需包含id、type、filePath）
+    :return: 本次提交检测的账号ID列表
+    """
+    with _refreshing_lock:
+        accounts = [account for account in accounts if account['id'] not in _refreshing]
+        account_ids = [account['id'] for account in accounts]
+        _refreshing.update(account_ids)
+    if not accounts:
+        return []
+
+    def on_result(account_id, valid):
+        try:
+            save_result(account_id, valid)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(account_id)
+
+    def on_done(future):
+        # 检测整体异常退出时，释放未完成的账号
+        with _refreshing_lock:
+            _refreshing.difference_update(account_ids)
+        if future.exception():
+            print(f"❌ 后台检测账号状态失败: {str(future.exception())}")
+
+    future = submit_to_browser_loop(validate_accounts(
+        [(account['id'], account['type'], account['filePath']) for account in accounts],
+        on_result=on_result
+    ))
+    future.add_done_callback(on_done)
+    return account_ids
+
+
+def refresh_stale_accounts(accounts, force=False):
+    """
+    只对状态已过期的账号提交后台检测
+    :param force: 为True时忽略有效期，检测全部账号
+    :return: 本次提交检测的账号ID列表
+    """
+    now = datetime.utcnow()
+    return refresh_accounts([account for account in accounts if force or is_stale(account, now)])
@@ -1,13 +1,27 @@
 import asyncio
 import configparser
+import json
 import os
+import time
+from urllib.parse import urlsplit
 
-from playwright.async_api import async_playwright
-from conf import BASE_DIR
+import httpx
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from conf import (BASE_DIR, COOKIE_CHECK_CONCURRENCY, COOKIE_CHECK_HTTP_TIMEOUT, COOKIE_CHECK_LOAD_TIMEOUT,
+                  COOKIE_CHECK_TIMEOUT)
 from utils.base_social_media import set_init_script
+from utils.browser_pool import get_browser_pool
 from utils.log import create_logger
 from pathlib import Path
-from newFileUpload.platform_configs import PLATFORM_CONFIGS
+from newFileUpload.platform_configs import get_cookie_check, get_login_url_prefixes, get_platform_config_by_type
+
+# HTTP检测最多跟随的重定向次数
+HTTP_MAX_REDIRECTS = 5
+HTTP_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36")
+
+# 每个事件循环共享一个HTTP客户端
+_http_clients = {}
 
 async def check_cookie(type, file_path):
     """
@@ -16,7 +30,7 @@ async def check_cookie(type, file_path):
         type: 平台类型 (1:小红书, 2:腾讯视频号, 3:抖音, 4:快手, 5:TikTok, 6:Instagram, 7:Facebook, 8:Bilibili, 9:Baijiahao)
         file_path: Cookie文件路径
     Returns:
-        bool: Cookie是否有效
+        bool | None: Cookie是否有效，无法确定（超时、检测出错）时为None
     """
     # 使用通用检测方法
     return await check_cookie_generic(type, file_path)
@@ -28,17 +42,13 @@ async def check_cookie_generic(type, file_path):
         type: 平台类型 (1:小红书, 2:腾讯视频号, 3:抖音, 4:快手, 5:TikTok, 6:Instagram, 7:Facebook, 8:Bilibili, 9:Baijiahao)
         file_path: Cookie文件路径
     Returns:
-        bool: Cookie是否有效
+        bool | None: True为有效，False为确定失效，None为无法确定（平台未配置、超时或检测出错）
     """
     # 根据类型获取平台配置
-    platform_config = None
-    for config in PLATFORM_CONFIGS.values():
-        if config.get("type") == type:
-            platform_config = config
-            break
+    platform_config = get_platform_config_by_type(type)
 
     if not platform_config:
-        return False
+        return None
 
     platform_name = platform_config.get("platform_name", "unknown")
     personal_url = platform_config.get("personal_url", "")
@@ -46,59 +56,250 @@ async def check_cookie_generic(type, file_path):
     #logger.info(f"开始检测平台 {platform_name} 的账号有效性")
     if not personal_url:
         logger.error(f"平台 {platform_name} 未配置 personal_url")
+        return None
+
+    # 按平台配置的检测级别逐级检测，检测过程受截止时间限制（等待浏览器池槽位的时间不计入）
+    # 超时和检测出错只说明本次没能检测，不代表账号失效
+    try:
+        return await _check_cookie_tiers(platform_config, file_path, logger)
+    except FileNotFoundError:
+        logger.error(f"[{platform_name}] cookie文件不存在: {file_path}")
+        return False
+    except asyncio.TimeoutError:
+        logger.error(f"[{platform_name}] 检测账号有效性超时（{COOKIE_CHECK_TIMEOUT}秒），本次结果未知")
+        return None
+    except Exception as e:
+        logger.error(f"[{platform_name}] 检测账号有效性时出错，本次结果未知: {str(e)}")
+        return None
+
+
+async def _check_cookie_tiers(platform_config, file_path, logger):
+    """
+    按 expiry -> http -> browser 的顺序（平台配置的tiers）检测，某一级得出结论后直接返回
+    各级检测共用 COOKIE_CHECK_TIMEOUT 的时间预算，超出时抛出 asyncio.TimeoutError
+    """
+    platform_name = platform_config["platform_name"]
+    personal_url = platform_config["personal_url"]
+    cookie_check = get_cookie_check(platform_name)
+    cookie_file = Path(BASE_DIR / "cookiesFile" / file_path)
+    with open(cookie_file, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+
+    loop = asyncio.get_running_loop()
+    budget = COOKIE_CHECK_TIMEOUT
+    for tier in cookie_check["tiers"]:
+        started = loop.time()
+        if tier == "expiry":
+            result = check_cookie_expiry(state, cookie_check["auth_cookies"])
+        elif tier == "http":
+            result = await asyncio.wait_for(
+                check_cookie_http(state, cookie_check["http_url"] or personal_url,
+                                  get_login_url_prefixes(platform_name), cookie_check["http_valid_text"]),
+                timeout=budget
+            )
+        else:
+            # 浏览器检测自行在获得上下文后开始计时
+            result = await _check_cookie_in_browser(platform_name, personal_url, file_path, logger, timeout=budget)
+        budget = max(budget - (loop.time() - started), 0)
+        if result is not None:
+            if result:
+                logger.success(f"[{platform_name}] 账号有效（{tier}检测）")
+            else:
+                logger.error(f"[{platform_name}] 账号已失效（{tier}检测）")
+            return result
+
+    # 配置的检测级别都无法得出结论（未配置browser检测），按有效处理
+    logger.warning(f"[{platform_name}] 无法确定账号状态，按有效处理")
+    return True
+
+
+def _cookie_expired(cookie, now):
+    # expires为-1或缺失表示会话cookie，不会过期
+    expires = cookie.get("expires")
+    return expires is not None and 0 < expires <= now
+
+
+def check_cookie_expiry(state, auth_cookies):
+    """
+    检查storage_state中cookie的过期时间（无网络请求）
+    Args:
+        state: storage_state字典
+        auth_cookies: 登录cookie名称列表，为空时检查所有cookie
+    Returns:
+        False: 登录cookie全部缺失或已过期；None: 无法得出结论
+    """
+    now = time.time()
+    cookies = state.get("cookies", [])
+    if auth_cookies:
+        cookies = [cookie for cookie in cookies if cookie.get("name") in auth_cookies]
+    if not cookies or all(_cookie_expired(cookie, now) for cookie in cookies):
         return False
+    return None
+
+
+def _cookie_header(cookies, url):
+    """
+    按域名和路径匹配请求URL，拼接Cookie请求头
+    """
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    path = parts.path or "/"
+    now = time.time()
+    pairs = []
+    for cookie in cookies:
+        domain = cookie.get("domain", "").lstrip(".")
+        if not domain or not (host == domain or host.endswith("." + domain)):
+            continue
+        if not path.startswith(cookie.get("path") or "/") or _cookie_expired(cookie, now):
+            continue
+        pairs.append(f"{cookie['name']}={cookie['value']}")
+    return "; ".join(pairs)
+
 
-    # 使用Playwright检测账号有效性
+def is_login_url(url, login_urls):
+    """
+    URL是否为平台的登录页：与任一登录地址域名相同，且路径以登录地址的路径开头（忽略查询参数）
+    Args:
+        url: 当前页面URL
+        login_urls: 平台登录页地址列表（见 platform_configs.get_login_url_prefixes）
+    """
+    target = urlsplit(url)
+    for login_url in login_urls:
+        login = urlsplit(login_url)
+        if target.netloc.lower() == login.netloc.lower() and target.path.startswith(login.path.rstrip("/") or "/"):
+            return True
+    return False
+
+
+def _get_http_client():
+    """
+    获取当前事件循环的共享HTTP客户端（连接池复用，不自动跟随重定向）
+    """
+    loop = asyncio.get_running_loop()
+    for closed_loop in [key for key in _http_clients if key.is_closed()]:
+        _http_clients.pop(closed_loop, None)
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _http_clients[loop] = httpx.AsyncClient(
+            timeout=COOKIE_CHECK_HTTP_TIMEOUT,
+            follow_redirects=False,
+            headers={"User-Agent": HTTP_USER_AGENT},
+        )
+    return client
+
+
+async def check_cookie_http(state, url, login_urls=(), valid_text=None):
+    """
+    带cookie直接请求页面，逐跳跟随重定向（每一跳按域名重新匹配cookie）
+    Args:
+        state: storage_state字典
+        url: 请求的URL
+        login_urls: 平台登录页地址列表，重定向到登录页视为未登录
+        valid_text: 登录后返回内容中必定包含的文本
+    Returns:
+        True/False: 有效/失效；None: 无法得出结论（如单页应用返回的页面骨架），交给下一级检测
+    """
+    cookies = state.get("cookies", [])
+    client = _get_http_client()
     try:
-        async with async_playwright() as playwright:
-            browser = await playwright.chromium.launch(headless=True)
-            context = await browser.new_context(storage_state=Path(BASE_DIR / "cookiesFile" / file_path))
-            context = await set_init_script(context)
-
-            # 创建一个新的页面
-            page = await context.new_page()
-
-            # 访问个人中心页面
-            await page.goto(personal_url, wait_until='domcontentloaded', timeout=60000)
-            await asyncio.sleep(2)
-
-            # 检查是否跳转到登录页面
-            current_url = page.url
-            #logger.info(f"[+]Current URL: {current_url}")
-
-            # 1.检查url是否包含登录相关的关键词
-            login_keywords = ["login", "signin", "auth", "登录", "登录页", "登录页面", "foryou"]
-            is_login_page = any(keyword in current_url.lower() for keyword in login_keywords)
-
-            if is_login_page:
-                logger.error(f"[{platform_name}] 账号未登录，URL跳转到了登录页面")
-                await context.close()
-                await browser.close()
+        for _ in range(HTTP_MAX_REDIRECTS + 1):
+            cookie_header = _cookie_header(cookies, url)
+            response = await client.get(url, headers={"Cookie": cookie_header} if cookie_header else None)
+            if is_login_url(str(response.url), login_urls):
                 return False
+            if not response.is_redirect:
+                break
+            url = str(response.url.join(response.headers.get("location", "")))
+        else:
+            return None
+    except httpx.HTTPError:
+        return None
 
-            # 根据不同平台的特征元素进行检查
-            # 2.检查页面内容是否包含登录相关的文本（douyin特征，就算没登录也可以到个人中心url）
-            if platform_name in ["douyin"]:
-                try:
-                    content = await page.content()
-                    # 检查是否包含登录按钮或登录提示
-                    login_texts = ["登录", "Sign in", "Log in", "登录/注册", "扫码登录"]
-                    for text in login_texts:
-                        if text in content:
-                            logger.error(f"[{platform_name}] 页面包含登录文本: {text}")
-                            await context.close()
-                            await browser.close()
-                            return False
-                except Exception as e:
-                    logger.warning(f"[{platform_name}] 读取页面内容失败: {str(e)}")
-
-            # 检查是否成功加载个人中心页面的特征元素
-
-            # 暂时使用通用的检查方法
-            logger.success(f"[{platform_name}] 账号有效")
-            await context.close()
-            await browser.close()
-            return True
-    except Exception as e:
-        logger.error(f"[{platform_name}] 检测账号有效性时出错: {str(e)}")
-        return False
\ No newline at end of file
+    if response.status_code in (401, 403):
+        return False
+    if response.status_code != 200 or not valid_text:
+        return None
+    return valid_text in response.text
+
+
+async def _check_cookie_in_browser(platform_name, personal_url, file_path, logger, timeout=COOKIE_CHECK_TIMEOUT):
+    """
+    在浏览器池的新上下文中打开个人中心页面，根据是否跳转到登录页判断cookie是否有效
+    截止时间从获得上下文后开始计算，浏览器池繁忙时排队等待槽位不会导致检测超时
+    """
+    pool = get_browser_pool(headless=True)
+    async with pool.new_context(storage_state=Path(BASE_DIR / "cookiesFile" / file_path)) as context:
+        return await asyncio.wait_for(_check_page(context, platform_name, personal_url, logger), timeout=timeout)
+
+
+async def _check_page(context, platform_name, personal_url, logger):
+    context = await set_init_script(context)
+
+    # 创建一个新的页面
+    page = await context.new_page()
+
+    # 访问个人中心页面
+    await page.goto(personal_url, wait_until='domcontentloaded')
+    # 等待页面load事件（代替固定等待），未登录时的前端跳转在此之前完成；超时后按当前URL判断
+    try:
+        await page.wait_for_load_state('load', timeout=COOKIE_CHECK_LOAD_TIMEOUT)
+    except PlaywrightTimeoutError:
+        pass
+
+    # 检查是否跳转到登录页面
+    current_url = page.url
+    #logger.info(f"[+]Current URL: {current_url}")
+
+    # 1.检查url是否为平台的登录页
+    is_login_page = is_login_url(current_url, get_login_url_prefixes(platform_name))
+
+    if is_login_page:
+        logger.error(f"[{platform_name}] 账号未登录，URL跳转到了登录页面")
+        return False
+
+    # 根据不同平台的特征元素进行检查
+    # 2.检查页面内容是否包含登录相关的文本（douyin特征，就算没登录也可以到个人中心url）
+    if platform_name in ["douyin"]:
+        try:
+            content = await page.content()
+            # 检查是否包含登录按钮或登录提示
+            login_texts = ["登录", "Sign in", "Log in", "登录/注册", "扫码登录"]
+            for text in login_texts:
+                if text in content:
+                    logger.error(f"[{platform_name}] 页面包含登录文本: {text}")
+                    return False
+        except Exception as e:
+            logger.warning(f"[{platform_name}] 读取页面内容失败: {str(e)}")
+
+    # 检查是否成功加载个人中心页面的特征元素
+
+    # 暂时使用通用的检查方法
+    return True
+
+
+async def validate_accounts(accounts, concurrency=COOKIE_CHECK_CONCURRENCY, on_result=None):
+    """
+    批量验证账号cookie：滑动窗口并发，任一账号完成后立即开始下一个，慢账号不会阻塞其他账号
+    应在浏览器事件循环中执行（submit_to_browser_loop），以复用常驻的浏览器池
+    Args:
+        accounts: (账号ID, 平台类型, cookie文件路径) 列表
+        concurrency: 同时验证的账号数量
+        on_result: 每个账号验证完成后立即调用的回调 on_result(账号ID, 是否有效)，无法确定时为None
+    Returns:
+        dict: 账号ID到检测结果（True/False/None）的字典
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(account_id, type, file_path):
+        async with semaphore:
+            try:
+                valid = await check_cookie_generic(type, file_path)
+            except Exception as e:
+                print(f"❌ 验证账号 (ID: {account_id}) 时出错: {str(e)}")
+                valid = None
+        if on_result is not None:
+            on_result(account_id, valid)
+        return account_id, valid
+
+    results = await asyncio.gather(*(check(*account) for account in accounts))
+    return dict(results)
@@ -1,11 +1,11 @@
 import asyncio
-import sqlite3
 import time
 from playwright.async_api import async_playwright
 from utils.base_social_media import set_init_script
 from pathlib import Path
 from conf import BASE_DIR, LOCAL_CHROME_PATH
 from newFileUpload.platform_configs import get_platform_key_by_type, PLATFORM_CONFIGS
+from utils.db import get_connection
 
 
 
@@ -140,11 +140,11 @@ async def unified_login_cookie_gen(type, id, status_queue):
                 await browser.close()
 
                 # 将账号信息插入数据库
-                with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+                with get_connection() as conn:
                     cursor = conn.cursor()
                     cursor.execute('''
-                        INSERT INTO user_info (type, userName, filePath, status)
-                        VALUES (?, ?, ?, ?)
+                        INSERT INTO user_info (type, userName, filePath, status, last_checked_at)
+                        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
                     ''', (type, id, cookie_file, 1))
                     conn.commit()
 
@@ -169,8 +169,7 @@ def delete_account(account_id):
     """
     try:
         # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # 查询要删除的记录
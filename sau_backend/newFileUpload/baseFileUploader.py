@@ -3,16 +3,21 @@
 通用多平台视频上传核心实现
 """
 import os
+import re
 import asyncio
+import time
 from datetime import datetime
-from playwright.async_api import Playwright, async_playwright
-from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS, BASE_DIR
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS, UPLOAD_HUMANIZE
 from utils.base_social_media import set_init_script
+from utils.browser_pool import get_browser_pool, run_in_browser_loop
 from utils.files_times import get_absolute_path
+from utils.media_metadata import get_file_type
 from utils.log import create_logger
 # 从platform_configs.py导入平台配置字典
-from .platform_configs import PLATFORM_CONFIGS, get_type_by_platform_key
-from myUtils.auth import check_cookie_generic
+from .platform_configs import PLATFORM_CONFIGS, get_login_url_prefixes, get_readiness, get_selectors, get_upload_detection
+from .selectorCache import get_selector_cache
+from myUtils.auth import is_login_url
 
 
 class BaseFileUploader(object):
@@ -25,9 +30,11 @@ class BaseFileUploader(object):
     text: 文件正文描述
     tags: 文件标签，多个标签用逗号隔开
     publish_date: 发布时间，格式为YYYY-MM-DD HH:MM:SS
+    cancel_event: 取消事件(asyncio.Event)，被设置后在下一个步骤边界中止上传
     """
     
-    def __init__(self, platform, account_file, file_type, file_path, title, text, tags, thumbnail_path, location, publish_date):
+    def __init__(self, platform, account_file, file_type, file_path, title, text, tags, thumbnail_path, location, publish_date,
+                 cancel_event=None):
         self.platform = platform
         self.account_file = account_file
         self.file_type = file_type
@@ -38,6 +45,7 @@ class BaseFileUploader(object):
         self.thumbnail_path = thumbnail_path
         self.location = location
         self.publish_date = publish_date
+        self.cancel_event = cancel_event
         self.local_executable_path = LOCAL_CHROME_PATH
         self.headless = LOCAL_CHROME_HEADLESS
         self.locator_base = None
@@ -54,26 +62,36 @@ class BaseFileUploader(object):
         self.personal_url = self.config["personal_url"]
         # 登录页面URL
         self.login_url = self.config["login_url"]
+        # 登录页地址前缀，创作者页面跳转到这些地址时视为cookie失效
+        self.login_url_prefixes = get_login_url_prefixes(self.platform)
         # 视频上传页面URL
         self.creator_video_url = self.config["creator_video_url"]
         # 图文上传页面URL
         self.creator_image_url = self.config["creator_image_url"]
 
-        # Selector lists
+        # Selector lists（导入时构建的只读选择器组，所有上传器共享）
+        self.selectors = get_selectors(self.platform)
         # 上传按钮选择器
-        self.upload_button_selectors = self.config["selectors"]["upload_button"]
+        self.upload_button_selectors = self.selectors["upload_button"]
         # 发布按钮选择器
-        self.publish_button_selectors = self.config["selectors"]["publish_button"]
+        self.publish_button_selectors = self.selectors["publish_button"]
         # 标题编辑器输入框选择器
-        self.editor_button_locators = self.config["selectors"]["title_editor"]
+        self.editor_button_locators = self.selectors["title_editor"]
         # 正文编辑器输入框选择器
-        self.textbox_selectors = self.config["selectors"]["textbox_selectors"]
+        self.textbox_selectors = self.selectors["textbox_selectors"]
         # 封面上传选择器
-        self.thumbnail_button_selectors = self.config["selectors"]["thumbnail_button"]
+        self.thumbnail_button_selectors = self.selectors["thumbnail_button"]
         # 封面完成确认选择器
-        self.thumbnail_finish_selectors = self.config["selectors"]["thumbnail_finish"]
+        self.thumbnail_finish_selectors = self.selectors["thumbnail_finish"]
+        # 封面图片上传输入框选择器（开启封面功能的平台必须配置）
+        self.thumbnail_upload_selectors = self.selectors.get("thumbnail_upload", ())
+        # 封面对话框关闭按钮选择器（开启封面功能的平台必须配置）
+        self.thumbnail_close_selectors = self.selectors.get("thumbnail_close", ())
         # 发布时间选择器
-        self.schedule_button_selectors = self.config["selectors"]["schedule_button"]
+        self.schedule_button_selectors = self.selectors["schedule_button"]
+        # 定时发布日期、时间输入框选择器（开启定时发布功能的平台必须配置，两者相同时表示日期和时间在同一个输入框）
+        self.date_input_selectors = self.selector_list("date_input")
+        self.time_input_selectors = self.selector_list("time_input")
         
         
         # constants
@@ -85,7 +103,7 @@ class BaseFileUploader(object):
         ]
         # 日志记录器
         self.logger = create_logger (self.platform_name, f'logs/{self.platform_name}.log')
-        # 是否跳过验证cookie有效性
+        # 是否跳过上传前的cookie文件检查（cookie是否失效在每次上传时都会检测）
         self.skip_cookie_verify = self.config["features"]["skip_cookie_verify"]
         # 是否支持标题
         self.title_supported = self.config["features"]["title"]
@@ -101,14 +119,24 @@ class BaseFileUploader(object):
         self.schedule_supported = self.config["features"]["schedule"]
         # 视频/图文发布状态
         self.publish_status = False
+        # 发布失败时的错误信息
+        self.error_msg = None
         #按钮等待可见超时时间
         self.button_visible_timeout = 30000
+        # 缓存命中时先单独等待上次命中的选择器的时间，超时后再等待所有候选选择器
+        self.cached_selector_timeout = 2000
         #网页加载超时时间
         self.page_load_timeout = 60000
-        # 检查间隔时间
-        self.check_interval = 2
+        # 上传完成检测配置
+        self.upload_detection = get_upload_detection(self.platform)
+        # 上传完成分段等待时间(秒)
+        self.upload_wait_slice = 5
         # 500ms等待超时时间
         self.wait_timeout_500ms = 500
+        # 上传各步骤的就绪条件
+        self.readiness = get_readiness(self.platform)
+        # 是否开启拟人化等待
+        self.humanize = UPLOAD_HUMANIZE
         # 登录等待超时时间
         self.login_wait_timeout = 10000
         # 最大发布尝试次数
@@ -148,13 +176,11 @@ class BaseFileUploader(object):
         """
         #1.打印本次发布的文件信息
         self.logger.info(f"{self.platform_name}将上传文件：{self.file_path}")
-        # 根据文件名后缀判断文件类型
-        # .jpg,.jpeg,.png,.webp 为图片文件
-        if self.file_path.suffix in ['.jpg', '.jpeg', '.png', '.webp']:
-            self.file_type = 1
-        # .mp4,.mov,.flv,.f4v,.mkv,.rm,.rmvb,.m4v,.mpg,.mpeg,.ts 为视频文件
-        elif self.file_path.suffix in ['.mp4', '.mov', '.flv', '.f4v', '.mkv','.rm', '.rmvb', '.m4v', '.mpg', '.mpeg', '.ts']:
-            self.file_type = 2
+        # 根据媒体信息判断文件类型：1 图文，2 视频
+        # 素材库文件的媒体信息缓存在file_records中，文件未变化时不重复探测；无法探测时按文件后缀判断
+        file_type = await asyncio.to_thread(get_file_type, self.file_path)
+        if file_type:
+            self.file_type = file_type
         else:
             self.logger.error(f"{self.platform_name}该文件类型暂不支持：{self.file_path.name}")
         self.logger.info(f"{self.platform_name} 文件类型：{self.file_type}")
@@ -162,122 +188,186 @@ class BaseFileUploader(object):
         #self.logger.info(f"{self.platform_name} 正文描述：{self.text}")
         self.logger.info(f"{self.platform_name} 标签：{self.tags}")
 
-        # 2.验证平台cookie是否有效(可选：如果已登录，可跳过验证)
+        # 2.cookie文件不存在时先获取cookie(可选：skip_cookie_verify为True时跳过)
+        # cookie是否有效不受该开关影响，每次上传打开创作者页面时都会检测（见upload_in_context）
         if not self.skip_cookie_verify:
             if not await self.platform_setup(handle=True):
                 raise Exception(f"{self.platform_name} Cookie验证失败")
 
         # 3.执行平台上传视频
-        async with async_playwright() as playwright:
-            upload_result = await self.upload(playwright)
-            if not upload_result:
-                self.logger.error(f"{self.platform_name}视频上传失败: {self.title}")
-                return False
-            else:
-                self.logger.info(f"{self.platform_name}视频上传成功: {self.title}")
-                return True
+        upload_result = await self.upload()
+        if not upload_result:
+            self.logger.error(f"{self.platform_name}视频上传失败: {self.title}")
+            if not self.error_msg:
+                self.error_msg = f"{self.platform_name}视频发布失败，已尝试 {self.max_publish_attempts} 次"
+            return False
+        else:
+            self.logger.info(f"{self.platform_name}视频上传成功: {self.title}")
+            return True
 
-    async def upload(self, playwright: Playwright) -> None:
+    async def upload(self) -> bool:
         """
         作用：执行单个视频上传到某个平台
         """
         try:
             self.logger.info(f'开始上传视频: {self.title}')
-            # step1.创建浏览器实例
-            browser = await playwright.chromium.launch(
-                headless=self.headless, 
-                executable_path=self.local_executable_path
-            )
-            self.logger.info(f"step1: {self.platform_name}浏览器实例创建成功")
+            # step1.从浏览器池获取预热的浏览器实例
+            pool = get_browser_pool(headless=self.headless, executable_path=self.local_executable_path)
+            self.logger.info(f"step1: {self.platform_name}获取浏览器池成功")
+
+            # step2.创建上下文并加载cookie（上下文在退出时自动关闭并归还浏览器池，取消时同样会执行）
+            async with pool.new_context(storage_state=f"{self.account_file}") as context:
+                context = await set_init_script(context)
+                self.logger.info(f"step2: {self.platform_name}浏览器上下文创建成功")
+                return await self.upload_in_context(context)
+        except Exception as e:
+            self.error_msg = str(e)
+            self.logger.error(f"{self.platform_name}视频上传失败: {str(e)}")
+            return False
 
+    async def upload_in_context(self, context) -> bool:
+        """
+        作用：在已加载cookie的浏览器上下文中执行上传步骤
+        """
+        # step3.创建新页面，导航到上传页面，明确指定等待domcontentloaded状态
+        self.check_cancelled()
+        page = await context.new_page()
+        #tiktok平台需要先切换到英文
+        if self.platform_name == "tiktok":
+            await self.change_language(page)
+        # 根据文件类型选择上传页面
+        if self.file_type == 1:
+            await page.goto(self.creator_image_url, wait_until='domcontentloaded', timeout=self.page_load_timeout)
+        else:
+            await page.goto(self.creator_video_url, wait_until='domcontentloaded', timeout=self.page_load_timeout)
+        await self.wait_ready(page, "page_loaded")
+        self.logger.info(f"step3: {self.platform_name}页面加载完成")
+        # instagram平台需要先点击ins登录按钮
+        if self.platform_name == "instagram":
+            await self.handle_instagram_login(page)
+        # cookie失效时创作者页面会跳转到登录页，直接中止上传（每次上传都检测）
+        if self.is_login_page(page):
+            raise Exception(f"{self.platform_name} Cookie已失效，页面跳转到了登录页: {page.url}")
 
-            # step2.创建上下文并加载cookie
-            context = await browser.new_context(storage_state=f"{self.account_file}")
-            context = await set_init_script(context)
-            self.logger.info(f"step2: {self.platform_name}浏览器上下文创建成功")
+        
+        self.check_cancelled()
+        # step4.选择基础定位器
+        await self.choose_base_locator(page)
+        self.logger.info(f"step4: {self.platform_name}基础定位器选择完成")
+
+        self.check_cancelled()
+        # step5.上传视频文件
+        upload_video_file_result = await self.upload_video_file(page)
+        if not upload_video_file_result:
+            raise Exception(f"{self.platform_name} 视频文件上传失败")
+        self.logger.info(f"step5: {self.platform_name}视频文件上传完成")
+
+        self.check_cancelled()
+        # step6.检测上传状态
+        detect_upload_status_result = await self.detect_upload_status(page)
+        if not detect_upload_status_result:
+            raise Exception(f"{self.platform_name} 上传状态检测失败")
+        self.logger.info(f"step6: {self.platform_name}上传状态检测完成")
+        
+        self.check_cancelled()
+        # step7.添加标题和标签
+        add_title_tags_result = await self.add_title_tags(page)
+        if not add_title_tags_result:
+            raise Exception(f"{self.platform_name} 标题和标签添加失败")
+        self.logger.info(f"step7: {self.platform_name}标题和标签添加完成")
+
+        self.check_cancelled()
+        # step8.上传视频封面
+        if self.thumbnail_supported:
+            await self.set_thumbnail(page)
+            self.logger.info(f"step8: {self.platform_name}视频封面上传完成")
+        else:
+            self.logger.info(f"step8: {self.platform_name}跳过设置缩略图")
 
+        self.check_cancelled()
+        # step9.添加地点
+        if self.location_supported and self.location:
+            await self.set_location(page)
+            self.logger.info(f"step9: {self.platform_name}地点添加完成")
+        else:
+            self.logger.info(f"step9: {self.platform_name}跳过添加地点")
+        
+        self.check_cancelled()
+        # step10.设置定时发布（如果需要）
+        if self.schedule_supported and self.publish_date != 0:
+            await self.set_schedule_time(page, self.publish_date)
+            self.logger.info(f"step10: {self.platform_name}定时发布设置完成")
+        else:
+            self.logger.info(f"step10: {self.platform_name}跳过定时发布")
+        
+        self.check_cancelled()
+        # step11.点击发布
+        await self.click_publish(page)
+        self.logger.info(f"step11：{self.platform_name}视频已点击发布按钮")
 
-            # step3.创建新页面，导航到上传页面，明确指定等待domcontentloaded状态
-            page = await context.new_page()
-            #tiktok平台需要先切换到英文
-            if self.platform_name == "tiktok":
-                await self.change_language(page)
-            # 根据文件类型选择上传页面
-            if self.file_type == 1:
-                await page.goto(self.creator_image_url, wait_until='domcontentloaded', timeout=self.page_load_timeout)
-            else:
-                await page.goto(self.creator_video_url, wait_until='domcontentloaded', timeout=self.page_load_timeout)
-            await asyncio.sleep(2)
-            self.logger.info(f"step3: {self.platform_name}页面加载完成")
-            # instagram平台需要先点击ins登录按钮
-            if self.platform_name == "instagram":
-                await self.handle_instagram_login(page)
+        # 等待发布请求完成，再保存cookie并关闭页面
+        await self.wait_ready(page, "published")
 
-            
-            # step4.选择基础定位器
-            await self.choose_base_locator(page)
-            self.logger.info(f"step4: {self.platform_name}基础定位器选择完成")
-
-            # step5.上传视频文件
-            upload_video_file_result = await self.upload_video_file(page)
-            if not upload_video_file_result:
-                raise Exception(f"{self.platform_name} 视频文件上传失败")
-            self.logger.info(f"step5: {self.platform_name}视频文件上传完成")
-
-            # step6.检测上传状态
-            detect_upload_status_result = await self.detect_upload_status(page)
-            if not detect_upload_status_result:
-                raise Exception(f"{self.platform_name} 上传状态检测失败")
-            self.logger.info(f"step6: {self.platform_name}上传状态检测完成")
-            
-            # step7.添加标题和标签
-            add_title_tags_result = await self.add_title_tags(page)
-            if not add_title_tags_result:
-                raise Exception(f"{self.platform_name} 标题和标签添加失败")
-            self.logger.info(f"step7: {self.platform_name}标题和标签添加完成")
-
-            # step8.上传视频封面
-            if self.thumbnail_supported:
-                await self.set_thumbnail(page)
-                self.logger.info(f"step8: {self.platform_name}视频封面上传完成")
-            else:
-                self.logger.info(f"step8: {self.platform_name}跳过设置缩略图")
-
-            # step9.添加地点
-            if self.location_supported and self.location:
-                await self.set_location(page)
-                self.logger.info(f"step9: {self.platform_name}地点添加完成")
-            else:
-                self.logger.info(f"step9: {self.platform_name}跳过添加地点")
-            
-            # step10.设置定时发布（如果需要）
-            if self.schedule_supported and self.publish_date != 0:
-                await self.set_schedule_time(page, self.publish_date)
-                self.logger.info(f"step10: {self.platform_name}定时发布设置完成")
-            else:
-                self.logger.info(f"step10: {self.platform_name}跳过定时发布")
-            
-            # step11.点击发布
-            await self.click_publish(page)
-            self.logger.info(f"step11：{self.platform_name}视频已点击发布按钮")
+        # step12.重新保存最新cookie
+        await context.storage_state(path=f"{self.account_file}")
+        self.logger.info(f"step12：{self.platform_name}cookie已更新")
 
-            # step12.重新保存最新cookie
-            await context.storage_state(path=f"{self.account_file}")
-            self.logger.info(f"step12：{self.platform_name}cookie已更新")
+        # step13.关闭页面，上下文由浏览器池负责关闭
+        await page.close()
+        self.logger.info(f"step13：{self.platform_name}浏览器页面已关闭")
 
-            # 等待视频发布状态更新，方便看发布状态
-            await asyncio.sleep(self.check_interval)  # close delay for look the video status
-            await asyncio.sleep(5)
+        return self.publish_status
 
-            # step13.关闭所有页面和浏览器上下文
-            await context.close()
-            await browser.close()
-            self.logger.info(f"step13：{self.platform_name}浏览器窗口已关闭")
+    def check_cancelled(self):
+        """
+        检查上传是否已被取消，已取消时抛出asyncio.CancelledError中止后续步骤
+        """
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.logger.warning(f"{self.platform_name}上传已取消: {self.title}")
+            raise asyncio.CancelledError(f"{self.platform_name}上传已取消")
 
-            return self.publish_status
-        except Exception as e:
-            self.logger.error(f"{self.platform_name}视频上传失败: {str(e)}")
-            return False
+    async def wait_or_cancelled(self, seconds):
+        """
+        等待指定秒数，期间被取消时立即中止
+        """
+        if self.cancel_event is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(self.cancel_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        self.check_cancelled()
+
+    async def wait_ready(self, page, stage):
+        """
+        等待平台配置的步骤就绪条件满足(见platform_configs.DEFAULT_READINESS)，超时只记录日志不中断上传
+        拟人化模式下，条件满足后再额外等待配置的固定时间
+        Args:
+            page: Playwright页面对象
+            stage: 步骤名
+        """
+        condition = self.readiness.get(stage, {})
+        timeout = condition.get("timeout")
+        try:
+            if condition.get("load_state"):
+                await page.wait_for_load_state(condition["load_state"], timeout=timeout)
+            if condition.get("selectors_key"):
+                selectors = self.selectors.get(condition["selectors_key"]) or []
+                if isinstance(selectors, str):
+                    selectors = [selectors]
+                state = condition.get("state", "visible")
+                if state in ("hidden", "detached"):
+                    # 消失类条件要求所有候选选择器都已消失
+                    base = self.locator_base or page
+                    await asyncio.gather(*(base.locator(selector).first.wait_for(state=state, timeout=timeout)
+                                           for selector in selectors))
+                elif selectors:
+                    await self.race_selectors(selectors, state=state, timeout=timeout, base=page)
+        except PlaywrightTimeoutError:
+            self.logger.warning(f"{self.platform_name}等待就绪条件超时: {stage}")
+        if self.humanize and condition.get("humanize_delay"):
+            await self.wait_or_cancelled(condition["humanize_delay"])
 
     async def choose_base_locator(self, page):
         """
@@ -335,31 +425,83 @@ class BaseFileUploader(object):
                     await new_page.close()
                     # 重新加载原页面
                     await page.reload()
-                    await asyncio.sleep(2)
+                    await self.wait_ready(page, "page_loaded")
             except Exception as e:
                 self.logger.error(f"[+]点击Instagram登录按钮失败: {str(e)}")
 
-    async def find_button(self, selector_list):
+    async def find_button(self, selector_list, timeout=None):
         """
-        通用的按钮查找方法
+        通用的按钮查找方法：并发检查所有候选选择器，返回第一个可见的按钮
+        上次命中的选择器存在时先短时间单独等待，未可见时再并发等待所有候选，命中结果会持久化缓存
         Args:
             selector_list: 所有可能的按钮选择器列表
+            timeout: 等待按钮可见的超时时间(毫秒)，默认为button_visible_timeout
         Returns:
             找到的按钮定位器对象，如果没找到则返回None
         """
-        for selector in selector_list:
-            # 检查当前选择器是否在页面上存在匹配的元素
-            count = await self.locator_base.locator(selector).count()
-            if count > 0:
-                # 异步等待元素可交互（避免元素未加载完成）
-                await self.locator_base.locator(selector).wait_for(state="visible", timeout=self.button_visible_timeout)
-                self.logger.info(f"找到按钮定位器: {selector}, 是否可见: {await self.locator_base.locator(selector).is_visible()}")
-                # 返回找到的按钮定位器
-                return self.locator_base.locator(selector)
-
-        # 如果所有选择器都没找到，返回None
-        self.logger.info("未找到任何按钮定位器")
-        return None
+        selector_cache = get_selector_cache()
+        timeout = self.button_visible_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        hit = False
+        found = None
+        try:
+            # 并发统计所有候选选择器的匹配数量，只需一轮往返
+            counts = await asyncio.gather(*(self.locator_base.locator(selector).count() for selector in selector_list))
+            candidates = [selector for selector, count in zip(selector_list, counts) if count > 0]
+            if not candidates:
+                self.logger.info("未找到任何按钮定位器")
+                return None
+
+            cached = selector_cache.get(self.platform, selector_list)
+            if cached in candidates:
+                try:
+                    await self.locator_base.locator(cached).first.wait_for(
+                        state="visible", timeout=min(self.cached_selector_timeout, timeout))
+                    found = cached
+                    hit = True
+                except PlaywrightTimeoutError:
+                    self.logger.info(f"缓存的按钮定位器未可见: {cached}，等待所有候选定位器")
+            if found is None:
+                if cached:
+                    # 缓存的选择器未命中，删除缓存，避免下次继续优先等待
+                    selector_cache.discard(self.platform, selector_list)
+                # 超时时间为剩余时间，至少1毫秒（0表示不超时）
+                remaining = max(timeout - (time.perf_counter() - started) * 1000, 1)
+                found = await self.race_selectors(candidates, timeout=remaining)
+            selector_cache.record(self.platform, selector_list, found)
+            self.logger.info(f"找到按钮定位器: {found}, 缓存命中: {hit}")
+            return self.locator_base.locator(found)
+        finally:
+            selector_cache.observe(self.platform, time.perf_counter() - started, hit, found is not None)
+
+    async def race_selectors(self, selectors, state="visible", timeout=None, base=None):
+        """
+        并发等待多个选择器达到指定状态，返回最先满足的选择器，其余等待被取消
+        全部超时时抛出最后一个异常
+        """
+        base = base or self.locator_base
+        timeout = self.button_visible_timeout if timeout is None else timeout
+        tasks = {
+            asyncio.ensure_future(base.locator(selector).first.wait_for(state=state, timeout=timeout)): selector
+            for selector in selectors
+        }
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    if task.exception() is None:
+                        winner = winner or tasks[task]
+                    else:
+                        error = task.exception()
+                if winner:
+                    return winner
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
 
     async def upload_video_file(self, page):
         """
@@ -368,9 +510,8 @@ class BaseFileUploader(object):
         返回：是否上传成功
         """
         try:
-            # 使用find_button方法查找上传按钮，支持中文和英文界面
-            await asyncio.sleep(self.check_interval)
-            await asyncio.sleep(5)
+            # 等待上传按钮挂载后，使用find_button方法查找上传按钮，支持中文和英文界面
+            await self.wait_ready(page, "upload_ready")
             upload_button = await self.find_button(self.upload_button_selectors)
             if not upload_button:
                 raise Exception("未找到上传图文/视频按钮")
@@ -388,43 +529,101 @@ class BaseFileUploader(object):
             self.logger.error(f"选择图文/视频文件失败: {str(e)}")
             return False
 
+    def get_upload_deadline(self):
+        """
+        按文件大小估算上传截止时间(秒)，避免上传卡住时一直占用浏览器
+        """
+        try:
+            size_mb = os.path.getsize(self.file_path) / (1024 * 1024)
+        except OSError:
+            size_mb = 0
+        return self.upload_detection["deadline_base"] + size_mb / self.upload_detection["min_speed_mb"]
+
+    async def log_upload_progress(self, page, last_progress):
+        """
+        从平台的上传进度元素中提取百分比，进度变化时记录日志
+        返回：最新进度文本
+        """
+        progress_selector = self.upload_detection["progress_selector"]
+        if not progress_selector:
+            return last_progress
+        try:
+            progress_element = page.locator(progress_selector).first
+            if await progress_element.count() == 0:
+                return last_progress
+            match = re.search(r'(\d+(?:\.\d+)?)\s*%', await progress_element.text_content() or "")
+            if match and match.group(1) != last_progress:
+                self.logger.info(f"图文/视频上传进度: {match.group(1)}%")
+                return match.group(1)
+        except Exception:
+            pass
+        return last_progress
+
+    async def wait_upload_done(self, page, timeout):
+        """
+        在timeout毫秒内等待上传完成条件满足：
+        配置了uploading_selector的平台等待上传中提示消失，其他平台等待发布按钮变为可点击
+        """
+        uploading_selector = self.upload_detection["uploading_selector"]
+        if uploading_selector:
+            await page.locator(uploading_selector).first.wait_for(state="detached", timeout=timeout)
+            return
+        publish_button = await self.find_button(self.publish_button_selectors, timeout=timeout)
+        if not publish_button:
+            raise PlaywrightTimeoutError("未找到发布按钮")
+        # trial点击只做可操作性检查(可见、稳定、可用)，不会真正点击
+        await publish_button.first.click(trial=True, timeout=timeout)
+
     async def detect_upload_status(self, page):
         """
         作用：检测上传状态
-        网页中相关按钮：发布按钮选择器（）
+        由页面事件驱动：监听上传请求的响应/失败事件跟踪进度，等待上传完成条件满足，
+        超过按文件大小估算的截止时间仍未完成则判定失败
         返回：是否上传成功
         """
-        while True:
-            try:
-                #快手平台比较特殊，没传完也可以点击发布按钮，需要等编辑画布按钮出现，才算是上传完毕
-                if self.platform_name == "kuaishou":
-                    number = await page.locator("text=上传中").count()
-                    if number == 0:
-                        self.logger.success("图文/视频上传完毕")
-                        break
-                    else:
-                        self.logger.info("正在上传图文/视频中...")
-                        await asyncio.sleep(self.check_interval)
-                else:
-                    # 其他平台，使用find_button方法查找发布按钮，发布按钮能点了就代表上传完毕了
-                    publish_button = await self.find_button(self.publish_button_selectors)               
-                    # 检查发布按钮是否可点击
-                    if publish_button and await publish_button.get_attribute("disabled") is None:
-                        self.logger.info("图文/视频上传完毕")
-                        break
-                    else:
-                        self.logger.info("正在上传图文/视频中...")
-                        await asyncio.sleep(self.check_interval)
-                        # 检查是否有错误需要重试，使用中文和英文选择器
-                        error_element = await self.find_button(self.error_selectors)
-                        if error_element:
-                            self.logger.info("  [-] found error while uploading now retry...")
-                            await self.handle_upload_error(page)
-            except Exception as e:
-                self.logger.info(f"  [-] video uploading... Error: {str(e)}")
-                await asyncio.sleep(self.check_interval)
-                return False
-        return True
+        response_patterns = self.upload_detection["response_patterns"]
+        upload_events = {"responses": 0, "failed": False}
+
+        def on_response(response):
+            if any(pattern in response.url for pattern in response_patterns):
+                upload_events["responses"] += 1
+
+        def on_request_failed(request):
+            if any(pattern in request.url for pattern in response_patterns):
+                upload_events["failed"] = True
+
+        page.on("response", on_response)
+        page.on("requestfailed", on_request_failed)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.get_upload_deadline()
+        last_progress = None
+        try:
+            while True:
+                self.check_cancelled()
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.error_msg = f"{self.platform_name}上传超时，已等待 {int(self.get_upload_deadline())} 秒"
+                    self.logger.error(self.error_msg)
+                    return False
+                try:
+                    # 分段等待，便于记录进度、处理上传失败和响应取消
+                    await self.wait_upload_done(page, min(remaining, self.upload_wait_slice) * 1000)
+                    self.logger.success(f"图文/视频上传完毕，共收到 {upload_events['responses']} 个上传响应")
+                    return True
+                except PlaywrightTimeoutError:
+                    last_progress = await self.log_upload_progress(page, last_progress)
+                    if upload_events["failed"]:
+                        self.logger.info("  [-] found error while uploading now retry...")
+                        upload_events["failed"] = False
+                        await self.handle_upload_error(page)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.info(f"  [-] video uploading... Error: {str(e)}")
+            return False
+        finally:
+            page.remove_listener("response", on_response)
+            page.remove_listener("requestfailed", on_request_failed)
 
     async def handle_upload_error(self, page):
         """
@@ -463,11 +662,11 @@ class BaseFileUploader(object):
                 # 清空现有内容
                 await page.keyboard.press("Control+A")
                 await page.keyboard.press("Delete")
-                await page.wait_for_timeout(self.wait_timeout_500ms)  # 等待500毫秒
+                await self.wait_ready(page, "text_input")
                     
                 # 输入标题
                 await page.keyboard.insert_text(self.title)
-                await page.wait_for_timeout(self.wait_timeout_500ms)  # 等待500毫秒
+                await self.wait_ready(page, "text_input")
 
 
             # 输入正文
@@ -479,11 +678,11 @@ class BaseFileUploader(object):
                 # 清空现有内容（如果有）
                 await page.keyboard.press("Control+A")
                 await page.keyboard.press("Delete")
-                await page.wait_for_timeout(self.wait_timeout_500ms)  # 等待500毫秒
+                await self.wait_ready(page, "text_input")
                         
                 # 输入正文
                 await page.keyboard.insert_text(self.text)
-                await page.wait_for_timeout(self.wait_timeout_500ms)  # 等待500毫秒
+                await self.wait_ready(page, "text_input")
             
             # 输入标签（跟在正文后面）
             if self.tags_supported and self.tags:
@@ -493,8 +692,7 @@ class BaseFileUploader(object):
                 for index, tag in enumerate(self.tags, start=1):
                     self.logger.info("Setting the %s tag" % index)
                     await page.keyboard.insert_text(f"#{tag} ")
-                    # 等待300毫秒
-                    await page.wait_for_timeout(self.wait_timeout_500ms)
+                    await self.wait_ready(page, "text_input")
             return True
         except Exception as e:
             self.logger.error(f"Failed to add title, text and tags: {str(e)}")
@@ -505,27 +703,38 @@ class BaseFileUploader(object):
         设置视频封面
         """
         if self.thumbnail_path:
-            self.logger.info(f"  [-] 将点击封面选择按钮: {await self.find_button(self.thumbnail_button_selectors).text_content()}")
-            await self.find_button(self.thumbnail_button_selectors).click()
-            self.logger.info(f"  [-] 将点击封面上传按钮: {await self.find_button(self.thumbnail_upload_selectors).text_content()}")
-            await self.find_button(self.thumbnail_upload_selectors).set_input_files(self.thumbnail_path)
-            await page.wait_for_timeout(2000)  # 等待2秒
-            self.logger.info(f"  [-] 将点击封面确认按钮: {await self.find_button(self.thumbnail_finish_selectors).text_content()}")
-            await self.find_button(self.thumbnail_finish_selectors).click()
-            self.logger.info(f"  [-] 将点击封面关闭按钮: {await self.find_button(self.thumbnail_close_selectors).text_content()}")
-            await self.find_button(self.thumbnail_close_selectors).click()
-            await page.wait_for_timeout(2000)  # 等待2秒
+            self.logger.info("  [-] 将点击封面选择按钮")
+            thumbnail_button = await self.find_button(self.thumbnail_button_selectors)
+            if not thumbnail_button:
+                raise Exception("未找到封面选择按钮")
+            await thumbnail_button.click()
+            self.logger.info(f"  [-] 将上传封面: {self.thumbnail_path}")
+            thumbnail_upload = await self.find_button(self.thumbnail_upload_selectors)
+            if not thumbnail_upload:
+                raise Exception("未找到封面上传输入框")
+            await thumbnail_upload.set_input_files(self.thumbnail_path)
+            await self.wait_ready(page, "thumbnail_dialog")
+            self.logger.info("  [-] 将点击封面确认按钮")
+            thumbnail_finish = await self.find_button(self.thumbnail_finish_selectors)
+            if thumbnail_finish:
+                await thumbnail_finish.click()
+            await self.wait_ready(page, "thumbnail_closed")
+            # 确认后对话框未自动关闭时点击关闭按钮
+            thumbnail_close = await self.find_button(self.thumbnail_close_selectors)
+            if thumbnail_close:
+                self.logger.info("  [-] 将点击封面关闭按钮")
+                await thumbnail_close.click()
         else:
             self.logger.info("  [-] 将点击封面选择按钮")
             thumbnail_button = await self.find_button(self.thumbnail_button_selectors)
             if thumbnail_button:
                 await thumbnail_button.click()
-            await page.wait_for_timeout(2000)  # 等待2秒
+            await self.wait_ready(page, "thumbnail_dialog")
             self.logger.info("  [-] 将点击封面确认按钮")
             thumbnail_finish =await self.find_button(self.thumbnail_finish_selectors)
             if thumbnail_finish:
                 await thumbnail_finish.click()
-            await page.wait_for_timeout(2000)  # 等待2秒
+            await self.wait_ready(page, "thumbnail_closed")
 
 
     async def set_location(self, page):
@@ -535,12 +744,20 @@ class BaseFileUploader(object):
         if not self.location:
             return
         await page.locator('div.semi-select span:has-text("输入地理位置")').click()
+        # 等待地点下拉框展开后再输入
+        await page.wait_for_selector('div[role="listbox"]', timeout=5000)
         await page.keyboard.press("Backspace")
-        await page.wait_for_timeout(2000)
-        await page.keyboard.type(location)
+        await page.keyboard.type(self.location)
         await page.wait_for_selector('div[role="listbox"] [role="option"]', timeout=5000)
         await page.locator('div[role="listbox"] [role="option"]').first.click()
     
+    def selector_list(self, key):
+        """
+        获取平台配置的选择器组，单个选择器字符串转换为只有一个元素的元组，未配置时返回空元组
+        """
+        selectors = self.selectors.get(key, ())
+        return (selectors,) if isinstance(selectors, str) else selectors
+
     async def set_schedule_time(self, page, publish_date):
         """
         设置定时发布时间
@@ -559,8 +776,17 @@ class BaseFileUploader(object):
             publish_datetime = datetime.fromtimestamp(publish_date)
 
         # 设置日期和时间
-        await page.fill('[aria-label="Date"]', publish_datetime.strftime(self.date_format))
-        await page.fill('[aria-label="Time"]', publish_datetime.strftime(self.time_format))
+        date_input = await self.find_button(self.date_input_selectors)
+        if not date_input:
+            raise Exception("未找到定时发布日期输入框")
+        if self.time_input_selectors == self.date_input_selectors:
+            await date_input.first.fill(publish_datetime.strftime(f"{self.date_format} {self.time_format}"))
+        else:
+            time_input = await self.find_button(self.time_input_selectors)
+            if not time_input:
+                raise Exception("未找到定时发布时间输入框")
+            await date_input.first.fill(publish_datetime.strftime(self.date_format))
+            await time_input.first.fill(publish_datetime.strftime(self.time_format))
         
         self.logger.info(f"  [-] 定时发布时间设置为: {publish_datetime}")
 
@@ -583,7 +809,6 @@ class BaseFileUploader(object):
                 publish_button = await self.find_button(self.publish_button_selectors)
                 if publish_button:
                     await publish_button.click()
-                    await asyncio.sleep(self.check_interval)
                     # tiktok平台发布时要检查并处理版权检查弹窗
                     if self.platform_name == "tiktok":
                         # 等待版权检查弹窗出现
@@ -593,33 +818,20 @@ class BaseFileUploader(object):
                             # 使用更精确的选择器点击Post now按钮
                             await self.locator_base.locator('button.TUXButton.TUXButton--primary div.TUXButton-label >> text=Post now').click()
                             self.logger.info("  [-]已点击Post now按钮")
-                            # 等待操作完成
-                            await page.wait_for_timeout(2000)
                         except Exception as e:
                             self.logger.warning(f"  [-]未检测到版权检查弹窗或点击失败: {str(e)}")
 
 
-                # 步骤2: 等待视频处理完成（通过检查上传按钮重新出现）
+                # 步骤2: 等待发布完成（页面离开发布页，或上传按钮重新出现）
                 self.logger.info("等待发布完成...")
-                current_url = page.url
-                self.logger.info(f"当前url: {current_url}")
-                #ks平台、视频号平台等待发布完成的逻辑：如果当前url已不在发布页面，说明发布成功
                 if self.file_type == 1:
                     target_url = self.creator_image_url
                 else:
                     target_url = self.creator_video_url
-                if target_url not in current_url:
-                    self.publish_status = True
-                    break
-                #xx平台等待发布完成：尝试查找上传按钮，如果上传按钮可见，也能说明发布成功
-                upload_button = await self.find_button(self.upload_button_selectors)
-                if upload_button:
-                    self.logger.info(f"发布尝试 {attempt}，上传按钮可见状态: {await upload_button.is_visible()}")
-                    await upload_button.wait_for(state='visible', timeout=self.button_visible_timeout)
-                    self.publish_status = True
-                    break
-                else:
-                    self.logger.info(f"发布尝试 {attempt}，未找到上传按钮")
+                result = await self.wait_publish_result(page, target_url)
+                self.logger.info(f"发布尝试 {attempt}，{result}，当前url: {page.url}")
+                self.publish_status = True
+                break
             except Exception:
                 # 等待后重试
                 self.logger.warning(f"发布尝试 {attempt} 失败，等待重试...")
@@ -632,13 +844,41 @@ class BaseFileUploader(object):
             self.logger.error(f"视频发布失败，已尝试 {max_attempts} 次")
         return self.publish_status
 
+    async def wait_publish_result(self, page, target_url, timeout=None):
+        """
+        并发等待发布完成的两种信号，返回先满足的一种：
+        ks平台、视频号平台发布后离开发布页面；xx平台发布后回到上传页，上传按钮重新可见
+        都未出现时抛出最后一个超时异常
+        """
+        timeout = self.button_visible_timeout if timeout is None else timeout
+        tasks = {
+            asyncio.ensure_future(page.wait_for_url(lambda url: target_url not in url, timeout=timeout)):
+                "页面已离开发布页",
+            asyncio.ensure_future(self.race_selectors(self.upload_button_selectors, timeout=timeout, base=page)):
+                "上传按钮重新可见",
+        }
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return tasks[task]
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
 
     async def platform_setup(self, handle=False):
         """
-        设置平台账户cookie
+        设置平台账户cookie：cookie文件不存在时获取新的cookie
+        cookie是否有效由上传会话检测（见is_login_page），这里不单独启动浏览器验证
         """
         account_file = get_absolute_path(self.account_file, "cookiesFile")
-        if not os.path.exists(account_file) or not await self.cookie_auth():
+        if not os.path.exists(account_file):
             if not handle:
                 return False
             self.logger.info("Cookie文件不存在，需要获取新的Cookie")
@@ -646,33 +886,14 @@ class BaseFileUploader(object):
         return True
 
 
-    async def cookie_auth(self):
+    def is_login_page(self, page):
         """
-        验证平台的cookie是否有效
+        当前页面是否为登录页（cookie失效时访问创作者页面会被重定向到登录页）
         """
-        try:
-            # 获取平台类型编号
-            platform_type = get_type_by_platform_key(self.platform)
-            if not platform_type:
-                self.logger.error(f"平台 {self.platform} 类型未找到")
-                return False
-            
-            # 提取cookie文件路径（相对路径）
-            # 假设self.account_file是完整路径，需要提取相对于cookiesFile目录的部分
-            cookie_file_path = os.path.relpath(self.account_file, os.path.join(BASE_DIR, "cookiesFile"))
-            
-            # 调用通用的Cookie验证方法
-            is_valid = await check_cookie_generic(platform_type, cookie_file_path)
-            
-            if is_valid:
-                self.logger.info("Cookie有效")
-            else:
-                self.logger.error("Cookie已过期")
-            
-            return is_valid
-        except Exception as e:
-            self.logger.error(f"Cookie验证失败: {str(e)}")
-            return False
+        is_login = is_login_url(page.url, self.login_url_prefixes)
+        if is_login:
+            self.logger.error(f"{self.platform_name}账号未登录，URL跳转到了登录页面: {page.url}")
+        return is_login
 
 
     async def get_platform_cookie(self, account_file, executable_path, timeout, login_url, login_wait_timeout, browser_lang):
@@ -747,7 +968,8 @@ async def run_upload(platform, account_file, file_type, file_path, title, text,
     """
     运行单个文件上传到某个平台的任务
     """
-    uploader = BaseFileUploader(platform, account_file, file_type, file_path, title, text, tags, thumbnail_path, location, publish_date)
+    uploader = BaseFileUploader(platform, account_file, file_type, file_path, title, text, tags, thumbnail_path, location, publish_date,
+                                cancel_event=kwargs.get("cancel_event"))
     try:
         return await uploader.main()
     except Exception as e:
@@ -764,8 +986,8 @@ class XiaohongshuFile(BaseFileUploader):
 
 
 if __name__ == "__main__":
-    # 示例运行代码
-    asyncio.run(run_upload(
+    # 示例运行代码（在浏览器池所在的常驻事件循环中执行）
+    run_in_browser_loop(run_upload(
         "xiaohongshu",
         "cookies/xhs_cookie.json",
         2,  # 文件类型：2为视频
@@ -1,9 +1,30 @@
-import asyncio
 from pathlib import Path
 from conf import BASE_DIR
-from .baseFileUploader import BaseFileUploader, run_upload
+from .publishEngine import PublishJob, get_publish_engine, get_success_account
+from utils.browser_pool import run_in_browser_loop
 from utils.files_times import generate_schedule_time_next_day
 
+
+def generate_publish_dates(file_num, enableTimer=False, videos_per_day=1, daily_times=None, start_days=0):
+    """
+    生成每个文件对应的发布时间，未开启定时发布时全部为0（立即发布）
+    """
+    if enableTimer:
+        # 前端传入的每日发布时间格式为HH:MM，这里只取小时
+        if daily_times:
+            daily_times = [int(str(daily_time).split(':')[0]) for daily_time in daily_times]
+        return generate_schedule_time_next_day(file_num, videos_per_day or 1, daily_times, start_days=start_days or 0)
+    return [0] * file_num
+
+
+def run_publish_jobs(jobs):
+    """
+    在浏览器池所在的常驻事件循环中并发执行所有发布任务
+    :return: 与jobs一一对应的发布成功账号列表，失败的任务对应None
+    """
+    return [get_success_account(results) for results in run_in_browser_loop(get_publish_engine().run(jobs))]
+
+
 def post_file(platform, account_file, file_type, files, title, text,tags,thumbnail_path, location, enableTimer=False, videos_per_day=1, daily_times=None, start_days=0):
     """
     批量发布多个文件到某个平台
@@ -28,47 +49,23 @@ def post_file(platform, account_file, file_type, files, title, text,tags,thumbna
         account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
         files = [Path(BASE_DIR / "videoFile" / file) for file in files]
         file_num = len(files)
+        publish_datetimes = generate_publish_dates(file_num, enableTimer, videos_per_day, daily_times, start_days)
 
-        if enableTimer:
-            publish_datetimes = generate_schedule_time_next_day(file_num, videos_per_day,daily_times, start_days)
-        else:
-            publish_datetimes = 0
-
-        success_count = 0
+        # 每个文件发布到每个账号，每个(文件, 账号)组合是一个独立任务，全部并发执行
+        jobs = []
         for index, file in enumerate(files):
-            file_published = False
             for cookie in account_file:
-                try:
-                    # 使用独立的run_upload函数来执行上传
-                    publish_result = asyncio.run(run_upload(platform, cookie, file_type, file, title, text, tags, thumbnail_path, location, publish_datetimes))
-                     
-                    # 是否成功发布
-                    if publish_result:
-                        print(f"{platform}文件{file.name}发布成功")
-                        success_count += 1
-                        file_published = True
-                        # 这个账号发布成功后跳过
-                        continue
-                    else:
-                        print(f"{platform}文件{file.name}发布失败，尝试下一个账号")
-                except Exception as e:
-                    print(f"{platform}文件{file.name}发布失败: {str(e)}")
-                    # 继续尝试其他账号，不中断当前文件的发布
-                    continue
-            
-            # 任务进度 - 显示成功数量/总数量
-            print(f"{platform}已发布{success_count}/{file_num}个文件")
-        
+                jobs.append(PublishJob(platform, [cookie], file_type, file, title, text, tags, thumbnail_path, location, publish_datetimes[index]))
+        results = run_publish_jobs(jobs)
+
+        success_count = len({job.file_path for job, account in zip(jobs, results) if account})
         # 全部发布完毕后，显示最终结果
         if success_count == file_num:
             print(f"{platform}所有文件发布完成")
         else:
             print(f"{platform}发布完成，成功发布{success_count}/{file_num}个文件")
         # 如果有文件发布成功，返回True
-        if file_published:
-            return True
-        else:
-            return False
+        return success_count > 0
     except Exception as e:
         print(f"{platform}文件发布过程中发生异常: {str(e)}")
         return False
@@ -100,45 +97,21 @@ def post_single_file_to_multiple_platforms(platforms, account_files, file_type,
         # 生成文件的完整路径
         file = Path(BASE_DIR / "videoFile" / file)
         platform_num = len(platforms)
-        success_count = 0
 
-        # 单个文件发布，不需要生成多个时间点
-        if enableTimer:
-            # 生成一个发布时间点
-            publish_datetimes = generate_schedule_time_next_day(1, videos_per_day, daily_times, start_days)
-        else:
-            publish_datetimes = 0
+        # 单个文件发布，只需要生成一个发布时间点
+        publish_date = generate_publish_dates(1, enableTimer, videos_per_day, daily_times, start_days)[0]
 
-        for index, platform in enumerate(platforms):
-            # 获取当前平台对应的账号文件列表
-            if platform in account_files:
-                platform_accounts = account_files[platform]
-                platform_accounts = [Path(BASE_DIR / "cookiesFile" / account) for account in platform_accounts]
-            else:
+        # 每个平台一个任务，一个平台只需要用一个账号发布成功即可
+        jobs = []
+        for platform in platforms:
+            if platform not in account_files:
                 print(f"平台{platform}没有对应的账号文件，跳过发布")
                 continue
+            platform_accounts = [Path(BASE_DIR / "cookiesFile" / account) for account in account_files[platform]]
+            jobs.append(PublishJob(platform, platform_accounts, file_type, file, title, text, tags, thumbnail_path, location, publish_date))
+        results = run_publish_jobs(jobs)
 
-            for cookie in platform_accounts:
-                try:
-                    # 使用独立的run_upload函数来执行上传
-                    publish_result = asyncio.run(run_upload(platform, cookie, file_type, file, title, text, tags, thumbnail_path, location, publish_datetimes))
-                    
-                    # 是否成功发布
-                    if publish_result:
-                        print(f"{platform}文件{file.name}发布成功")
-                        success_count += 1
-                        # 一个平台只需要用一个账号发布成功即可
-                        break
-                    else:
-                        print(f"{platform}文件{file.name}发布失败，尝试下一个账号")
-                except Exception as e:
-                    print(f"{platform}文件{file.name}发布失败: {str(e)}")
-                    # 继续尝试其他账号，不中断当前平台的发布
-                    continue
-            
-            # 任务进度 - 显示成功数量/总数量
-            print(f"已发布到{success_count}/{platform_num}个平台")
-        
+        success_count = sum(1 for account in results if account)
         # 全部发布完毕后
         if success_count == platform_num:
             print(f"所有平台发布完成，成功发布到{success_count}/{platform_num}个平台")
@@ -176,63 +149,39 @@ def post_multiple_files_to_multiple_platforms(platforms, account_files, file_typ
         # 生成文件的完整路径
         files = [Path(BASE_DIR / "videoFile" / file) for file in files]
         file_num = len(files)
-        platform_num = len(platforms)
-        
+
         # 初始化发布结果字典
         publish_results = {}
         for platform in platforms:
             publish_results[platform] = {"success": 0, "total": file_num}
-        
+
         # 生成所有文件的发布时间点
-        if enableTimer:
-            publish_datetimes = generate_schedule_time_next_day(file_num, videos_per_day, daily_times, start_days)
-        else:
-            publish_datetimes = 0
-        
-        # 遍历所有文件
+        publish_datetimes = generate_publish_dates(file_num, enableTimer, videos_per_day, daily_times, start_days)
+
+        # 每个(文件, 平台)组合是一个任务，任务内按顺序尝试该平台的账号，所有任务并发执行
+        jobs = []
         for file_index, file in enumerate(files):
-            print(f"\n开始处理文件 {file.name} ({file_index+1}/{file_num})")
-            
-            # 遍历所有平台
             for platform in platforms:
-                # 获取当前平台对应的账号文件列表
-                if platform in account_files:
-                    platform_accounts = account_files[platform]
-                    platform_accounts = [Path(BASE_DIR / "cookiesFile" / account) for account in platform_accounts]
-                else:
+                if platform not in account_files:
                     print(f"平台{platform}没有对应的账号文件，跳过发布")
                     continue
-                
-                # 遍历当前平台的所有账号，直到发布成功
-                published = False
-                for cookie in platform_accounts:
-                    try:
-                        # 使用独立的run_upload函数来执行上传
-                        publish_result = asyncio.run(run_upload(platform, cookie, file_type, file, title, text, tags, thumbnail_path, location, publish_datetimes))
-                        
-                        # 是否成功发布
-                        if publish_result:
-                            print(f"{platform}文件{file.name}发布成功")
-                            publish_results[platform]["success"] += 1
-                            published = True
-                            break
-                        else:
-                            print(f"{platform}文件{file.name}发布失败，尝试下一个账号")
-                    except Exception as e:
-                        print(f"{platform}文件{file.name}发布失败: {str(e)}")
-                        # 继续尝试其他账号，不中断当前平台的发布
-                        continue
-                
-                if not published:
-                    print(f"{platform}文件{file.name}所有账号发布失败")
-        
+                platform_accounts = [Path(BASE_DIR / "cookiesFile" / account) for account in account_files[platform]]
+                jobs.append(PublishJob(platform, platform_accounts, file_type, file, title, text, tags, thumbnail_path, location, publish_datetimes[file_index]))
+        results = run_publish_jobs(jobs)
+
+        for job, account in zip(jobs, results):
+            if account:
+                publish_results[job.platform]["success"] += 1
+            else:
+                print(f"{job.platform}文件{job.file_path.name}所有账号发布失败")
+
         # 输出最终发布结果
         print("\n=== 发布结果汇总 ===")
         for platform, result in publish_results.items():
             success = result["success"]
             total = result["total"]
             print(f"{platform}: 成功 {success}/{total}")
-        
+
         return publish_results
     except Exception as e:
         print(f"文件发布过程中发生异常: {str(e)}")
@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 # 平台配置字典
 PLATFORM_CONFIGS = {
     "xiaohongshu": {
@@ -43,7 +45,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -89,7 +91,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -111,6 +113,8 @@ PLATFORM_CONFIGS = {
         "type": 3,
         "platform_name": "douyin",
         "personal_url": "https://creator.douyin.com/creator-micro/home",
+        #账号有效性检测：未登录时个人中心页面也能打开，需要在浏览器中检查页面内容，跳过HTTP检测
+        "cookie_check": {"tiers": ["expiry", "browser"], "auth_cookies": ["sessionid", "sessionid_ss"]},
         "login_url": "https://creator.douyin.com/login",
         "creator_video_url": "https://creator.douyin.com/creator-micro/content/upload",
         "creator_image_url": "https://creator.douyin.com/creator-micro/content/upload?default-tab=3",
@@ -127,7 +131,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -173,7 +177,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -189,13 +193,22 @@ PLATFORM_CONFIGS = {
             "location": False,
             #是否支持定时发布
             "schedule": False
+        },
+        "upload_detection": {
+            #快手没传完也可以点击发布按钮，以"上传中"提示消失作为上传完成条件
+            "uploading_selector": "text=上传中",
+            #"上传中"提示中带有上传百分比
+            "progress_selector": "text=上传中",
         }
     },
     "tiktok": {
         "type": 5,
         "platform_name": "tiktok",
         "personal_url": "https://www.tiktok.com/setting",
+        "cookie_check": {"auth_cookies": ["sessionid", "sessionid_ss"]},
         "login_url": "https://www.tiktok.com/login?lang=en",
+        #未登录访问创作者中心时也会跳转到推荐页
+        "login_url_prefixes": ["https://www.tiktok.com/foryou"],
         "creator_video_url": "https://www.tiktok.com/tiktokstudio/upload?lang=en",
         "creator_image_url": "https://www.tiktok.com/tiktokstudio/upload?lang=en",
         "selectors": {
@@ -214,7 +227,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": False,
@@ -236,7 +249,10 @@ PLATFORM_CONFIGS = {
         "type": 6,
         "platform_name": "instagram",
         "personal_url": "https://www.instagram.com",
+        "cookie_check": {"auth_cookies": ["sessionid"]},
         "login_url": "https://www.instagram.com/accounts/login/",
+        #发布页在business.facebook.com，未登录时跳转到Meta商务套件登录页
+        "login_url_prefixes": ["https://business.facebook.com/business/loginpage", "https://www.facebook.com/login"],
         "creator_video_url": "https://business.facebook.com/latest/composer/",
         "creator_image_url": "https://business.facebook.com/latest/composer/",
         "selectors": {
@@ -263,7 +279,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -286,6 +302,7 @@ PLATFORM_CONFIGS = {
         "type": 7,
         "platform_name": "facebook",
         "personal_url": "https://www.facebook.com/profile.php",
+        "cookie_check": {"auth_cookies": ["c_user", "xs"]},
         "login_url": "https://www.facebook.com/login",
         "creator_video_url": "https://www.facebook.com/",
         "creator_image_url": "https://www.facebook.com/",
@@ -312,7 +329,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -334,6 +351,12 @@ PLATFORM_CONFIGS = {
         "type": 8,
         "platform_name": "bilibili",
         "personal_url": "https://member.bilibili.com/platform/home",
+        #账号有效性检测：导航接口返回登录状态，HTTP检测即可得出结论
+        "cookie_check": {
+            "auth_cookies": ["SESSDATA"],
+            "http_url": "https://api.bilibili.com/x/web-interface/nav",
+            "http_valid_text": '"isLogin":true',
+        },
         "login_url": "https://passport.bilibili.com/login",
         "creator_video_url": "https://member.bilibili.com/platform/upload/video/frame?page_from=creative_home_top_upload",
         "creator_image_url": "https://member.bilibili.com/platform/upload/video/frame",
@@ -354,7 +377,7 @@ PLATFORM_CONFIGS = {
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -377,6 +400,7 @@ PLATFORM_CONFIGS = {
         "type": 9,
         "platform_name": "baijiahao",
         "personal_url": "https://baijiahao.baidu.com/builder/rc/home",
+        "cookie_check": {"auth_cookies": ["BDUSS"]},
         "login_url": "https://baijiahao.baidu.com/builder/theme/bjh/login",
         "creator_video_url": "https://baijiahao.baidu.com/builder/rc/edit?type=videoV2&is_from_cms=1",
         "creator_image_url": "https://baijiahao.baidu.com/builder/rc/edit?type=news&is_from_cms=1",
@@ -409,13 +433,20 @@ PLATFORM_CONFIGS = {
                 'xpath=/html/body/div[2]/div/div[2]/div/div[1]/div/div/div/div[2]/div/div/div/div[2]/button[2]',
                 'button.cheetah-btn.cheetah-btn-primary.cheetah-btn-solid:has-text("确定")'
             ],
+            #封面图片上传输入框选择器（点击封面按钮后弹出的对话框中）
+            "thumbnail_upload": [
+                'div.cheetah-modal input[type="file"]',
+                'input[type="file"][accept*="image"]'
+            ],
+            #封面对话框关闭按钮选择器（确认后对话框未自动关闭时点击）
+            "thumbnail_close": ['button.cheetah-modal-close'],
             "schedule_button": ['button:has-text("定时发布")'],
             "date_input": ['.date-picker-input'],
             "time_input": ['.time-picker-input'],
         },
         "features": {
             # 平台功能支持
-            #是否跳过Cookie验证
+            #是否跳过上传前的Cookie文件检查（登录页检测始终执行）
             "skip_cookie_verify": True,
             #是否支持图文发布
             "image_publish": True,
@@ -435,8 +466,135 @@ PLATFORM_CONFIGS = {
     }
 }
 
+# 上传完成检测默认配置，各平台可在配置的upload_detection中覆盖
+DEFAULT_UPLOAD_DETECTION = {
+    #上传相关网络请求URL片段，匹配的响应用于跟踪上传进度，匹配的失败请求触发重新上传
+    "response_patterns": ["upload"],
+    #上传进度文本选择器，从元素文本中提取百分比，为空时不提取
+    "progress_selector": None,
+    #上传中提示选择器，设置后以该元素消失作为上传完成条件，否则以发布按钮可点击作为完成条件
+    "uploading_selector": None,
+    #上传截止时间(秒) = deadline_base + 文件大小(MB) / min_speed_mb
+    "deadline_base": 120,
+    #最低上传速度(MB/s)，用于按文件大小估算截止时间
+    "min_speed_mb": 0.5,
+}
+
+# 账号有效性检测默认配置，各平台可在配置的cookie_check中覆盖
+# 按tiers顺序逐级检测，前一级能得出结论时不再执行后一级：
+#   expiry: 检查storage_state中登录cookie的过期时间，无需网络请求
+#   http: 带cookie直接请求个人中心(或http_url)，根据是否重定向到登录页、状态码、返回内容判断
+#   browser: 在浏览器中打开个人中心页面判断（最慢，前两级无法得出结论时使用）
+DEFAULT_COOKIE_CHECK = {
+    #检测顺序
+    "tiers": ["expiry", "http", "browser"],
+    #登录cookie名称，全部缺失或过期视为失效；为空时检查所有cookie是否都已过期
+    "auth_cookies": [],
+    #HTTP检测请求的URL，为空时使用personal_url
+    "http_url": None,
+    #登录后返回内容中必定包含的文本，设置后HTTP检测可直接得出有效/失效结论，否则只能判断失效
+    "http_valid_text": None,
+    #检测结果的有效期(秒)，过期后读取账号列表时在后台重新检测
+    "ttl": 6 * 3600,
+}
+# 可用的检测级别
+COOKIE_CHECK_TIERS = ("expiry", "http", "browser")
+
+# 上传各步骤的就绪条件默认配置，各平台可在配置的readiness中按步骤覆盖
+# load_state: 等待页面加载状态(load/domcontentloaded/networkidle)
+# selectors_key: 等待selectors中对应的选择器达到state状态(attached/visible/hidden/detached)
+# timeout: 就绪条件等待超时(毫秒)，超时后记录日志并继续执行
+# humanize_delay: 拟人化模式(UPLOAD_HUMANIZE)下条件满足后额外等待的秒数
+DEFAULT_READINESS = {
+    #页面导航后：等待页面load事件
+    "page_loaded": {"load_state": "load", "timeout": 15000, "humanize_delay": 2},
+    #查找上传按钮前：等待上传按钮挂载到页面
+    "upload_ready": {"selectors_key": "upload_button", "state": "attached", "timeout": 15000, "humanize_delay": 7},
+    #输入标题、正文、标签后：键盘输入按顺序执行，无需等待
+    "text_input": {"humanize_delay": 0.5},
+    #点击封面按钮后：等待封面确认按钮可见
+    "thumbnail_dialog": {"selectors_key": "thumbnail_finish", "state": "visible", "timeout": 10000, "humanize_delay": 2},
+    #点击封面确认后：等待封面确认按钮消失
+    "thumbnail_closed": {"selectors_key": "thumbnail_finish", "state": "hidden", "timeout": 10000, "humanize_delay": 2},
+    #点击发布后、关闭页面前：等待网络空闲，保证发布请求已完成
+    "published": {"load_state": "networkidle", "timeout": 10000, "humanize_delay": 7},
+}
+
+# 所有平台必须配置的字段
+REQUIRED_CONFIG_KEYS = ("type", "platform_name", "personal_url", "login_url", "creator_video_url",
+                        "creator_image_url", "selectors", "features")
+# 所有平台必须配置的选择器
+REQUIRED_SELECTOR_KEYS = ("upload_button", "publish_button", "title_editor", "textbox_selectors",
+                          "thumbnail_button", "thumbnail_finish", "schedule_button")
+# 开启功能时必须配置的选择器
+FEATURE_SELECTOR_KEYS = {
+    "thumbnail": ("thumbnail_upload", "thumbnail_close"),
+    "schedule": ("date_input", "time_input"),
+}
+
+
+def validate_platform_configs(configs):
+    """
+    检查平台配置：必填字段、必填选择器、开启功能所需的选择器、就绪条件引用的选择器、类型编号是否重复、账号检测级别
+    :param configs: 平台配置字典
+    :return: 问题描述列表，为空表示检查通过
+    """
+    problems = []
+    seen_types = {}
+    for platform_key, config in configs.items():
+        missing = [key for key in REQUIRED_CONFIG_KEYS if key not in config]
+        if missing:
+            problems.append(f"{platform_key}: 缺少配置 {', '.join(missing)}")
+            continue
+        if config["type"] in seen_types:
+            problems.append(f"{platform_key}: 类型编号 {config['type']} 与 {seen_types[config['type']]} 重复")
+        seen_types[config["type"]] = platform_key
+
+        selectors = config["selectors"]
+        required = list(REQUIRED_SELECTOR_KEYS)
+        for feature, keys in FEATURE_SELECTOR_KEYS.items():
+            if config["features"].get(feature):
+                required.extend(keys)
+        for stage, condition in dict(DEFAULT_READINESS, **config.get("readiness", {})).items():
+            if condition.get("selectors_key"):
+                required.append(condition["selectors_key"])
+        missing = sorted({key for key in required if not selectors.get(key)})
+        if missing:
+            problems.append(f"{platform_key}: 缺少选择器 {', '.join(missing)}")
+
+        unknown = [tier for tier in config.get("cookie_check", {}).get("tiers", []) if tier not in COOKIE_CHECK_TIERS]
+        if unknown:
+            problems.append(f"{platform_key}: 未知的账号检测级别 {', '.join(unknown)}")
+    return problems
+
+
+def _freeze_selectors(selectors):
+    # 选择器列表转为元组，整个选择器组只读，上传器之间共享同一份
+    return MappingProxyType({
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in selectors.items()
+    })
+
+
+# 导入时检查配置，配置错误在启动时就报出，而不是批量发布进行到一半才失败
+_problems = validate_platform_configs(PLATFORM_CONFIGS)
+if _problems:
+    raise ValueError("平台配置错误:\n" + "\n".join(_problems))
+
+# 导入时构建的只读查找索引
+# 平台类型编号 -> 平台key
+PLATFORM_KEY_BY_TYPE = MappingProxyType({config["type"]: key for key, config in PLATFORM_CONFIGS.items()})
+# 平台key -> 平台类型编号
+PLATFORM_TYPE_BY_KEY = MappingProxyType({key: config["type"] for key, config in PLATFORM_CONFIGS.items()})
+# 平台key -> 选择器组
+PLATFORM_SELECTORS = MappingProxyType({key: _freeze_selectors(config["selectors"])
+                                       for key, config in PLATFORM_CONFIGS.items()})
+
 # 导出配置以便其他模块导入
-__all__ = ['PLATFORM_CONFIGS', 'get_platform_key_by_type', 'get_type_by_platform_key']
+__all__ = ['PLATFORM_CONFIGS', 'DEFAULT_UPLOAD_DETECTION', 'DEFAULT_COOKIE_CHECK', 'DEFAULT_READINESS', 'PLATFORM_KEY_BY_TYPE',
+           'PLATFORM_TYPE_BY_KEY', 'PLATFORM_SELECTORS', 'validate_platform_configs', 'get_platform_key_by_type',
+           'get_type_by_platform_key', 'get_platform_config_by_type', 'get_selectors', 'get_upload_detection',
+           'get_cookie_check', 'get_readiness']
 
 
 def get_platform_key_by_type(type):
@@ -445,10 +603,7 @@ def get_platform_key_by_type(type):
     :param type: 平台类型编号
     :return: 平台key，如果没有找到则返回None
     """
-    for platform_key, config in PLATFORM_CONFIGS.items():
-        if config['type'] == type:
-            return platform_key
-    return None
+    return PLATFORM_KEY_BY_TYPE.get(type)
 
 
 def get_type_by_platform_key(platform_key):
@@ -457,7 +612,66 @@ def get_type_by_platform_key(platform_key):
     :param platform_key: 平台key
     :return: 平台类型编号，如果没有找到则返回None
     """
-    config = PLATFORM_CONFIGS.get(platform_key)
-    if config:
-        return config['type']
-    return None
\ No newline at end of file
+    return PLATFORM_TYPE_BY_KEY.get(platform_key)
+
+
+def get_platform_config_by_type(type):
+    """
+    通过平台类型编号查找平台配置
+    :param type: 平台类型编号
+    :return: 平台配置字典，如果没有找到则返回None
+    """
+    return PLATFORM_CONFIGS.get(PLATFORM_KEY_BY_TYPE.get(type))
+
+
+def get_selectors(platform_key):
+    """
+    获取平台的只读选择器组
+    :param platform_key: 平台key
+    :return: 选择器名到选择器元组的映射，如果没有找到则返回空映射
+    """
+    return PLATFORM_SELECTORS.get(platform_key, MappingProxyType({}))
+
+
+def get_upload_detection(platform_key):
+    """
+    获取平台的上传完成检测配置（平台配置覆盖默认配置）
+    :param platform_key: 平台key
+    :return: 上传完成检测配置字典
+    """
+    detection = dict(DEFAULT_UPLOAD_DETECTION)
+    detection.update(PLATFORM_CONFIGS.get(platform_key, {}).get("upload_detection", {}))
+    return detection
+
+
+def get_cookie_check(platform_key):
+    """
+    获取平台的账号有效性检测配置（平台配置覆盖默认配置）
+    :param platform_key: 平台key
+    :return: 账号有效性检测配置字典
+    """
+    cookie_check = dict(DEFAULT_COOKIE_CHECK)
+    cookie_check.update(PLATFORM_CONFIGS.get(platform_key, {}).get("cookie_check", {}))
+    return cookie_check
+
+
+def get_login_url_prefixes(platform_key):
+    """
+    获取平台登录页的地址前缀：login_url 加上平台配置的 login_url_prefixes
+    页面URL与其中任一地址域名相同、路径以其路径开头时视为登录页（见 myUtils.auth.is_login_url）
+    :param platform_key: 平台key
+    :return: 登录页地址列表
+    """
+    config = PLATFORM_CONFIGS.get(platform_key, {})
+    prefixes = [config["login_url"]] if config.get("login_url") else []
+    return prefixes + list(config.get("login_url_prefixes", []))
+
+
+def get_readiness(platform_key):
+    """
+    获取平台上传各步骤的就绪条件（平台配置按步骤覆盖默认配置）
+    :param platform_key: 平台key
+    :return: 步骤名到就绪条件的字典
+    """
+    overrides = PLATFORM_CONFIGS.get(platform_key, {}).get("readiness", {})
+    return {stage: dict(condition, **overrides.get(stage, {})) for stage, condition in DEFAULT_READINESS.items()}
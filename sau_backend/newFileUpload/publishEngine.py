@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+并发发布引擎：在同一个事件循环中并发执行所有(文件, 平台, 账号)上传任务
+"""
+import asyncio
+import os
+from datetime import datetime
+
+from conf import BASE_DIR, PUBLISH_MAX_CONCURRENCY, PUBLISH_PLATFORM_CONCURRENCY, PUBLISH_ACCOUNT_CONCURRENCY
+from myUtils.account_status import get_dead_account_files
+from .baseFileUploader import BaseFileUploader
+from .platform_configs import PLATFORM_CONFIGS
+
+
+class PublishJob(object):
+    """
+    单个发布任务参数说明：
+    platform: 平台名称
+    accounts: 账号cookie文件路径列表，按顺序尝试，第一个发布成功的账号生效
+    file_type: 文件类型，1为图文，2为视频
+    file_path: 文件路径
+    title: 文件标题
+    text: 文件正文描述
+    tags: 文件标签
+    thumbnail_path: 封面路径
+    location: 地点
+    publish_date: 发布时间，0为立即发布
+    cancel_event: 取消事件(asyncio.Event)，被设置后上传器会在下一个步骤边界中止
+    """
+
+    def __init__(self, platform, accounts, file_type, file_path, title, text, tags, thumbnail_path, location, publish_date=0,
+                 cancel_event=None):
+        self.platform = platform
+        self.accounts = list(accounts)
+        self.file_type = file_type
+        self.file_path = file_path
+        self.title = title
+        self.text = text
+        self.tags = tags
+        self.thumbnail_path = thumbnail_path
+        self.location = location
+        self.publish_date = publish_date
+        self.cancel_event = cancel_event
+
+
+class UploadResult(object):
+    """
+    单次(文件, 平台, 账号)上传结果参数说明：
+    account: 账号cookie文件路径
+    success: 是否发布成功
+    error_msg: 失败原因
+    start_time: 开始时间
+    finish_time: 结束时间
+    """
+
+    def __init__(self, account, success=False, error_msg=None, start_time=None, finish_time=None):
+        self.account = account
+        self.success = success
+        self.error_msg = error_msg
+        self.start_time = start_time
+        self.finish_time = finish_time
+
+    @property
+    def duration(self):
+        if self.start_time and self.finish_time:
+            return (self.finish_time - self.start_time).total_seconds()
+        return None
+
+
+def get_success_account(results):
+    """
+    从一个任务的上传结果列表中获取发布成功的账号，全部失败返回None
+    """
+    for result in results:
+        if result.success:
+            return result.account
+    return None
+
+
+class PublishEngine(object):
+    """
+    并发发布引擎参数说明：
+    max_concurrency: 全局同时进行的上传数量上限
+    platform_concurrency: 单个平台同时进行的上传数量上限（可在平台配置中用max_concurrency覆盖）
+    account_concurrency: 单个账号同时进行的上传数量上限
+    """
+
+    def __init__(self, max_concurrency=PUBLISH_MAX_CONCURRENCY, platform_concurrency=PUBLISH_PLATFORM_CONCURRENCY,
+                 account_concurrency=PUBLISH_ACCOUNT_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.platform_concurrency = platform_concurrency
+        self.account_concurrency = account_concurrency
+        self._global_limit = asyncio.Semaphore(max_concurrency)
+        self._platform_limits = {}
+        self._account_limits = {}
+
+    def _platform_limit(self, platform):
+        if platform not in self._platform_limits:
+            limit = PLATFORM_CONFIGS.get(platform, {}).get("max_concurrency", self.platform_concurrency)
+            self._platform_limits[platform] = asyncio.Semaphore(limit)
+        return self._platform_limits[platform]
+
+    def _account_limit(self, account):
+        key = str(account)
+        if key not in self._account_limits:
+            self._account_limits[key] = asyncio.Semaphore(self.account_concurrency)
+        return self._account_limits[key]
+
+    async def get_dead_accounts(self, accounts):
+        """
+        查询账号列表中已失效的账号，查询失败时不跳过任何账号
+        :return: 已失效账号（与accounts中的元素相同）的集合
+        """
+        cookies_dir = os.path.join(BASE_DIR, "cookiesFile")
+        file_paths = {account: os.path.relpath(account, cookies_dir) for account in accounts}
+        try:
+            dead_files = await asyncio.to_thread(get_dead_account_files, file_paths.values())
+        except Exception as e:
+            print(f"查询失效账号失败: {str(e)}")
+            return set()
+        return {account for account, file_path in file_paths.items() if file_path in dead_files}
+
+    async def upload_with_account(self, job, account):
+        """
+        使用指定账号执行一次上传，按 账号 -> 平台 -> 全局 的固定顺序获取并发许可，避免死锁
+        :return: UploadResult
+        """
+        async with self._account_limit(account):
+            async with self._platform_limit(job.platform):
+                async with self._global_limit:
+                    result = UploadResult(account, start_time=datetime.now())
+                    uploader = None
+                    try:
+                        uploader = BaseFileUploader(job.platform, account, job.file_type, job.file_path, job.title, job.text,
+                                                    job.tags, job.thumbnail_path, job.location, job.publish_date,
+                                                    cancel_event=job.cancel_event)
+                        result.success = bool(await uploader.main())
+                        if not result.success:
+                            result.error_msg = uploader.error_msg
+                    except Exception as e:
+                        result.error_msg = str(e)
+                        if uploader is not None:
+                            uploader.logger.error(f"上传任务失败: {str(e)}")
+                    result.finish_time = datetime.now()
+                    return result
+
+    async def run_job(self, job):
+        """
+        执行单个发布任务，依次尝试账号列表，第一个发布成功的账号生效
+        :return: 按尝试顺序排列的UploadResult列表，成功账号之后的账号不会被尝试
+        已失效的账号（巡检连续失效）不启动浏览器，直接记为失败并尝试下一个账号
+        """
+        dead_accounts = await self.get_dead_accounts(job.accounts)
+        results = []
+        for account in job.accounts:
+            if job.cancel_event is not None and job.cancel_event.is_set():
+                break
+            if account in dead_accounts:
+                now = datetime.now()
+                results.append(UploadResult(account, error_msg="账号已失效，已跳过，请重新登录", start_time=now, finish_time=now))
+                print(f"{job.platform}账号{os.path.basename(account)}已失效，跳过")
+                continue
+            result = await self.upload_with_account(job, account)
+            results.append(result)
+            if result.success:
+                print(f"{job.platform}文件{job.file_path.name}发布成功")
+                break
+            print(f"{job.platform}文件{job.file_path.name}发布失败: {result.error_msg}，尝试下一个账号")
+        return results
+
+    async def run(self, jobs):
+        """
+        并发执行所有发布任务
+        :return: 与jobs一一对应的UploadResult列表
+        """
+        results = await asyncio.gather(*(self.run_job(job) for job in jobs), return_exceptions=True)
+        return [[] if isinstance(result, BaseException) else result for result in results]
+
+
+_engine = None
+
+
+def get_publish_engine():
+    """
+    获取进程级共享的发布引擎，需在浏览器事件循环中使用，使并发限制在所有批次间共享
+    """
+    global _engine
+    if _engine is None:
+        _engine = PublishEngine()
+    return _engine
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+基于 publish_task_records 表的持久化发布任务队列
+
+接口只负责写入待发布记录并立即返回task_id，后台worker在浏览器事件循环中
+原子地认领记录并执行上传，逐条更新记录状态。
+
+队列单元(job)由 group_key 相同的记录组成：
+- 单平台发布(/postVideo)每条(文件, 账号)记录是一个独立job
+- 多平台发布每个(文件, 平台)的所有账号记录组成一个job，按id顺序尝试账号，第一个成功的账号生效
+重试时记录会分配新的group_key单独入队，创建时的group_key保存在fallback_group中，用于判断同组账号是否已发布
+"""
+import asyncio
+import json
+import uuid
+from pathlib import Path
+
+from conf import BASE_DIR, PUBLISH_QUEUE_WORKERS, PUBLISH_QUEUE_POLL_INTERVAL
+from utils.browser_pool import get_browser_loop, submit_to_browser_loop
+from utils.db import get_connection, immediate_transaction
+from utils.media_processor import get_default_thumbnail
+from .publishEngine import PublishJob, get_publish_engine
+
+# 发布任务状态
+STATUS_PENDING = '待发布'
+STATUS_RUNNING = '发布中'
+STATUS_SUCCESS = '发布成功'
+STATUS_FAILED = '发布失败'
+STATUS_CANCELLED = '已取消'
+STATUS_SKIPPED = '已跳过'
+
+# 允许重试的状态
+RETRYABLE_STATUSES = (STATUS_FAILED, STATUS_CANCELLED)
+# 允许取消的状态
+CANCELLABLE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+_wakeup_event = None
+_workers = []
+# 正在执行的记录，key为记录id，value为(asyncio.Task, 取消事件)，只在浏览器事件循环中读写
+_running = {}
+# 已认领、尚未执行完的记录id，认领事务提交前加入（worker线程），job结束后在浏览器事件循环中移除
+_claimed = set()
+# 已认领但尚未开始执行时就被取消的记录id，只记录_claimed中的记录
+_cancel_requested = set()
+
+
+def new_group_key(task_id):
+    """
+    生成队列单元标识
+    """
+    return f"{task_id}:{uuid.uuid4().hex}"
+
+
+def build_payload(file, account_file, file_type, title, text, tags, thumbnail_path, location, publish_date):
+    """
+    构造单条发布记录的发布参数
+    publish_date: 发布时间，datetime或时间戳，0为立即发布
+    """
+    if hasattr(publish_date, "timestamp"):
+        publish_date = int(publish_date.timestamp())
+    return json.dumps({
+        "file": file,
+        "account_file": account_file,
+        "file_type": file_type,
+        "title": title,
+        "text": text,
+        "tags": tags,
+        "thumbnail_path": thumbnail_path,
+        "location": location,
+        "publish_date": publish_date,
+    }, ensure_ascii=False)
+
+
+def recover_interrupted_jobs():
+    """
+    进程重启后，将上次中断在"发布中"的队列记录重置为"待发布"
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE publish_task_records
+            SET status = ?, update_time = CURRENT_TIMESTAMP
+            WHERE status = ? AND group_key IS NOT NULL
+        ''', [STATUS_PENDING, STATUS_RUNNING])
+        conn.commit()
+        return cursor.rowcount
+
+
+def claim_next_job():
+    """
+    原子地认领下一个待发布的job，将其所有记录标记为"发布中"
+    :return: 记录列表(按id排序)，没有待发布job时返回None
+    """
+    # BEGIN IMMEDIATE 获取写锁，保证多个worker不会认领同一个job
+    with immediate_transaction() as conn:
+        row = conn.execute('''
+            SELECT group_key FROM publish_task_records
+            WHERE status = ? AND group_key IS NOT NULL
+            ORDER BY id LIMIT 1
+        ''', [STATUS_PENDING]).fetchone()
+        if not row:
+            return None
+        group_key = row['group_key']
+        rows = conn.execute('''
+            SELECT * FROM publish_task_records
+            WHERE group_key = ? AND status = ?
+            ORDER BY id
+        ''', [group_key, STATUS_PENDING]).fetchall()
+        conn.execute('''
+            UPDATE publish_task_records
+            SET status = ?, update_time = CURRENT_TIMESTAMP
+            WHERE group_key = ? AND status = ?
+        ''', [STATUS_RUNNING, group_key, STATUS_PENDING])
+        # 在提交前登记，取消请求看到"发布中"状态时记录一定已在_claimed中
+        _claimed.update(r['id'] for r in rows)
+        return [dict(r) for r in rows]
+
+
+def update_records_status(updates):
+    """
+    在一个事务中批量回写记录的发布结果
+    :param updates: [{"id", "status", "error_msg", "start_time", "finish_time"}, ...]
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        # 已取消的记录不再覆盖状态
+        cursor.executemany('''
+            UPDATE publish_task_records
+            SET status = ?, error_msg = ?, start_time = ?, finish_time = ?, update_time = CURRENT_TIMESTAMP
+            WHERE id = ? AND status != ?
+        ''', [
+            (update['status'], update.get('error_msg'), update.get('start_time'), update.get('finish_time'),
+             update['id'], STATUS_CANCELLED)
+            for update in updates
+        ])
+        conn.commit()
+
+
+def get_records_status(record_ids):
+    """
+    查询记录的当前状态
+    :return: {record_id: status}
+    """
+    placeholders = ','.join(['?' for _ in record_ids])
+    with get_connection() as conn:
+        rows = conn.execute(f'SELECT id, status FROM publish_task_records WHERE id IN ({placeholders})',
+                            list(record_ids)).fetchall()
+    return {row['id']: row['status'] for row in rows}
+
+
+def format_time(value):
+    """
+    格式化为与CURRENT_TIMESTAMP一致的时间字符串
+    """
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def requeue_records(record_ids):
+    """
+    将失败的记录重新放回发布队列，每条记录作为一个独立的队列单元，只使用该记录自己的账号
+    通过带状态条件的UPDATE实现幂等：记录已在队列中或正在发布时不会被重复入队
+    多账号备选发布时，同一备选组(fallback_group)中已有其他账号发布成功（或正在发布）的记录不再重试，避免重复发布
+    :return: {record_id: (是否入队, 说明)}
+    """
+    outcome = {}
+    with immediate_transaction() as conn:
+        for record_id in dict.fromkeys(record_ids):
+            record = conn.execute(
+                'SELECT id, task_id, fallback_group, status, payload, retry_count FROM publish_task_records WHERE id = ?',
+                [record_id]
+            ).fetchone()
+            if not record:
+                outcome[record_id] = (False, "发布任务记录不存在")
+                continue
+            if not record['payload']:
+                outcome[record_id] = (False, "记录缺少发布参数，无法重试")
+                continue
+            # 单账号发布的备选组只有这一条记录；fallback_group为空的旧记录不做检查
+            # 备选组只在同一任务内，带上task_id以使用task_id索引
+            sibling = record['fallback_group'] and conn.execute('''
+                SELECT status FROM publish_task_records
+                WHERE task_id = ? AND fallback_group = ? AND id != ? AND status IN (?, ?, ?)
+                LIMIT 1
+            ''', [record['task_id'], record['fallback_group'], record_id,
+                  STATUS_SUCCESS, STATUS_PENDING, STATUS_RUNNING]).fetchone()
+            if sibling:
+                outcome[record_id] = (False, "同一备选组的其他账号已发布成功" if sibling['status'] == STATUS_SUCCESS
+                                      else "同一备选组的其他账号正在发布")
+                continue
+            retry_count = (record['retry_count'] or 0) + 1
+            placeholders = ','.join(['?' for _ in RETRYABLE_STATUSES])
+            cursor = conn.execute(f'''
+                UPDATE publish_task_records
+                SET status = ?, error_msg = NULL, start_time = NULL, finish_time = NULL,
+                    group_key = ?, retry_count = ?, idempotency_key = ?, update_time = CURRENT_TIMESTAMP
+                WHERE id = ? AND status IN ({placeholders})
+            ''', [STATUS_PENDING, new_group_key(record['task_id']), retry_count, f"{record_id}:{retry_count}",
+                  record_id, *RETRYABLE_STATUSES])
+            if cursor.rowcount:
+                outcome[record_id] = (True, "已重新加入发布队列")
+            else:
+                outcome[record_id] = (False, f"当前状态为{record['status']}，无需重试")
+    return outcome
+
+
+def cancel_records(record_ids=None, task_id=None):
+    """
+    取消待发布/发布中的记录，可按记录id列表或整个task_id取消
+    同一队列单元(group_key)的记录会一起取消，待发布的记录不会再被认领，发布中的记录会中断浏览器任务
+    :return: (被取消的记录id列表, 其中原本处于发布中的记录id列表)
+    """
+    placeholders = ','.join(['?' for _ in CANCELLABLE_STATUSES])
+    with immediate_transaction() as conn:
+        if task_id:
+            rows = conn.execute(f'''
+                SELECT id, status FROM publish_task_records
+                WHERE task_id = ? AND status IN ({placeholders})
+            ''', [task_id, *CANCELLABLE_STATUSES]).fetchall()
+        else:
+            id_placeholders = ','.join(['?' for _ in record_ids])
+            rows = conn.execute(f'''
+                SELECT id, status FROM publish_task_records
+                WHERE status IN ({placeholders}) AND (
+                    id IN ({id_placeholders}) OR group_key IN (
+                        SELECT group_key FROM publish_task_records
+                        WHERE id IN ({id_placeholders}) AND group_key IS NOT NULL
+                    )
+                )
+            ''', [*CANCELLABLE_STATUSES, *record_ids, *record_ids]).fetchall()
+        cancelled_ids = [row['id'] for row in rows]
+        running_ids = [row['id'] for row in rows if row['status'] == STATUS_RUNNING]
+        conn.executemany(f'''
+            UPDATE publish_task_records
+            SET status = ?, error_msg = ?, update_time = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ({placeholders})
+        ''', [(STATUS_CANCELLED, '用户取消发布', record_id, *CANCELLABLE_STATUSES) for record_id in cancelled_ids])
+    if running_ids:
+        get_browser_loop().call_soon_threadsafe(_cancel_running, running_ids)
+    return cancelled_ids, running_ids
+
+
+def _cancel_running(record_ids):
+    """
+    在浏览器事件循环中中断正在执行的记录：设置取消事件并取消对应的asyncio.Task
+    """
+    for record_id in record_ids:
+        running = _running.get(record_id)
+        if running is None:
+            # 已认领但还未开始执行，开始执行前会检查；已执行完的记录不再处理（结果不会覆盖"已取消"）
+            if record_id in _claimed:
+                _cancel_requested.add(record_id)
+            continue
+        task, cancel_event = running
+        cancel_event.set()
+        task.cancel()
+
+
+def build_job(records):
+    """
+    将同一group_key的记录转换为发布引擎的PublishJob
+    """
+    payloads = [json.loads(record['payload']) for record in records]
+    first = payloads[0]
+    accounts = [Path(BASE_DIR / "cookiesFile" / payload['account_file']) for payload in payloads]
+    return PublishJob(
+        records[0]['platform_name'],
+        accounts,
+        first['file_type'],
+        Path(BASE_DIR / "videoFile" / first['file']),
+        first['title'],
+        first['text'],
+        first['tags'],
+        # 未指定封面时使用后台生成的封面帧
+        first['thumbnail_path'] or get_default_thumbnail(first['file']),
+        first['location'],
+        first['publish_date'],
+    )
+
+
+async def execute_job(records):
+    """
+    执行一个job并回写每条(文件, 账号, 平台)记录的结果
+    账号按记录顺序尝试，第i次尝试的结果对应第i条记录；成功账号之后的记录未执行，标记为已跳过
+    """
+    record_ids = [record['id'] for record in records]
+    if any(record_id in _cancel_requested for record_id in record_ids):
+        _cancel_requested.difference_update(record_ids)
+        # 以数据库中的状态为准
+        statuses = await asyncio.to_thread(get_records_status, record_ids)
+        if STATUS_CANCELLED in statuses.values():
+            return
+    job = build_job(records)
+    job.cancel_event = asyncio.Event()
+    task = asyncio.ensure_future(get_publish_engine().run_job(job))
+    for record_id in record_ids:
+        _running[record_id] = (task, job.cancel_event)
+    try:
+        results = await task
+    except asyncio.CancelledError:
+        # 被用户取消时记录状态已为"已取消"，worker自身被取消时继续向上抛出
+        if not job.cancel_event.is_set():
+            raise
+        print(f"发布任务已取消: {job.platform}文件{job.file_path.name}")
+        return
+    finally:
+        for record_id in record_ids:
+            _running.pop(record_id, None)
+        _cancel_requested.difference_update(record_ids)
+    updates = []
+    for index, record in enumerate(records):
+        if index < len(results):
+            result = results[index]
+            updates.append({
+                "id": record['id'],
+                "status": STATUS_SUCCESS if result.success else STATUS_FAILED,
+                "error_msg": None if result.success else (result.error_msg or '发布失败'),
+                "start_time": format_time(result.start_time),
+                "finish_time": format_time(result.finish_time),
+            })
+        else:
+            updates.append({"id": record['id'], "status": STATUS_SKIPPED, "error_msg": '同平台其他账号已发布成功'})
+    await asyncio.to_thread(update_records_status, updates)
+
+
+async def worker_loop(worker_index):
+    """
+    后台worker：不断认领并执行待发布job，队列为空时等待唤醒或轮询间隔
+    """
+    while True:
+        # 先清除唤醒标记再认领，认领之后提交的记录会重新唤醒worker
+        _wakeup_event.clear()
+        try:
+            records = await asyncio.to_thread(claim_next_job)
+        except Exception as e:
+            print(f"发布队列worker{worker_index}认领任务失败: {str(e)}")
+            records = None
+        if not records:
+            try:
+                await asyncio.wait_for(_wakeup_event.wait(), timeout=PUBLISH_QUEUE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        record_ids = [record['id'] for record in records]
+        try:
+            await execute_job(records)
+        except Exception as e:
+            print(f"发布队列worker{worker_index}执行任务失败: {str(e)}")
+            await asyncio.to_thread(update_records_status, [
+                {"id": record['id'], "status": STATUS_FAILED, "error_msg": str(e)} for record in records
+            ])
+        finally:
+            _claimed.difference_update(record_ids)
+            _cancel_requested.difference_update(record_ids)
+
+
+async def _start_workers(worker_count):
+    global _wakeup_event
+    if _workers:
+        return
+    _wakeup_event = asyncio.Event()
+    recovered = await asyncio.to_thread(recover_interrupted_jobs)
+    if recovered:
+        print(f"发布队列恢复了 {recovered} 条中断的记录")
+    for index in range(worker_count):
+        _workers.append(asyncio.create_task(worker_loop(index)))
+    print(f"发布队列已启动 {worker_count} 个worker")
+
+
+def start_publish_workers(worker_count=PUBLISH_QUEUE_WORKERS):
+    """
+    在浏览器事件循环中启动后台发布worker（重复调用无副作用）
+    队列依赖的扩展列由数据库迁移(utils.migrations)负责添加，需先调用migrate_database
+    """
+    submit_to_browser_loop(_start_workers(worker_count)).result()
+
+
+def notify_publish_queue():
+    """
+    唤醒空闲的worker处理新提交的记录（线程安全）
+    """
+    if _wakeup_event is not None:
+        get_browser_loop().call_soon_threadsafe(_wakeup_event.set)
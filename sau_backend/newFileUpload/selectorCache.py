@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+按钮选择器命中缓存
+
+记录每个平台每组候选选择器上次命中的选择器，下次查找时优先使用，
+缓存持久化到 db/selector_cache.json，并统计命中率与查找耗时。
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from conf import BASE_DIR
+
+CACHE_PATH = Path(BASE_DIR / "db" / "selector_cache.json")
+
+
+class SelectorCache(object):
+    """
+    选择器命中缓存参数说明：
+    cache_path: 缓存文件路径
+    """
+
+    def __init__(self, cache_path=CACHE_PATH):
+        self.cache_path = Path(cache_path)
+        self._lock = threading.Lock()
+        self._winners = self._load()
+        # 每个平台的统计：查找次数、缓存命中次数、未找到次数、累计耗时(秒)
+        self._metrics = {}
+
+    def _load(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        # 先写临时文件再替换，避免进程中断时留下损坏的缓存文件
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._winners, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def group_key(selector_list):
+        """
+        同一组候选选择器的缓存key
+        """
+        return hashlib.md5(json.dumps(list(selector_list), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def get(self, platform, selector_list):
+        """
+        获取上次命中的选择器，没有记录或已不在候选列表中时返回None
+        """
+        with self._lock:
+            winner = self._winners.get(platform, {}).get(self.group_key(selector_list))
+        return winner if winner in selector_list else None
+
+    def record(self, platform, selector_list, winner):
+        """
+        记录本次命中的选择器，发生变化时写回缓存文件
+        """
+        key = self.group_key(selector_list)
+        with self._lock:
+            platform_winners = self._winners.setdefault(platform, {})
+            if platform_winners.get(key) == winner:
+                return
+            platform_winners[key] = winner
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def discard(self, platform, selector_list):
+        """
+        删除上次命中的选择器（缓存的选择器未命中时调用）
+        """
+        key = self.group_key(selector_list)
+        with self._lock:
+            if self._winners.get(platform, {}).pop(key, None) is None:
+                return
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def observe(self, platform, elapsed, hit, found):
+        """
+        记录一次查找的统计数据
+        """
+        with self._lock:
+            metrics = self._metrics.setdefault(platform, {"lookups": 0, "hits": 0, "not_found": 0, "total_time": 0.0})
+            metrics["lookups"] += 1
+            metrics["hits"] += 1 if hit else 0
+            metrics["not_found"] += 0 if found else 1
+            metrics["total_time"] += elapsed
+
+    def metrics(self):
+        """
+        获取各平台的命中率与平均查找耗时
+        """
+        with self._lock:
+            result = {}
+            for platform, metrics in self._metrics.items():
+                lookups = metrics["lookups"]
+                result[platform] = {
+                    "lookups": lookups,
+                    "hits": metrics["hits"],
+                    "notFound": metrics["not_found"],
+                    "hitRate": round(metrics["hits"] / lookups, 4) if lookups else 0,
+                    "avgLookupMs": round(metrics["total_time"] * 1000 / lookups, 2) if lookups else 0,
+                }
+            return result
+
+
+_selector_cache = None
+_selector_cache_lock = threading.Lock()
+
+
+def get_selector_cache():
+    """
+    获取进程级共享的选择器命中缓存
+    """
+    global _selector_cache
+    with _selector_cache_lock:
+        if _selector_cache is None:
+            _selector_cache = SelectorCache()
+        return _selector_cache
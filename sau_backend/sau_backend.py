@@ -1,17 +1,22 @@
-import asyncio
 import os
-import sqlite3
 import threading
 import time
 import uuid
 from pathlib import Path
-from queue import Queue
+from queue import Empty, Queue
 from flask_cors import CORS
-from conf import BASE_DIR, LOCAL_CHROME_PATH
-from myUtils.auth import check_cookie
+from conf import BASE_DIR, FILE_CACHE_MAX_AGE, LOCAL_CHROME_PATH, USE_X_SENDFILE
+from myUtils.account_health import start_account_sweeper
+from myUtils.account_status import refresh_stale_accounts, subscribe as subscribe_account_status, unsubscribe as unsubscribe_account_status
 from flask import Flask, request, jsonify, Response, send_from_directory
 from myUtils.login import run_unified_login, delete_account
-from newFileUpload.multiFileUploader import post_file, post_multiple_files_to_multiple_platforms
+from utils.chunked_upload import ChunkUploadError, complete_upload, get_upload_status, init_upload, write_chunk
+from utils.db import build_search_condition, get_connection, migrate_database
+from utils.file_library import add_file, get_file_etag, is_immutable_file, is_part_file, new_part_path, release_file, save_stream
+from utils.media_processor import start_media_workers, submit_media_job
+from newFileUpload.multiFileUploader import generate_publish_dates
+from newFileUpload.publishQueue import build_payload, cancel_records, new_group_key, notify_publish_queue, requeue_records, start_publish_workers, STATUS_PENDING
+from newFileUpload.selectorCache import get_selector_cache
 from newFileUpload.platform_configs import get_platform_key_by_type, get_type_by_platform_key, PLATFORM_CONFIGS
 
 active_queues = {}
@@ -23,6 +28,9 @@ CORS(app)
 # 限制上传文件大小为160MB
 app.config['MAX_CONTENT_LENGTH'] = 160 * 1024 * 1024
 
+# 由前端服务器(nginx/apache)通过X-Sendfile直接发送文件；未开启时WSGI服务器支持的话使用sendfile零拷贝发送
+app.config['USE_X_SENDFILE'] = USE_X_SENDFILE
+
 # 获取当前目录（假设 index.html 和 assets 在这里）
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -82,12 +90,28 @@ def get_file():
     # 防止路径穿越攻击
     if '..' in filename or filename.startswith('/'):
         return {"error": "Invalid filename"}, 400
+    # 上传中的临时文件不允许访问
+    if is_part_file(filename):
+        return {"error": "Invalid filename"}, 400
 
     # 拼接完整路径
     file_path = str(Path(BASE_DIR / "videoFile"))
 
-    # 返回文件
-    return send_from_directory(file_path,filename)
+    # 返回文件：支持Range分段请求和If-None-Match条件请求，预览拖动进度条时只传输需要的部分
+    immutable = is_immutable_file(filename)
+    response = send_from_directory(
+        file_path,
+        filename,
+        conditional=True,
+        etag=get_file_etag(filename) or True,
+        max_age=FILE_CACHE_MAX_AGE if immutable else 0
+    )
+    if immutable:
+        # 素材库的原始文件内容不会变化，浏览器缓存期内无需重新验证
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
 
 
 @app.route('/uploadSave', methods=['POST'])
@@ -114,37 +138,26 @@ def upload_save():
     else:
         filename = file.filename
 
+    part_path = new_part_path()
     try:
-        # 生成 UUID v1
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-
-        # 构造文件名和路径
-        final_filename = f"{uuid_v1}_{filename}"
-        filepath = Path(BASE_DIR / "videoFile" / f"{uuid_v1}_{filename}")
-
-        # 保存文件
-        file.save(filepath)
-
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                                INSERT INTO file_records (filename, filesize, file_path)
-            VALUES (?, ?, ?)
-                                ''', (filename, round(float(os.path.getsize(filepath)) / (1024 * 1024),2), final_filename))
-            conn.commit()
-            print("✅ 上传文件已记录")
+        # 边写临时文件边计算sha256，内容相同的文件只保存一份
+        file_hash = save_stream(file.stream, part_path)
+        record, created = add_file(filename, part_path, file_hash)
+        if created:
+            # 后台生成封面帧、预览视频并读取时长分辨率
+            submit_media_job(record['id'])
 
         return jsonify({
             "code": 200,
-            "msg": "File uploaded and saved successfully",
+            "msg": "File uploaded and saved successfully" if created else "File already exists, reused",
             "data": {
-                "filename": filename,
-                "filepath": final_filename
+                "filename": record['filename'],
+                "filepath": record['file_path']
             }
         }), 200
 
     except Exception as e:
+        part_path.unlink(missing_ok=True)
         print(f"Upload failed: {e}")
         return jsonify({
             "code": 500,
@@ -152,16 +165,134 @@ def upload_save():
             "data": None
         }), 500
 
+# 分片上传：创建上传会话
+@app.route('/uploadInit', methods=['POST'])
+def upload_init():
+    """
+    参数：
+        filename: 原始文件名
+        size: 文件总大小（字节）
+        customFilename: 自定义文件名（可选，不含扩展名）
+    """
+    try:
+        data = request.get_json()
+        filename = data.get('filename')
+        custom_filename = data.get('customFilename')
+        if not filename or not data.get('size'):
+            return jsonify({
+                "code": 400,
+                "msg": "缺少必要参数",
+                "data": None
+            }), 400
+        if custom_filename:
+            filename = custom_filename + "." + filename.split('.')[-1]
+        return jsonify({
+            "code": 200,
+            "msg": "上传会话已创建",
+            "data": init_upload(filename, data.get('size'))
+        }), 200
+    except ChunkUploadError as e:
+        return jsonify({"code": e.status_code, "msg": e.msg, "data": e.data}), e.status_code
+    except Exception as e:
+        print(f"创建上传会话失败: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "msg": f"创建上传会话失败: {str(e)}",
+            "data": None
+        }), 500
+
+# 分片上传：上传一个分片，请求体为分片原始字节
+@app.route('/uploadChunk/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    参数：
+        offset: 分片在文件中的起始偏移，必须等于已接收的字节数
+        请求头 X-Chunk-Sha256: 分片的sha256校验值（可选）
+    """
+    try:
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({
+                "code": 400,
+                "msg": "缺少必要参数",
+                "data": None
+            }), 400
+        status = write_chunk(upload_id, offset, request.stream, request.content_length,
+                             request.headers.get('X-Chunk-Sha256'))
+        return jsonify({
+            "code": 200,
+            "msg": "分片上传成功",
+            "data": status
+        }), 200
+    except ChunkUploadError as e:
+        return jsonify({"code": e.status_code, "msg": e.msg, "data": e.data}), e.status_code
+    except Exception as e:
+        print(f"分片上传失败: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "msg": f"分片上传失败: {str(e)}",
+            "data": None
+        }), 500
+
+# 分片上传：查询上传进度，断线后从received继续上传
+@app.route('/uploadStatus/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    try:
+        return jsonify({
+            "code": 200,
+            "msg": "success",
+            "data": get_upload_status(upload_id)
+        }), 200
+    except ChunkUploadError as e:
+        return jsonify({"code": e.status_code, "msg": e.msg, "data": e.data}), e.status_code
+    except Exception as e:
+        print(f"查询上传进度失败: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "msg": f"查询上传进度失败: {str(e)}",
+            "data": None
+        }), 500
+
+# 分片上传：完成上传，保存到素材库
+@app.route('/uploadComplete/<upload_id>', methods=['POST'])
+def upload_complete(upload_id):
+    try:
+        record, created = complete_upload(upload_id)
+        if created:
+            submit_media_job(record['id'])
+
+        return jsonify({
+            "code": 200,
+            "msg": "File uploaded and saved successfully" if created else "File already exists, reused",
+            "data": {
+                "filename": record['filename'],
+                "filepath": record['file_path']
+            }
+        }), 200
+    except ChunkUploadError as e:
+        return jsonify({"code": e.status_code, "msg": e.msg, "data": e.data}), e.status_code
+    except Exception as e:
+        print(f"完成分片上传失败: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "msg": f"完成分片上传失败: {str(e)}",
+            "data": None
+        }), 500
+
 @app.route('/getFiles', methods=['GET'])
 def get_all_files():
     try:
         # 使用 with 自动管理数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row  # 允许通过列名访问结果
+        with get_connection() as conn:
             cursor = conn.cursor()
 
-            # 查询所有记录
-            cursor.execute("SELECT * FROM file_records")
+            # 按文件名搜索（优先使用全文索引），未传search时查询所有记录
+            search = request.args.get('search')
+            if search:
+                condition, params = build_search_condition(conn, 'file_records', ['filename'], search)
+                cursor.execute(f"SELECT * FROM file_records WHERE {condition}", params)
+            else:
+                cursor.execute("SELECT * FROM file_records")
             rows = cursor.fetchall()
 
             # 将结果转为字典列表，并提取UUID
@@ -203,46 +334,22 @@ def delete_file():
         }), 400
 
     try:
-        # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 查询要删除的记录
-            cursor.execute("SELECT * FROM file_records WHERE id = ?", (file_id,))
-            record = cursor.fetchone()
-
-            if not record:
-                return jsonify({
-                    "code": 404,
-                    "msg": "File not found",
-                    "data": None
-                }), 404
-
-            record = dict(record)
-
-            # 获取文件路径并删除实际文件
-            file_path = Path(BASE_DIR / "videoFile" / record['file_path'])
-            if file_path.exists():
-                try:
-                    file_path.unlink()  # 删除文件
-                    print(f"✅ 实际文件已删除: {file_path}")
-                except Exception as e:
-                    print(f"⚠️ 删除实际文件失败: {e}")
-                    # 即使删除文件失败，也要继续删除数据库记录，避免数据不一致
-            else:
-                print(f"⚠️ 实际文件不存在: {file_path}")
-
-            # 删除数据库记录
-            cursor.execute("DELETE FROM file_records WHERE id = ?", (file_id,))
-            conn.commit()
+        # 删除记录，没有其他记录引用同一文件时才删除实际文件
+        record, remaining = release_file(int(file_id))
+        if not record:
+            return jsonify({
+                "code": 404,
+                "msg": "File not found",
+                "data": None
+            }), 404
 
         return jsonify({
             "code": 200,
-            "msg": "File deleted successfully",
+            "msg": "File deleted successfully" if remaining == 0 else "File record deleted, shared file kept",
             "data": {
                 "id": record['id'],
-                "filename": record['filename']
+                "filename": record['filename'],
+                "refCount": remaining
             }
         }), 200
 
@@ -258,8 +365,7 @@ def delete_file():
 @app.route('/getFileStats', methods=['GET'])
 def get_file_stats():
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # 获取文件大小统计
@@ -281,6 +387,24 @@ def get_file_stats():
             ''')
             recent_files = [dict(row) for row in cursor.fetchall()]
 
+            # 按媒体类型统计数量和总时长（读取file_records中缓存的媒体信息，不重新探测文件）
+            cursor.execute('''
+                SELECT
+                    COALESCE(media_type, 'unknown') as media_type,
+                    COUNT(*) as count,
+                    SUM(duration) as total_duration
+                FROM file_records
+                GROUP BY COALESCE(media_type, 'unknown')
+            ''')
+            media_stats = [
+                {
+                    "media_type": row['media_type'],
+                    "count": row['count'],
+                    "total_duration": round(float(row['total_duration'] or 0), 2)
+                }
+                for row in cursor.fetchall()
+            ]
+
             return jsonify({
                 "code": 200,
                 "msg": "success",
@@ -291,7 +415,8 @@ def get_file_stats():
                         "avg_size_mb": round(float(size_stats['avg_size']), 2),
                         "max_size_mb": round(float(size_stats['max_size']), 2)
                     },
-                    "recent_files": recent_files
+                    "recent_files": recent_files,
+                    "media_stats": media_stats
                 }
             }), 200
     except Exception as e:
@@ -306,8 +431,7 @@ def get_file_stats():
 @app.route('/getPlatformStats', methods=['GET'])
 def get_platform_stats():
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # 获取各平台账号数量统计
@@ -354,6 +478,24 @@ def get_platform_stats():
         }), 500
 
 
+# 获取按钮选择器缓存命中率和查找耗时
+@app.route('/getSelectorMetrics', methods=['GET'])
+def get_selector_metrics():
+    try:
+        return jsonify({
+            "code": 200,
+            "msg": "success",
+            "data": get_selector_cache().metrics()
+        }), 200
+    except Exception as e:
+        print(f"获取选择器统计失败: {str(e)}")
+        return jsonify({
+            "code": 500,
+            "msg": f"获取选择器统计失败: {str(e)}",
+            "data": None
+        }), 500
+
+
 
 ###################################################账号管理#############################################
 # 统一登录接口
@@ -372,8 +514,7 @@ def login_unified():
     id = request.args.get('id')
 
     #如果账号名已存在，查找原有账户的id，并删除原有记录
-    with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM user_info WHERE userName = ? AND type = ?', (id, type))
         row = cursor.fetchone()
@@ -423,8 +564,7 @@ def updateUserinfo():
     userName = data.get('userName')
     try:
         # 获取数据库连接
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # 更新数据库记录
@@ -454,8 +594,7 @@ def updateUserinfo():
 def getAccounts():
     """快速获取所有账号信息，不进行cookie验证"""
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
             SELECT * FROM user_info''')
@@ -482,105 +621,38 @@ def getAccounts():
 
 # 验证所有账号实时状态
 @app.route("/getValidAccounts",methods=['GET'])
-async def getValidAccounts():
+def getValidAccounts():
+    """
+    参数：
+        type: 平台类型（可选，默认全部）
+        force: 为1时忽略有效期，后台重新检测全部账号
+    返回：
+        立即返回缓存的账号状态，状态已过期的账号在后台重新检测，结果通过 /accountStatusEvents 推送
+    """
     try:
         platform_type = request.args.get('type', type=int, default=0)
-        
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        force = request.args.get('force', type=int, default=0) == 1
+
+        with get_connection() as conn:
             cursor = conn.cursor()
             if platform_type == 0:
                 cursor.execute("SELECT * FROM user_info")
             else:
                 cursor.execute("SELECT * FROM user_info WHERE type = ?", (platform_type,))
             rows = cursor.fetchall()
-            rows_list = [list(row) for row in rows]
-            print("\n📋 当前数据表内容：")
-            for row in rows:
-                print(row)
-            # 定义并发限制数量
-            CONCURRENCY_LIMIT = 10  # 可以根据系统资源调整
-            
-            # 使用并发方式验证cookie
-            async def check_and_update_cookie(row):
-                try:
-                    flag = await check_cookie(row[1], row[2])
-                    if flag:
-                        row[4] = 1  # 验证成功，状态设为1
-                        return row[0], 1
-                    else:
-                        row[4] = 0  # 验证失败，状态设为0
-                        return row[0], 0
-                except Exception as e:
-                    print(f"❌ 验证账号 {row[3]} (ID: {row[0]}) 时出错: {str(e)}")
-                    # 验证失败，标记为失效
-                    row[4] = 0
-                    return row[0], 0
-            
-            # 分批处理以控制并发数量
-            def chunked_list(lst, chunk_size):
-                for i in range(0, len(lst), chunk_size):
-                    yield lst[i:i + chunk_size]
-            
-            print(f"\n🔄 开始并发验证账号状态（并发数: {CONCURRENCY_LIMIT}）...")
-            
-            # 记录需要更新的账号ID和状态
-            accounts_to_update = []
-            
-            # 分批处理所有账号
-            for batch in chunked_list(rows_list, CONCURRENCY_LIMIT):
-                # 为当前批次中的每个账号创建验证任务
-                tasks = [check_and_update_cookie(row) for row in batch]
-                # 并发执行当前批次的所有任务，return_exceptions=True确保即使某个任务失败，其他任务仍能继续执行
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                # 收集需要更新的账号ID和状态，过滤掉异常结果
-                for result in results:
-                    if isinstance(result, Exception):
-                        print(f"⚠️  批次处理中遇到异常: {str(result)}")
-                    elif result is not None:
-                        accounts_to_update.append(result)
-            
-            # 批量更新数据库，减少数据库操作次数
-            if accounts_to_update:
-                # 分离正常和失效账号，分别处理
-                valid_accounts = [acc[0] for acc in accounts_to_update if acc[1] == 1]
-                invalid_accounts = [acc[0] for acc in accounts_to_update if acc[1] == 0]
-                
-                update_queries = []
-                update_params = []
-                
-                # 更新正常账号状态
-                if valid_accounts:
-                    placeholders_valid = ','.join(['?' for _ in valid_accounts])
-                    update_queries.append(f"UPDATE user_info SET status = 1 WHERE id IN ({placeholders_valid})")
-                    update_params.extend(valid_accounts)
-                
-                # 更新失效账号状态
-                if invalid_accounts:
-                    placeholders_invalid = ','.join(['?' for _ in invalid_accounts])
-                    update_queries.append(f"UPDATE user_info SET status = 0 WHERE id IN ({placeholders_invalid})")
-                    update_params.extend(invalid_accounts)
-                
-                # 执行所有更新语句
-                for query in update_queries:
-                    if 'status = 1' in query:
-                        cursor.execute(query, valid_accounts)
-                    else:
-                        cursor.execute(query, invalid_accounts)
-                
-                conn.commit()
-                
-                total_updated = len(valid_accounts) + len(invalid_accounts)
-                print(f"✅ 已批量更新 {total_updated} 个账号的状态，其中 {len(valid_accounts)} 个正常，{len(invalid_accounts)} 个失效")
-            else:
-                print("✅ 所有账号状态均无需更新")
-            #for row in rows:
-            #    print(row)
-            return jsonify(
-                            {
-                                "code": 200,
-                                "msg": None,
-                                "data": rows_list
-                            }),200
+        rows_list = [list(row) for row in rows]
+
+        # stale-while-revalidate：只对过期的账号提交后台检测，不等待检测结果
+        refreshing_ids = refresh_stale_accounts(rows, force=force)
+        if refreshing_ids:
+            print(f"🔄 后台检测 {len(refreshing_ids)} 个账号状态")
+
+        return jsonify(
+                        {
+                            "code": 200,
+                            "msg": f"{len(refreshing_ids)} 个账号正在后台检测" if refreshing_ids else None,
+                            "data": rows_list
+                        }),200
     except Exception as e:
         print(f"❌ 获取有效账号列表时发生异常: {str(e)}")
         return jsonify(
@@ -589,6 +661,30 @@ async def getValidAccounts():
                         "msg": f"获取有效账号列表失败: {str(e)}",
                         "data": None
                     }), 500
+
+# 账号状态推送（SSE）：后台检测完成一个账号推送一条 {"id", "status", "lastCheckedAt", "failStreak"}
+@app.route('/accountStatusEvents')
+def account_status_events():
+    status_queue = subscribe_account_status()
+
+    def stream():
+        try:
+            while True:
+                try:
+                    msg = status_queue.get(timeout=15)
+                    yield f"data: {msg}\n\n"
+                except Empty:
+                    # 心跳，保持连接并及时发现客户端断开
+                    yield ": ping\n\n"
+        finally:
+            unsubscribe_account_status(status_queue)
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 禁用 Nginx 缓冲
+    response.headers['Connection'] = 'keep-alive'
+    return response
+
 # Cookie文件上传API
 @app.route('/uploadCookie', methods=['POST'])
 def upload_cookie():
@@ -627,8 +723,7 @@ def upload_cookie():
             }), 400
 
         # 从数据库获取账号的文件路径
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT filePath FROM user_info WHERE id = ?', (account_id,))
             result = cursor.fetchone()
@@ -646,8 +741,9 @@ def upload_cookie():
 
         file.save(str(cookie_file_path))
 
-        # 更新数据库中的账号信息（可选，比如更新更新时间）
-        # 这里可以根据需要添加额外的处理逻辑
+        # 更换了Cookie，清空连续失效次数和检测时间，下次获取账号列表时重新检测
+        with get_connection() as conn:
+            conn.execute('UPDATE user_info SET fail_streak = 0, last_checked_at = NULL WHERE id = ?', (account_id,))
 
         return jsonify({
             "code": 200,
@@ -724,8 +820,7 @@ async def get_platform_homepage():
             }), 400
 
         # 从数据库获取账号信息
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT filePath, type FROM user_info WHERE id = ?', (account_id,))
             result = cursor.fetchone()
@@ -834,18 +929,29 @@ def delete_account_route():
 # 获取发布任务记录
 @app.route('/getPublishTaskRecords', methods=['GET'])
 def get_publish_task_records():
+    """
+    获取发布任务记录
+    参数：
+        page, page_size: 页码分页（按创建时间、id倒序）
+        before_id: 游标分页，返回排在before_id之后的下一页（更早的记录）
+        after_id: 游标分页，返回排在after_id之前的上一页（更新的记录）
+        status, platform_name, account_name, filename: 筛选条件
+        search: 关键字，在文件名、账号名、错误信息中搜索
+    """
     try:
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
             
             # 获取查询参数
             page = int(request.args.get('page', 1))
             page_size = int(request.args.get('page_size', 10))
+            before_id = request.args.get('before_id', type=int)
+            after_id = request.args.get('after_id', type=int)
             status = request.args.get('status')
             platform_name = request.args.get('platform_name')
             account_name = request.args.get('account_name')
             filename = request.args.get('filename')
+            search = request.args.get('search')
             
             # 构建查询条件
             conditions = []
@@ -857,34 +963,84 @@ def get_publish_task_records():
             if platform_name:
                 conditions.append('platform_name = ?')
                 params.append(platform_name)
-            if account_name:
-                conditions.append('account_name LIKE ?')
-                params.append(f'%{account_name}%')
-            if filename:
-                conditions.append('filename LIKE ?')
-                params.append(f'%{filename}%')
+            # 文本条件优先使用全文索引，不支持时退化为LIKE
+            for columns, keyword in ((['account_name'], account_name), (['filename'], filename),
+                                     (['filename', 'account_name', 'error_msg'], search)):
+                if keyword:
+                    condition, condition_params = build_search_condition(conn, 'publish_task_records', columns, keyword)
+                    conditions.append(condition)
+                    params.extend(condition_params)
             
             # 构建WHERE子句
             where_clause = ''
             if conditions:
                 where_clause = f'WHERE {" AND ".join(conditions)}'
             
-            # 获取总记录数
-            cursor.execute(f'SELECT COUNT(*) as total FROM publish_task_records {where_clause}', params)
+            # 获取总记录数：只按状态/平台筛选时直接读取汇总表，有文本条件时才对记录表计数
+            if account_name or filename or search:
+                cursor.execute(f'SELECT COUNT(*) as total FROM publish_task_records {where_clause}', params)
+            else:
+                cursor.execute(f'SELECT COALESCE(SUM(count), 0) as total FROM publish_task_stats {where_clause}', params)
             total = cursor.fetchone()['total']
             
-            # 计算偏移量
-            offset = (page - 1) * page_size
-            
-            # 获取分页数据
-            cursor.execute(f'''
-                SELECT * FROM publish_task_records 
-                {where_clause}
-                ORDER BY create_time DESC 
-                LIMIT ? OFFSET ?
-            ''', params + [page_size, offset])
-            
-            records = [dict(row) for row in cursor.fetchall()]
+            # 两种分页方式统一按(create_time, id)倒序，切换方式时不会跳过或重复记录
+            if before_id is not None or after_id is not None:
+                # 游标分页：按(create_time, id)在索引上定位，不随页数增加而变慢
+                anchor_id = after_id if after_id is not None else before_id
+                cursor.execute('SELECT create_time FROM publish_task_records WHERE id = ?', [anchor_id])
+                anchor = cursor.fetchone()
+                if after_id is not None:
+                    cursor_condition, order = '(create_time, id) > (?, ?)', 'ASC'
+                else:
+                    cursor_condition, order = '(create_time, id) < (?, ?)', 'DESC'
+                cursor_params = [anchor['create_time'] if anchor else None, anchor_id]
+                if anchor is None:
+                    # 游标记录已被删除时按id定位
+                    cursor_condition = 'id > ?' if after_id is not None else 'id < ?'
+                    cursor_params = [anchor_id]
+                cursor_where = f'WHERE {" AND ".join(conditions + [cursor_condition])}'
+                cursor.execute(f'''
+                    SELECT * FROM publish_task_records
+                    {cursor_where}
+                    ORDER BY create_time {order}, id {order}
+                    LIMIT ?
+                ''', params + cursor_params + [page_size + 1])
+                records = [dict(row) for row in cursor.fetchall()]
+                has_next = len(records) > page_size
+                records = records[:page_size]
+                # 统一按时间倒序返回
+                if after_id is not None:
+                    records.reverse()
+
+                def exists_beyond(record, comparison):
+                    where = " AND ".join(conditions + [f'(create_time, id) {comparison} (?, ?)'])
+                    cursor.execute(f'SELECT 1 FROM publish_task_records WHERE {where} LIMIT 1',
+                                   params + [record['create_time'], record['id']])
+                    return cursor.fetchone() is not None
+
+                # 本页为空时以游标记录本身为界
+                edge = {'create_time': anchor['create_time'], 'id': anchor_id} if anchor else None
+                if after_id is not None:
+                    has_newer = has_next
+                    has_older = exists_beyond(records[-1], '<') if records else bool(edge and exists_beyond(edge, '<='))
+                else:
+                    has_older = has_next
+                    has_newer = exists_beyond(records[0], '>') if records else bool(edge and exists_beyond(edge, '>='))
+            else:
+                # 计算偏移量
+                offset = (page - 1) * page_size
+                
+                # 获取分页数据
+                cursor.execute(f'''
+                    SELECT * FROM publish_task_records 
+                    {where_clause}
+                    ORDER BY create_time DESC, id DESC
+                    LIMIT ? OFFSET ?
+                ''', params + [page_size, offset])
+                
+                records = [dict(row) for row in cursor.fetchall()]
+                has_older = offset + len(records) < total
+                has_newer = offset > 0
             
             # 格式化数据
             formatted_records = []
@@ -901,7 +1057,9 @@ def get_publish_task_records():
                     'status': record['status'],
                     'createTime': record['create_time'],
                     'updateTime': record['update_time'],
-                    'errorMsg': record['error_msg']
+                    'errorMsg': record['error_msg'],
+                    'startTime': record.get('start_time'),
+                    'finishTime': record.get('finish_time')
                 })
             
             # 构造返回数据
@@ -909,7 +1067,12 @@ def get_publish_task_records():
                 'records': formatted_records,
                 'total': total,
                 'page': page,
-                'pageSize': page_size
+                'pageSize': page_size,
+                # 游标分页参数：下一页（更早的记录）传before_id，上一页（更新的记录）传after_id
+                'beforeId': records[-1]['id'] if records else None,
+                'afterId': records[0]['id'] if records else None,
+                'hasOlder': has_older,
+                'hasNewer': has_newer
             }
             
             return jsonify({
@@ -941,7 +1104,7 @@ def update_publish_task_status():
                 "data": None
             }), 400
         
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             
             if error_msg:
@@ -982,51 +1145,51 @@ def update_publish_task_status():
 # 重试发布任务
 @app.route('/retryPublishTask', methods=['POST'])
 def retry_publish_task():
+    """
+    将失败的(文件, 账号, 平台)记录重新放回发布队列执行
+    参数：
+        id: 单条记录ID
+        ids: 记录ID列表，用于批量重试
+    """
     try:
         data = request.get_json()
-        id = data.get('id')
+        ids = data.get('ids') or ([data.get('id')] if data.get('id') else [])
         
-        if not id:
+        if not ids:
             return jsonify({
                 "code": 400,
                 "msg": "缺少必要参数",
                 "data": None
             }), 400
-        
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 获取任务记录
-            cursor.execute('''
-                SELECT * FROM publish_task_records WHERE id = ?
-            ''', [id])
-            record = cursor.fetchone()
-            
-            if not record:
-                return jsonify({
-                    "code": 404,
-                    "msg": "发布任务记录不存在",
-                    "data": None
-                }), 404
-            
-            # 更新任务状态为"发布中"
-            cursor.execute('''
-                UPDATE publish_task_records 
-                SET status = ?, error_msg = NULL, update_time = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', ['发布中', id])
-            
-            conn.commit()
-            
-            # 这里可以添加实际的重试逻辑，比如调用发布函数
-            # 由于发布逻辑比较复杂，这里简化处理，只更新状态
-            
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
             return jsonify({
-                "code": 200,
-                "msg": "发布任务重试成功",
+                "code": 400,
+                "msg": "记录ID必须为整数",
                 "data": None
-            }), 200
+            }), 400
+        # 去重，保持顺序
+        ids = list(dict.fromkeys(ids))
+        
+        # 幂等入队：已在队列中或正在发布的记录不会被重复执行
+        outcome = requeue_records(ids)
+        notify_publish_queue()
+        
+        queued = [record_id for record_id, (ok, _) in outcome.items() if ok]
+        details = [{"id": record_id, "queued": ok, "msg": msg} for record_id, (ok, msg) in outcome.items()]
+        if not queued:
+            # 单条记录重试时返回具体原因
+            code = 404 if len(ids) == 1 and details[0]["msg"] == "发布任务记录不存在" else 400
+            return jsonify({
+                "code": code,
+                "msg": details[0]["msg"] if len(ids) == 1 else "没有可重试的发布任务",
+                "data": details
+            }), code
+        
+        return jsonify({
+            "code": 200,
+            "msg": f"已重新提交 {len(queued)}/{len(ids)} 个发布任务",
+            "data": details
+        }), 200
     except Exception as e:
         print(f"重试发布任务失败: {str(e)}")
         return jsonify({
@@ -1038,26 +1201,33 @@ def retry_publish_task():
 # 取消发布任务
 @app.route('/cancelPublishTask', methods=['POST'])
 def cancel_publish_task():
+    """
+    取消发布任务：待发布的记录不会再被执行，发布中的记录会中断浏览器上传并释放浏览器池槽位
+    参数：
+        id: 单条记录ID（同一队列单元的其他账号记录会一起取消）
+        taskId: 任务ID，取消整个任务下所有未完成的记录
+    """
     try:
         data = request.get_json()
         id = data.get('id')
+        task_id = data.get('taskId')
         
-        if not id:
+        if not id and not task_id:
             return jsonify({
                 "code": 400,
                 "msg": "缺少必要参数",
                 "data": None
             }), 400
         
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 获取任务记录
-            cursor.execute('''
-                SELECT * FROM publish_task_records WHERE id = ?
-            ''', [id])
-            record = cursor.fetchone()
+        if id:
+            with get_connection() as conn:
+                cursor = conn.cursor()
+                
+                # 获取任务记录
+                cursor.execute('''
+                    SELECT * FROM publish_task_records WHERE id = ?
+                ''', [id])
+                record = cursor.fetchone()
             
             if not record:
                 return jsonify({
@@ -1073,24 +1243,24 @@ def cancel_publish_task():
                     "msg": f"只有发布中或待发布的任务才能取消，当前状态：{record['status']}",
                     "data": None
                 }), 400
-            
-            # 更新任务状态为"已取消"
-            cursor.execute('''
-                UPDATE publish_task_records 
-                SET status = ?, update_time = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', ['已取消', id])
-            
-            conn.commit()
-            
-            # 这里可以添加实际的取消逻辑，比如停止发布进程
-            # 由于发布逻辑比较复杂，这里简化处理，只更新状态
-            
+        
+        # 更新任务状态为"已取消"，并中断正在执行的上传
+        cancelled_ids, running_ids = cancel_records([id] if id else None, task_id=None if id else task_id)
+        if not cancelled_ids:
             return jsonify({
-                "code": 200,
-                "msg": "发布任务取消成功",
+                "code": 400,
+                "msg": "没有可取消的发布任务",
                 "data": None
-            }), 200
+            }), 400
+        
+        return jsonify({
+            "code": 200,
+            "msg": "发布任务取消成功",
+            "data": {
+                "cancelledIds": cancelled_ids,
+                "interruptedIds": running_ids
+            }
+        }), 200
     except Exception as e:
         print(f"取消发布任务失败: {str(e)}")
         return jsonify({
@@ -1113,8 +1283,7 @@ def delete_publish_task():
                 "data": None
             }), 400
         
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
             
             # 检查任务是否存在
@@ -1209,10 +1378,11 @@ def postVideo():
         
         # 生成唯一任务ID
         task_id = str(uuid.uuid4())
-        
-        # 创建发布任务记录
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        # 每个文件对应的发布时间
+        publish_dates = generate_publish_dates(len(file_list), enableTimer, videos_per_day, daily_times, start_days)
+
+        # 创建发布任务记录，写入发布队列
+        with get_connection() as conn:
             cursor = conn.cursor()
             
             # 遍历每个账号
@@ -1229,7 +1399,7 @@ def postVideo():
                     account_name = account['userName']
                 
                 # 遍历每个文件
-                for file_info in file_list:
+                for file_index, file_info in enumerate(file_list):
                     # 处理文件列表可能是字符串列表的情况
                     if isinstance(file_info, str):
                         filename = file_info
@@ -1246,67 +1416,31 @@ def postVideo():
                         file_id = None
                         real_filename = filename
                     
-                    # 插入发布任务记录
+                    # 插入发布任务记录，每个(文件, 账号)是一个独立的队列单元
+                    payload = build_payload(filename, account_file, file_type, title, text, tags, thumbnail_path, location, publish_dates[file_index])
+                    group_key = new_group_key(task_id)
                     cursor.execute('''
                         INSERT INTO publish_task_records (
                             task_id, filename, file_id, account_id, account_name, 
-                            platform_name, platform_type, status
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            platform_name, platform_type, status, group_key, fallback_group, payload
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ''', [
                         task_id, real_filename, file_id, account_file, account_name, 
-                        platform, type, '发布中'
+                        platform, type, STATUS_PENDING, group_key, group_key, payload
                     ])
             
             conn.commit()
 
-        # 调用post_file函数并获取返回值
-        result = post_file(platform, account_list, file_type, file_list, title, text, tags, thumbnail_path, location, enableTimer, videos_per_day, daily_times,start_days)
-        
-        # 更新发布任务记录状态
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            
-            # 根据发布结果更新状态
-            status = '发布成功' if result else '发布失败'
-            cursor.execute('''
-                UPDATE publish_task_records 
-                SET status = ?, update_time = CURRENT_TIMESTAMP 
-                WHERE task_id = ?
-            ''', [status, task_id])
-            
-            conn.commit()
-        
-        # 根据返回值返回不同的响应
-        if result:
-            return jsonify(
-                {
-                    "code": 200,
-                    "msg": "发布成功",
-                    "data": None
-                }), 200
-        else:
-            return jsonify(
-                {
-                    "code": 500,
-                    "msg": "发布失败",
-                    "data": None
-                }), 500
+        # 唤醒后台worker执行发布，接口立即返回任务ID
+        notify_publish_queue()
+        return jsonify(
+            {
+                "code": 200,
+                "msg": "发布任务已提交",
+                "data": {"taskId": task_id}
+            }), 200
     except Exception as e:
-        # 捕获所有异常，更新发布任务记录状态
-        print(f"发布视频时发生异常: {str(e)}")
-        
-        # 更新发布任务记录状态为发布失败，并添加错误信息
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE publish_task_records 
-                SET status = ?, error_msg = ?, update_time = CURRENT_TIMESTAMP 
-                WHERE task_id = ?
-            ''', ['发布失败', str(e), task_id])
-            
-            conn.commit()
-        
+        print(f"提交发布任务时发生异常: {str(e)}")
         return jsonify(
             {
                 "code": 500,
@@ -1355,7 +1489,7 @@ def post_videos_to_multiple_platforms():
         # 修复Account Files：过滤每个平台的账号文件，只保留对应类型的文件
         # 1. 获取所有账号的实际类型映射
         file_type_map = {}
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT filePath, type FROM user_info")
             rows = cursor.fetchall()
@@ -1385,123 +1519,87 @@ def post_videos_to_multiple_platforms():
         
         # 生成唯一任务ID
         task_id = str(uuid.uuid4())
+        # 每个文件对应的发布时间
+        publish_dates = generate_publish_dates(len(files), enable_timer == 1, videos_per_day, daily_times, start_days)
         
-        # 创建发布任务记录
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            conn.row_factory = sqlite3.Row
+        # 创建发布任务记录，写入发布队列
+        with get_connection() as conn:
             cursor = conn.cursor()
             
+            # 查询账号名称
+            account_names = {}
+            for account_files_list in account_files.values():
+                for account_file in account_files_list:
+                    if account_file not in account_names:
+                        cursor.execute('SELECT userName FROM user_info WHERE filePath = ?', [account_file])
+                        result = cursor.fetchone()
+                        account_names[account_file] = result['userName'] if result else account_file.split('.')[0]
+            
             # 遍历每个平台
             for platform in platforms:
                 platform_name = platform
-                if platform_name in account_files:
-                    account_files_list = account_files[platform_name]
-                    
-                    # 获取平台类型
-                    platform_type = get_type_by_platform_key(platform)
-                    if platform_type is None:
-                        continue
+                if platform_name not in account_files:
+                    continue
+                account_files_list = account_files[platform_name]
+                
+                # 获取平台类型
+                platform_type = get_type_by_platform_key(platform)
+                if platform_type is None:
+                    continue
+                
+                # 遍历每个文件，同一(文件, 平台)的所有账号记录组成一个队列单元，按顺序尝试账号
+                for file_index, filename in enumerate(files):
+                    # 解析文件名，提取文件ID和真正的文件名
+                    # 格式：file_id_filename.ext -> file_id: file_id, filename: filename.ext
+                    if '_' in filename:
+                        parts = filename.split('_')
+                        file_id = parts[0]
+                        real_filename = '_'.join(parts[1:])
+                    else:
+                        file_id = None
+                        real_filename = filename
                     
-                    # 遍历每个账号文件
+                    group_key = new_group_key(task_id)
                     for account_file in account_files_list:
-                        # 从数据库中查询账号名称
-                        cursor.execute('SELECT userName FROM user_info WHERE filePath = ?', [account_file])
-                        result = cursor.fetchone()
-                        account_name = result['userName'] if result else account_file.split('.')[0]
-                        
-                        # 遍历每个文件
-                        for filename in files:
-                            # 解析文件名，提取文件ID和真正的文件名
-                            # 格式：file_id_filename.ext -> file_id: file_id, filename: filename.ext
-                            if '_' in filename:
-                                parts = filename.split('_')
-                                file_id = parts[0]
-                                real_filename = '_'.join(parts[1:])
-                            else:
-                                file_id = None
-                                real_filename = filename
-                            
-                            # 插入发布任务记录
-                            cursor.execute('''
-                                INSERT INTO publish_task_records (
-                                    task_id, filename, file_id, account_id, account_name, 
-                                    platform_name, platform_type, status
-                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                            ''', [
-                                task_id, real_filename, file_id, account_file, account_name, 
-                                platform_name, platform_type, '待发布'
-                            ])
+                        # 插入发布任务记录
+                        payload = build_payload(filename, account_file, file_type, title, text, tags, thumbnail_path, location, publish_dates[file_index])
+                        cursor.execute('''
+                            INSERT INTO publish_task_records (
+                                task_id, filename, file_id, account_id, account_name, 
+                                platform_name, platform_type, status, group_key, fallback_group, payload
+                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', [
+                            task_id, real_filename, file_id, account_file, account_names[account_file], 
+                            platform_name, platform_type, STATUS_PENDING, group_key, group_key, payload
+                        ])
             
             conn.commit()
         
-        # 调用批量发布函数
-        if enable_timer == 1:
-            enable_timer = True
-        else:
-            enable_timer = False
-        
-        result = post_multiple_files_to_multiple_platforms(
-            platforms=platforms,
-            account_files=account_files,
-            file_type=file_type,
-            files=files,
-            title=title,
-            text=text,
-            tags=tags,
-            thumbnail_path=thumbnail_path,
-            location=location,
-            enableTimer=enable_timer,
-            videos_per_day=videos_per_day,
-            daily_times=daily_times,
-            start_days=start_days
-        )
-        
-        # 更新发布任务记录状态
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            
-            # 遍历每个平台的发布结果，更新对应的任务记录状态
-            for platform, platform_result in result.items():
-                if platform_result and "success" in platform_result:
-                    # 根据发布结果更新状态
-                    # 这里简化处理：如果该平台有成功发布的文件，则将该平台的所有任务记录标记为发布成功
-                    # 否则标记为发布失败
-                    status = '发布成功' if platform_result["success"] > 0 else '发布失败'
-                    cursor.execute('''
-                        UPDATE publish_task_records 
-                        SET status = ?, update_time = CURRENT_TIMESTAMP 
-                        WHERE task_id = ? AND platform_name = ?
-                    ''', [status, task_id, platform])
-            
-            conn.commit()
-        
-        # 返回响应给客户端
+        # 唤醒后台worker执行发布，接口立即返回任务ID
+        notify_publish_queue()
         return jsonify({
             "code": 200,
-            "msg": "发布任务已完成",
-            "data": result
+            "msg": "发布任务已提交",
+            "data": {"taskId": task_id}
         }), 200
         
     except Exception as e:
-        print(f"发布视频到多个平台时出错: {str(e)}")
-        
-        # 更新发布任务记录状态为发布失败，并添加错误信息
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE publish_task_records 
-                SET status = ?, error_msg = ?, update_time = CURRENT_TIMESTAMP 
-                WHERE task_id = ?
-            ''', ['发布失败', str(e), task_id])
-            
-            conn.commit()
-            
+        print(f"提交多平台发布任务时出错: {str(e)}")
         return jsonify({
             "code": 500,
             "msg": f"发布视频到多个平台失败: {str(e)}",
             "data": None
         }), 500
 
+# 升级数据库结构并执行启动检查，然后启动后台发布worker、素材处理任务和账号巡检
+try:
+    for problem in migrate_database():
+        print(f"⚠️ 数据库检查: {problem}")
+    start_publish_workers()
+    start_media_workers()
+    start_account_sweeper()
+except Exception as e:
+    print(f"启动发布队列失败: {str(e)}")
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0' ,port=5409)
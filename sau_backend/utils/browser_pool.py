@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+进程级共享的Chromium浏览器池
+
+所有浏览器相关的协程都运行在同一个常驻事件循环(browser loop)上，
+浏览器实例在多次上传之间保持热启动，每个账号分配一个独立的BrowserContext。
+"""
+import asyncio
+import atexit
+import threading
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from conf import BROWSER_POOL_SIZE, BROWSER_POOL_MAX_CONTEXTS, BROWSER_POOL_RECYCLE_AFTER
+from utils.log import create_logger
+
+logger = create_logger('browser_pool', 'logs/browser_pool.log')
+
+# 常驻事件循环及其线程
+_browser_loop = None
+_browser_loop_thread = None
+_browser_loop_lock = threading.Lock()
+
+# 浏览器池注册表，key为(事件循环, headless, executable_path)
+_pools = {}
+
+
+def get_browser_loop():
+    """
+    获取(必要时创建)运行浏览器任务的常驻事件循环
+    """
+    global _browser_loop, _browser_loop_thread
+    with _browser_loop_lock:
+        if _browser_loop is None or _browser_loop.is_closed():
+            _browser_loop = asyncio.new_event_loop()
+            _browser_loop_thread = threading.Thread(
+                target=_browser_loop.run_forever,
+                name="browser-pool-loop",
+                daemon=True
+            )
+            _browser_loop_thread.start()
+        return _browser_loop
+
+
+def submit_to_browser_loop(coro):
+    """
+    将协程提交到浏览器事件循环执行
+    :return: concurrent.futures.Future
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_browser_loop())
+
+
+def run_in_browser_loop(coro, timeout=None):
+    """
+    在浏览器事件循环中执行协程，并阻塞等待结果（供同步代码调用）
+    """
+    loop = get_browser_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        raise RuntimeError("run_in_browser_loop 不能在浏览器事件循环内部调用，请直接 await")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+
+class _PooledBrowser(object):
+    """
+    浏览器池中的单个浏览器实例
+    """
+
+    def __init__(self, browser):
+        self.browser = browser
+        # 当前正在使用的上下文数量
+        self.active = 0
+        # 累计分配过的上下文数量
+        self.served = 0
+        # 是否已标记为待回收（不再分配新上下文）
+        self.retired = False
+
+    @property
+    def healthy(self):
+        return not self.retired and self.browser.is_connected()
+
+
+class BrowserPool(object):
+    """
+    浏览器池参数说明：
+    size: 最多同时保持的浏览器实例数量
+    max_contexts: 单个浏览器同时打开的上下文数量上限
+    recycle_after: 单个浏览器累计分配多少个上下文后回收重启
+    headless: 是否无头模式
+    executable_path: 本地Chrome路径，为空时使用Playwright自带的Chromium
+    launch_args: 浏览器启动参数
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_contexts=BROWSER_POOL_MAX_CONTEXTS,
+                 recycle_after=BROWSER_POOL_RECYCLE_AFTER, headless=True, executable_path=None, launch_args=None):
+        self.size = size
+        self.max_contexts = max_contexts
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.executable_path = executable_path or None
+        self.launch_args = launch_args or []
+        self._playwright = None
+        self._browsers = []
+        self._lock = asyncio.Lock()
+        # 整个池可同时分配的上下文数量
+        self._slots = asyncio.Semaphore(size * max_contexts)
+        self._closed = False
+
+    async def _ensure_playwright(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return self._playwright
+
+    async def _launch(self):
+        playwright = await self._ensure_playwright()
+        browser = await playwright.chromium.launch(
+            headless=self.headless,
+            executable_path=self.executable_path,
+            args=self.launch_args
+        )
+        pooled = _PooledBrowser(browser)
+        browser.on("disconnected", lambda _: self._on_disconnected(pooled))
+        self._browsers.append(pooled)
+        logger.info(f"浏览器池启动新浏览器，当前实例数: {len(self._browsers)}")
+        return pooled
+
+    def _on_disconnected(self, pooled):
+        pooled.retired = True
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+            logger.warning(f"浏览器实例已断开，已从池中移除，当前实例数: {len(self._browsers)}")
+
+    async def _close_browser(self, pooled):
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"关闭浏览器实例失败: {str(e)}")
+
+    async def health_check(self):
+        """
+        健康检查：移除已断开连接的浏览器，关闭空闲的待回收浏览器
+        """
+        for pooled in list(self._browsers):
+            if not pooled.browser.is_connected():
+                self._on_disconnected(pooled)
+            elif pooled.retired and pooled.active == 0:
+                await self._close_browser(pooled)
+
+    async def _acquire_browser(self):
+        """
+        选择负载最低的健康浏览器，必要时启动新浏览器
+        调用前必须已获得一个上下文槽位
+        """
+        async with self._lock:
+            await self.health_check()
+            candidates = [b for b in self._browsers if b.healthy and b.active < self.max_contexts]
+            if candidates:
+                pooled = min(candidates, key=lambda b: b.active)
+            else:
+                # 没有可用浏览器（未启动、已满或都在等待回收），启动新浏览器
+                # 上下文槽位保证了同时活跃的浏览器数量不会长期超过size
+                pooled = await self._launch()
+            pooled.active += 1
+            pooled.served += 1
+            if self.recycle_after and pooled.served >= self.recycle_after:
+                pooled.retired = True
+            return pooled
+
+    async def _release_browser(self, pooled):
+        async with self._lock:
+            pooled.active -= 1
+            if pooled.retired and pooled.active == 0:
+                logger.info(f"浏览器实例已分配 {pooled.served} 个上下文，回收重启")
+                await self._close_browser(pooled)
+
+    @asynccontextmanager
+    async def new_context(self, **context_options):
+        """
+        从池中获取一个新的浏览器上下文，退出时自动关闭上下文并归还槽位
+        用法：
+            async with pool.new_context(storage_state=account_file) as context:
+                ...
+        """
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+        await self._slots.acquire()
+        pooled = None
+        context = None
+        try:
+            pooled = await self._acquire_browser()
+            context = await pooled.browser.new_context(**context_options)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f"关闭浏览器上下文失败: {str(e)}")
+            if pooled is not None:
+                await self._release_browser(pooled)
+            self._slots.release()
+
+    def stats(self):
+        """
+        获取浏览器池状态
+        """
+        return {
+            "browsers": len(self._browsers),
+            "active_contexts": sum(b.active for b in self._browsers),
+            "served_contexts": [b.served for b in self._browsers],
+            "size": self.size,
+            "max_contexts": self.max_contexts,
+            "recycle_after": self.recycle_after,
+        }
+
+    async def close(self):
+        """
+        关闭池中所有浏览器及Playwright实例
+        """
+        self._closed = True
+        async with self._lock:
+            for pooled in list(self._browsers):
+                await self._close_browser(pooled)
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception as e:
+                    logger.warning(f"停止Playwright失败: {str(e)}")
+                self._playwright = None
+
+
+def get_browser_pool(headless=True, executable_path=None, launch_args=None):
+    """
+    获取当前事件循环中与启动参数对应的浏览器池（不存在则创建）
+    必须在事件循环内调用，推荐通过 run_in_browser_loop 在常驻事件循环中使用，
+    这样浏览器实例可以在多次上传之间复用。
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, headless, executable_path or None)
+    pool = _pools.get(key)
+    if pool is None or pool._closed:
+        pool = BrowserPool(headless=headless, executable_path=executable_path, launch_args=launch_args)
+        _pools[key] = pool
+    return pool
+
+
+async def close_browser_pools():
+    """
+    关闭当前事件循环中的所有浏览器池
+    """
+    loop = asyncio.get_running_loop()
+    for key in [k for k in _pools if k[0] is loop]:
+        pool = _pools.pop(key)
+        await pool.close()
+
+
+def _shutdown_browser_loop():
+    """
+    进程退出时关闭常驻事件循环中的浏览器
+    """
+    loop = _browser_loop
+    if loop is None or loop.is_closed() or not loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(close_browser_pools(), loop).result(10)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+
+
+atexit.register(_shutdown_browser_loop)
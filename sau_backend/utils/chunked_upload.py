@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+分片断点续传上传
+
+上传流程：
+    1. init：登记上传会话，返回upload_id和建议的分片大小
+    2. 按顺序PUT分片：请求体直接流式写入 videoFile/.uploads/<upload_id>.part 的指定偏移，
+       边写边计算sha256并与客户端提供的校验值比对，不一致时回滚本分片
+    3. 断线后通过status查询已接收的字节数，从该偏移继续上传
+    4. complete：校验大小后按内容hash登记到素材库（见 utils/file_library.py）
+会话状态保存在 upload_sessions 表中，进程重启后仍可续传。
+整个文件的sha256随分片写入增量计算，进程重启后丢失的部分在complete时从临时文件补算。
+"""
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from conf import UPLOAD_CHUNK_SIZE, UPLOAD_SESSION_EXPIRE_HOURS
+from utils.db import get_connection
+from utils.file_library import PART_DIR, STREAM_BUFFER_SIZE, add_file, hash_file
+
+SESSION_UPLOADING = 'uploading'
+SESSION_COMPLETED = 'completed'
+
+# 同一会话的分片串行写入
+_session_locks = {}
+_session_locks_guard = threading.Lock()
+# 整个文件的增量sha256：upload_id -> (已计算的字节数, hash对象)
+_file_digests = {}
+
+
+class ChunkUploadError(Exception):
+    """
+    分片上传错误，status_code为建议返回的HTTP状态码，data为附加信息
+    """
+
+    def __init__(self, msg, status_code=400, data=None):
+        super().__init__(msg)
+        self.msg = msg
+        self.status_code = status_code
+        self.data = data
+
+
+def _session_lock(upload_id):
+    with _session_locks_guard:
+        return _session_locks.setdefault(upload_id, threading.Lock())
+
+
+def _part_path(upload_id):
+    return Path(PART_DIR / f"{upload_id}.part")
+
+
+def _safe_filename(filename):
+    # 只保留文件名部分，防止路径穿越
+    filename = os.path.basename(str(filename).replace('\\', '/')).strip()
+    if not filename or filename in ('.', '..'):
+        raise ChunkUploadError("文件名无效")
+    return filename
+
+
+def _get_session(conn, upload_id):
+    session = conn.execute('SELECT * FROM upload_sessions WHERE id = ?', [upload_id]).fetchone()
+    if not session:
+        raise ChunkUploadError("上传会话不存在或已过期", 404)
+    return dict(session)
+
+
+def session_status(session):
+    """
+    转换为接口返回的会话状态
+    """
+    return {
+        "uploadId": session['id'],
+        "filename": session['filename'],
+        "size": session['total_size'],
+        "received": session['received'],
+        "chunkSize": session['chunk_size'],
+        "status": session['status'],
+    }
+
+
+def cleanup_expired_sessions():
+    """
+    清理超过有效期仍未完成的上传会话及其临时文件
+    """
+    with get_connection() as conn:
+        rows = conn.execute('''
+            SELECT id FROM upload_sessions
+            WHERE status = ? AND update_time < datetime('now', ?)
+        ''', [SESSION_UPLOADING, f'-{int(UPLOAD_SESSION_EXPIRE_HOURS)} hours']).fetchall()
+        for row in rows:
+            _part_path(row['id']).unlink(missing_ok=True)
+            _file_digests.pop(row['id'], None)
+            conn.execute('DELETE FROM upload_sessions WHERE id = ?', [row['id']])
+
+
+def init_upload(filename, total_size):
+    """
+    创建上传会话并预先创建空的临时文件
+    :return: 会话状态
+    """
+    filename = _safe_filename(filename)
+    try:
+        total_size = int(total_size)
+    except (TypeError, ValueError):
+        raise ChunkUploadError("文件大小无效")
+    if total_size <= 0:
+        raise ChunkUploadError("文件大小无效")
+    cleanup_expired_sessions()
+    upload_id = uuid.uuid4().hex
+    PART_DIR.mkdir(parents=True, exist_ok=True)
+    _part_path(upload_id).touch()
+    _file_digests[upload_id] = (0, hashlib.sha256())
+    with get_connection() as conn:
+        conn.execute('''
+            INSERT INTO upload_sessions (id, filename, total_size, received, chunk_size, status)
+            VALUES (?, ?, ?, 0, ?, ?)
+        ''', [upload_id, filename, total_size, UPLOAD_CHUNK_SIZE, SESSION_UPLOADING])
+        return session_status(_get_session(conn, upload_id))
+
+
+def get_upload_status(upload_id):
+    """
+    查询会话状态，断线后客户端从received偏移继续上传
+    """
+    with get_connection() as conn:
+        return session_status(_get_session(conn, upload_id))
+
+
+def write_chunk(upload_id, offset, stream, content_length, sha256=None):
+    """
+    将请求体流式写入临时文件的offset处
+    :param offset: 分片起始偏移，必须等于已接收字节数
+    :param stream: 请求体流(request.stream)，按块读取，不在内存中缓存整个分片
+    :param content_length: 分片大小
+    :param sha256: 分片sha256十六进制字符串，提供时校验，不一致则回滚本分片
+    :return: 会话状态
+    """
+    if content_length is None or content_length <= 0:
+        raise ChunkUploadError("分片内容为空")
+    with _session_lock(upload_id):
+        with get_connection() as conn:
+            session = _get_session(conn, upload_id)
+        if session['status'] != SESSION_UPLOADING:
+            raise ChunkUploadError("上传会话已完成", 409, session_status(session))
+        if offset != session['received']:
+            # 偏移不连续，返回服务端已接收的字节数供客户端续传
+            raise ChunkUploadError(f"分片偏移不正确，应从 {session['received']} 继续上传", 409, session_status(session))
+        if offset + content_length > session['total_size']:
+            raise ChunkUploadError("分片超出文件大小")
+
+        digest = hashlib.sha256()
+        file_digest = _file_digests.get(upload_id)
+        # 只有已计算的字节数与偏移一致时才能接着计算整个文件的hash
+        file_digest = file_digest[1].copy() if file_digest and file_digest[0] == offset else None
+        written = 0
+        with open(_part_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            try:
+                while written < content_length:
+                    block = stream.read(min(STREAM_BUFFER_SIZE, content_length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    digest.update(block)
+                    if file_digest is not None:
+                        file_digest.update(block)
+                    written += len(block)
+                if written != content_length:
+                    raise ChunkUploadError(f"分片不完整，期望 {content_length} 字节，实际 {written} 字节")
+                if sha256 and digest.hexdigest() != sha256.lower():
+                    raise ChunkUploadError("分片校验失败")
+            except BaseException:
+                # 回滚本分片，下次从原偏移重新上传
+                f.truncate(offset)
+                raise
+        if file_digest is not None:
+            _file_digests[upload_id] = (offset + written, file_digest)
+        else:
+            _file_digests.pop(upload_id, None)
+
+        with get_connection() as conn:
+            conn.execute('''
+                UPDATE upload_sessions SET received = ?, update_time = CURRENT_TIMESTAMP WHERE id = ?
+            ''', [offset + written, upload_id])
+            return session_status(_get_session(conn, upload_id))
+
+
+def complete_upload(upload_id):
+    """
+    完成上传：校验大小，按内容hash登记到素材库
+    :return: (文件记录, 是否为新保存的文件)
+    """
+    with _session_lock(upload_id):
+        with get_connection() as conn:
+            session = _get_session(conn, upload_id)
+        if session['status'] != SESSION_UPLOADING:
+            raise ChunkUploadError("上传会话已完成", 409, session_status(session))
+        if session['received'] != session['total_size']:
+            raise ChunkUploadError(
+                f"文件未上传完整，已接收 {session['received']}/{session['total_size']} 字节", 409, session_status(session)
+            )
+        file_digest = _file_digests.pop(upload_id, None)
+        if file_digest and file_digest[0] == session['total_size']:
+            file_hash = file_digest[1].hexdigest()
+        else:
+            # 进程重启过，从临时文件重新计算
+            file_hash = hash_file(_part_path(upload_id))
+        result = add_file(session['filename'], _part_path(upload_id), file_hash)
+        with get_connection() as conn:
+            conn.execute('''
+                UPDATE upload_sessions SET status = ?, update_time = CURRENT_TIMESTAMP WHERE id = ?
+            ''', [SESSION_COMPLETED, upload_id])
+    with _session_locks_guard:
+        _session_locks.pop(upload_id, None)
+    return result
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite数据访问层
+
+连接由一个有上限的连接池管理（WAL模式、synchronous=NORMAL、busy_timeout、语句缓存），
+线程使用时从池中取出、用完归还，接口请求（每个请求一个新线程）和后台worker都能复用已打开的连接和语句缓存，
+后台发布worker写状态时不会阻塞接口读取。
+
+用法与 sqlite3.connect 的 with 语句一致（退出时提交或回滚），退出最外层with时连接归还连接池：
+    with get_connection() as conn:
+        conn.execute(...)
+同一线程中嵌套使用时复用同一个连接。
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from conf import BASE_DIR, DB_BUSY_TIMEOUT, DB_CACHED_STATEMENTS, DB_POOL_SIZE, DB_POOL_TIMEOUT
+from utils.migrations import check_schema, run_migrations
+
+# trigram分词的最短匹配长度，更短的关键字使用LIKE
+FTS_MIN_KEYWORD_LENGTH = 3
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
+
+# 当前线程已取出的连接：{db_path: [连接, 嵌套层数]}
+_local = threading.local()
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(
+        db_path,
+        timeout=DB_BUSY_TIMEOUT / 1000,
+        cached_statements=DB_CACHED_STATEMENTS,
+        # 连接在线程间复用，同一时刻只被一个线程使用
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT)}")
+    return conn
+
+
+class ConnectionPool(object):
+    """
+    数据库连接池参数说明：
+    db_path: 数据库文件路径
+    size: 最多打开的连接数，连接按需创建
+    timeout: 连接全部被占用时等待空闲连接的时间（秒）
+    """
+
+    def __init__(self, db_path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        取出一个连接：优先使用空闲连接，未达到上限时新建，否则等待其他线程归还
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return _connect(self.db_path)
+            except BaseException:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"等待数据库连接超时（连接池大小 {self.size}）")
+
+    def release(self, conn):
+        """
+        归还连接，未结束的事务先回滚
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """
+        关闭所有空闲连接
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(conn)
+
+
+def _get_pool(db_path):
+    key = str(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+@contextmanager
+def get_connection(db_path=DB_PATH):
+    """
+    从连接池取出数据库连接，退出时提交或回滚，最外层退出时归还连接池
+    同一线程中嵌套调用时复用同一个连接
+    返回的连接默认使用sqlite3.Row，可通过列名或下标访问结果
+    """
+    key = str(db_path)
+    held = getattr(_local, "held", None)
+    if held is None:
+        held = _local.held = {}
+    pool = _get_pool(db_path)
+    entry = held.get(key)
+    if entry is None:
+        entry = held[key] = [pool.acquire(), 0]
+    entry[1] += 1
+    conn = entry[0]
+    try:
+        with conn:
+            yield conn
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del held[key]
+            pool.release(conn)
+
+
+@contextmanager
+def immediate_transaction(db_path=DB_PATH):
+    """
+    以BEGIN IMMEDIATE开启写事务，事务内的读和写不会被其他写入者插入，用于队列认领等原子操作
+    """
+    with get_connection(db_path) as conn:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def close_connection(db_path=DB_PATH):
+    """
+    关闭连接池中的空闲连接
+    """
+    with _pools_lock:
+        pool = _pools.get(str(db_path))
+    if pool is not None:
+        pool.close()
+
+
+def has_table(conn, name):
+    """
+    判断数据表（含虚拟表）是否存在
+    """
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", [name]).fetchone() is not None
+
+
+def build_search_condition(conn, table, columns, keyword):
+    """
+    构建关键字搜索条件：存在FTS5全文索引且关键字长度足够时使用全文索引，否则退化为LIKE
+    :param table: 内容表名，全文索引表为{table}_fts
+    :param columns: 搜索的列
+    :param keyword: 关键字，按子串匹配
+    :return: (条件SQL, 参数列表)
+    """
+    fts_table = f"{table}_fts"
+    if len(keyword) >= FTS_MIN_KEYWORD_LENGTH and has_table(conn, fts_table):
+        # 关键字作为短语查询，双引号转义，限定在指定列中匹配
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        return (f"id IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?)",
+                [f"{{{' '.join(columns)}}} : {phrase}"])
+    return "(" + " OR ".join(f"{column} LIKE ?" for column in columns) + ")", [f"%{keyword}%"] * len(columns)
+
+
+def migrate_database(db_path=DB_PATH):
+    """
+    将数据库结构升级到最新版本并执行启动检查
+    :return: 启动检查发现的问题列表，为空表示检查通过
+    """
+    with get_connection(db_path) as conn:
+        run_migrations(conn)
+        return check_schema(conn)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+素材库文件存储（按内容去重）
+
+上传的文件先流式写入 videoFile/.uploads 下的临时文件，边写边计算sha256，
+写完后按hash在 file_records 中查找：
+    - 已存在相同内容的文件：删除临时文件，新增一条指向已有文件(file_path相同)的记录，并复制已生成的媒体信息
+    - 不存在：移动到 videoFile/{uuid1}_{filename} 并新增记录
+每次上传都有自己的记录和文件名；删除记录时，没有其他记录引用同一文件才删除实际文件。
+"""
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+
+from conf import BASE_DIR
+from utils.db import get_connection, immediate_transaction
+
+VIDEO_DIR = Path(BASE_DIR / "videoFile")
+PART_DIR = Path(VIDEO_DIR / ".uploads")
+# 每次从请求流读取的字节数
+STREAM_BUFFER_SIZE = 64 * 1024
+# 素材库保存的文件名：{uuid1}_{原始文件名}，同一文件名的内容不会变化
+LIBRARY_FILE_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_')
+# 同一文件的多条记录共用的列（文件、封面帧、预览视频、媒体信息）
+SHARED_FILE_COLUMNS = ('filesize', 'file_path', 'hash', 'poster_path', 'preview_path', 'media_status', 'media_error',
+                       'media_type', 'format_name', 'duration', 'width', 'height', 'video_codec', 'audio_codec',
+                       'bit_rate', 'frame_rate', 'probe_inode', 'probe_mtime', 'probe_size')
+
+
+def new_part_path():
+    """
+    生成一个临时文件路径
+    """
+    PART_DIR.mkdir(parents=True, exist_ok=True)
+    return Path(PART_DIR / f"{uuid.uuid4().hex}.part")
+
+
+def save_stream(stream, part_path):
+    """
+    将上传流写入临时文件，同时计算sha256
+    :param stream: 文件流，按块读取，不在内存中缓存整个文件
+    :return: sha256十六进制字符串
+    """
+    digest = hashlib.sha256()
+    with open(part_path, 'wb') as f:
+        while True:
+            block = stream.read(STREAM_BUFFER_SIZE)
+            if not block:
+                break
+            f.write(block)
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_file(file_path):
+    """
+    计算已有文件的sha256
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def add_file(filename, part_path, file_hash):
+    """
+    将临时文件登记到素材库，内容相同的文件只保存一份，每次上传都新增一条记录
+    :param filename: 文件名
+    :param part_path: 已写完的临时文件
+    :param file_hash: 文件sha256
+    :return: (文件记录, 是否为新保存的文件)
+    """
+    part_path = Path(part_path)
+    with immediate_transaction() as conn:
+        record = conn.execute('SELECT id, file_path FROM file_records WHERE hash = ? LIMIT 1', [file_hash]).fetchone()
+        if record:
+            columns = ", ".join(SHARED_FILE_COLUMNS)
+            cursor = conn.execute(f'''
+                INSERT INTO file_records (filename, {columns})
+                SELECT ?, {columns} FROM file_records WHERE id = ?
+            ''', [filename, record['id']])
+            part_path.unlink(missing_ok=True)
+            print(f"✅ 文件内容已存在，新记录引用已有文件: {record['file_path']}")
+            return dict(conn.execute('SELECT * FROM file_records WHERE id = ?', [cursor.lastrowid]).fetchone()), False
+
+        final_filename = f"{uuid.uuid1()}_{filename}"
+        filepath = Path(VIDEO_DIR / final_filename)
+        os.replace(part_path, filepath)
+        try:
+            cursor = conn.execute('''
+                INSERT INTO file_records (filename, filesize, file_path, hash)
+                VALUES (?, ?, ?, ?)
+            ''', (filename, round(float(os.path.getsize(filepath)) / (1024 * 1024), 2), final_filename, file_hash))
+        except BaseException:
+            # 记录写入失败时删除已移动的文件，避免留下没有记录的文件
+            filepath.unlink(missing_ok=True)
+            raise
+        print("✅ 上传文件已记录")
+        return dict(conn.execute('SELECT * FROM file_records WHERE id = ?', [cursor.lastrowid]).fetchone()), True
+
+
+def release_file(file_id):
+    """
+    删除一条文件记录，没有其他记录引用同一文件时删除实际文件
+    :return: (文件记录, 仍引用该文件的记录数)，记录不存在时返回 (None, 0)
+    """
+    with immediate_transaction() as conn:
+        record = conn.execute('SELECT * FROM file_records WHERE id = ?', [file_id]).fetchone()
+        if not record:
+            return None, 0
+        record = dict(record)
+        conn.execute('DELETE FROM file_records WHERE id = ?', [file_id])
+        remaining = conn.execute('SELECT COUNT(*) FROM file_records WHERE file_path = ?',
+                                 [record['file_path']]).fetchone()[0]
+    if remaining > 0:
+        print(f"✅ 记录已删除，文件仍被 {remaining} 条记录引用: {record['file_path']}")
+        return record, remaining
+
+    # 记录删除成功后再删除实际文件
+    file_path = Path(VIDEO_DIR / record['file_path'])
+    if file_path.exists():
+        try:
+            file_path.unlink()
+            print(f"✅ 实际文件已删除: {file_path}")
+        except Exception as e:
+            print(f"⚠️ 删除实际文件失败: {e}")
+    else:
+        print(f"⚠️ 实际文件不存在: {file_path}")
+    # 同时删除后台生成的封面帧和预览视频
+    for derived in (record.get('poster_path'), record.get('preview_path')):
+        if derived:
+            Path(VIDEO_DIR / derived).unlink(missing_ok=True)
+    return record, 0
+
+
+def is_immutable_file(filename):
+    """
+    是否为素材库保存的原始文件（uuid命名且登记在file_records中，内容不会变化，可长期缓存）
+    后台生成的封面帧和预览视频可能被重新生成，不属于此类
+    """
+    if not LIBRARY_FILE_PATTERN.match(filename):
+        return False
+    with get_connection() as conn:
+        return conn.execute('SELECT 1 FROM file_records WHERE file_path = ? LIMIT 1', [filename]).fetchone() is not None
+
+
+def is_part_file(filename):
+    """
+    是否为上传中的临时文件（videoFile/.uploads下）
+    """
+    return Path(VIDEO_DIR / filename).resolve().is_relative_to(PART_DIR.resolve())
+
+
+def get_file_etag(filename):
+    """
+    获取素材文件的强ETag：有内容hash时直接使用hash，否则由inode、修改时间和大小组成
+    :return: ETag字符串，文件不存在时返回None
+    """
+    file_path = Path(VIDEO_DIR / filename)
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return None
+    with get_connection() as conn:
+        row = conn.execute('SELECT hash FROM file_records WHERE file_path = ?', [filename]).fetchone()
+    if row and row['hash']:
+        return row['hash']
+    return f"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
@@ -1,8 +1,13 @@
+import threading
 from pathlib import Path
 from sys import stdout
 from loguru import logger
 
-from conf import BASE_DIR
+from conf import BASE_DIR, LOG_DIAGNOSE
+
+# Registry of bound loggers keyed by (log_name, file_path), each file sink is added only once
+_loggers = {}
+_loggers_lock = threading.Lock()
 
 
 def log_formatter(record: dict) -> str:
@@ -26,16 +31,27 @@ def log_formatter(record: dict) -> str:
 def create_logger(log_name: str, file_path: str):
     """
     Create custom logger for different business modules.
+    The file sink is added on the first call only, later calls return the cached logger,
+    so calling this per upload or per cookie check does not accumulate sinks.
     :param str log_name: name of log
     :param str file_path: Optional path to log file
     :returns: Configured logger
     """
-    def filter_record(record):
-        return record["extra"].get("business_name") == log_name
+    key = (log_name, str(file_path))
+    with _loggers_lock:
+        bound_logger = _loggers.get(key)
+        if bound_logger is not None:
+            return bound_logger
+
+        def filter_record(record):
+            return record["extra"].get("business_name") == log_name
 
-    Path(BASE_DIR / file_path).parent.mkdir(exist_ok=True)
-    logger.add(Path(BASE_DIR / file_path), filter=filter_record, level="INFO", rotation="10 MB", retention="10 days", backtrace=True, diagnose=True)
-    return logger.bind(business_name=log_name)
+        Path(BASE_DIR / file_path).parent.mkdir(exist_ok=True)
+        # enqueue: write in a background thread so logging never blocks the caller on file I/O
+        logger.add(Path(BASE_DIR / file_path), filter=filter_record, level="INFO", rotation="10 MB", retention="10 days",
+                   enqueue=True, backtrace=True, diagnose=LOG_DIAGNOSE)
+        bound_logger = _loggers[key] = logger.bind(business_name=log_name)
+        return bound_logger
 
 
 # Remove all existing handlers
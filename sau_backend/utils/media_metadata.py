@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+素材媒体信息缓存
+
+用ffprobe读取容器和流信息（不解码），结果缓存在 file_records 的媒体信息列中，
+并记录探测时文件的inode、修改时间和大小，文件未变化时直接读取缓存，变化后在下次读取时重新探测。
+未安装ffprobe或探测失败时按文件后缀判断类型，不写入缓存。
+"""
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+from conf import FFPROBE_PATH
+from utils.db import get_connection
+from utils.file_library import VIDEO_DIR
+
+# 媒体类型
+MEDIA_TYPE_IMAGE = 'image'
+MEDIA_TYPE_VIDEO = 'video'
+MEDIA_TYPE_AUDIO = 'audio'
+
+# 发布接口的文件类型：1 图文，2 视频
+FILE_TYPES = {MEDIA_TYPE_IMAGE: 1, MEDIA_TYPE_VIDEO: 2}
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp')
+VIDEO_SUFFIXES = ('.mp4', '.mov', '.flv', '.f4v', '.mkv', '.rm', '.rmvb', '.m4v', '.mpg', '.mpeg', '.ts')
+# ffprobe识别为图片的容器格式
+IMAGE_FORMATS = ('image2', 'png_pipe', 'jpeg_pipe', 'webp_pipe', 'bmp_pipe', 'gif')
+
+# 缓存在file_records中的媒体信息列
+METADATA_COLUMNS = ('media_type', 'format_name', 'duration', 'width', 'height',
+                    'video_codec', 'audio_codec', 'bit_rate', 'frame_rate')
+PROBE_TIMEOUT = 30
+
+
+def _to_number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _frame_rate(value):
+    # ffprobe的帧率为分数形式，如 30000/1001
+    if not value or '/' not in value:
+        return _to_number(value)
+    num, den = value.split('/', 1)
+    num, den = _to_number(num), _to_number(den)
+    return round(num / den, 3) if num and den else None
+
+
+def suffix_media_type(file_path):
+    """
+    按文件后缀判断媒体类型
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix in IMAGE_SUFFIXES:
+        return MEDIA_TYPE_IMAGE
+    if suffix in VIDEO_SUFFIXES:
+        return MEDIA_TYPE_VIDEO
+    return None
+
+
+def probe_media(file_path):
+    """
+    调用ffprobe读取容器和流信息
+    :return: 媒体信息字典，键为METADATA_COLUMNS
+    """
+    result = subprocess.run(
+        [FFPROBE_PATH, '-v', 'error', '-show_format', '-show_streams', '-of', 'json', str(file_path)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT
+    )
+    if result.returncode != 0:
+        stderr = result.stderr.decode('utf-8', errors='replace').strip().splitlines()
+        raise RuntimeError(stderr[-1] if stderr else f"ffprobe 退出码 {result.returncode}")
+    info = json.loads(result.stdout or b'{}')
+    fmt = info.get('format', {})
+    streams = info.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    format_name = fmt.get('format_name') or ''
+    if set(format_name.split(',')) & set(IMAGE_FORMATS):
+        media_type = MEDIA_TYPE_IMAGE
+    elif video:
+        media_type = MEDIA_TYPE_VIDEO
+    elif audio:
+        media_type = MEDIA_TYPE_AUDIO
+    else:
+        media_type = None
+
+    return {
+        'media_type': media_type,
+        'format_name': format_name or None,
+        'duration': _to_number(fmt.get('duration')) if media_type != MEDIA_TYPE_IMAGE else None,
+        'width': video.get('width') if video else None,
+        'height': video.get('height') if video else None,
+        'video_codec': video.get('codec_name') if video else None,
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'bit_rate': _to_number(fmt.get('bit_rate'), int),
+        'frame_rate': _frame_rate(video.get('avg_frame_rate')) if video and media_type == MEDIA_TYPE_VIDEO else None,
+    }
+
+
+def get_media_info(file_path):
+    """
+    获取媒体信息：素材库中的文件未变化时读取缓存，否则重新探测并更新缓存
+    :param file_path: 文件路径（videoFile下的文件可以只传文件名）
+    :return: 媒体信息字典，探测失败时只包含按后缀判断的media_type
+    """
+    file_path = Path(file_path)
+    if not file_path.is_absolute():
+        file_path = Path(VIDEO_DIR / file_path)
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return {'media_type': suffix_media_type(file_path)}
+
+    record = None
+    if file_path.parent == VIDEO_DIR:
+        with get_connection() as conn:
+            record = conn.execute('SELECT * FROM file_records WHERE file_path = ?', [file_path.name]).fetchone()
+    if record and (record['probe_inode'], record['probe_mtime'], record['probe_size']) == \
+            (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+        return {column: record[column] for column in METADATA_COLUMNS}
+
+    if not shutil.which(FFPROBE_PATH):
+        return {'media_type': suffix_media_type(file_path)}
+    try:
+        info = probe_media(file_path)
+    except Exception as e:
+        print(f"⚠️ 读取媒体信息失败: {file_path.name}: {str(e)}")
+        return {'media_type': suffix_media_type(file_path)}
+
+    if record:
+        assignments = ", ".join(f"{column} = ?" for column in METADATA_COLUMNS)
+        with get_connection() as conn:
+            conn.execute(
+                f"UPDATE file_records SET {assignments}, probe_inode = ?, probe_mtime = ?, probe_size = ? WHERE file_path = ?",
+                [*(info[column] for column in METADATA_COLUMNS), stat.st_ino, stat.st_mtime_ns, stat.st_size,
+                 file_path.name]
+            )
+    return info
+
+
+def get_file_type(file_path):
+    """
+    获取发布接口的文件类型：1 图文，2 视频，不支持的文件返回None
+    """
+    return FILE_TYPES.get(get_media_info(file_path).get('media_type'))
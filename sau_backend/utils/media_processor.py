@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+素材后台处理
+
+文件保存到素材库后提交到后台线程池，每个任务调用ffprobe/ffmpeg子进程：
+    - 读取媒体信息（时长、分辨率、编码等，见 utils/media_metadata.py）
+    - 截取封面帧：videoFile/{file_path}.poster.jpg，发布时未指定封面则默认使用
+    - 生成低码率预览：videoFile/{file_path}.preview.mp4，素材库页面预览时使用
+结果写入引用该文件的所有 file_records 记录的 poster_path、preview_path、media_status 列。
+
+转码在ffmpeg子进程中进行，已经与Flask进程隔离，线程池中的线程只负责等待子进程和写数据库，
+因此使用线程池而不是进程池：不需要序列化任务参数，也能直接使用连接池和配置，并发数由 MEDIA_PROCESS_WORKERS 限制。
+"""
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from conf import FFMPEG_PATH, MEDIA_PREVIEW_BITRATE, MEDIA_PREVIEW_HEIGHT, MEDIA_PROCESS_TIMEOUT, MEDIA_PROCESS_WORKERS
+from utils.db import get_connection
+from utils.file_library import VIDEO_DIR
+from utils.media_metadata import MEDIA_TYPE_VIDEO, get_media_info
+
+# 处理状态
+MEDIA_PENDING = 'pending'
+MEDIA_PROCESSING = 'processing'
+MEDIA_DONE = 'done'
+MEDIA_FAILED = 'failed'
+MEDIA_SKIPPED = 'skipped'
+
+POSTER_SUFFIX = '.poster.jpg'
+PREVIEW_SUFFIX = '.preview.mp4'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MEDIA_PROCESS_WORKERS, thread_name_prefix="media-worker")
+        return _executor
+
+
+def _run(args):
+    """
+    执行ffmpeg子进程，失败时抛出带stderr最后一行的异常
+    """
+    result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=MEDIA_PROCESS_TIMEOUT)
+    if result.returncode != 0:
+        stderr = result.stderr.decode('utf-8', errors='replace').strip().splitlines()
+        raise RuntimeError(stderr[-1] if stderr else f"{args[0]} 退出码 {result.returncode}")
+    return result.stdout
+
+
+def extract_poster(file_path, poster_path, duration=None):
+    """
+    截取一帧作为封面，视频较短时取中间帧
+    """
+    seek = min(1.0, duration / 2) if duration else 0
+    tmp_path = poster_path.with_name(poster_path.name + '.tmp')
+    _run([FFMPEG_PATH, '-y', '-v', 'error', '-ss', f"{seek:.3f}", '-i', str(file_path),
+          '-frames:v', '1', '-vf', f"scale=-2:'min({MEDIA_PREVIEW_HEIGHT * 2},ih)'", '-f', 'image2', str(tmp_path)])
+    os.replace(tmp_path, poster_path)
+
+
+def make_preview(file_path, preview_path):
+    """
+    生成低分辨率、低码率的预览视频，moov前置以便边下边播
+    """
+    tmp_path = preview_path.with_name(preview_path.name + '.tmp')
+    _run([FFMPEG_PATH, '-y', '-v', 'error', '-i', str(file_path),
+          '-vf', f"scale=-2:'min({MEDIA_PREVIEW_HEIGHT},ih)'",
+          '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', MEDIA_PREVIEW_BITRATE,
+          '-maxrate', MEDIA_PREVIEW_BITRATE, '-bufsize', MEDIA_PREVIEW_BITRATE,
+          '-c:a', 'aac', '-b:a', '64k', '-movflags', '+faststart', '-f', 'mp4', str(tmp_path)])
+    os.replace(tmp_path, preview_path)
+
+
+def _update(file_id, **columns):
+    # 内容相同的多条记录共用同一个文件，处理结果写入所有引用该文件的记录
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    with get_connection() as conn:
+        conn.execute(f'''
+            UPDATE file_records SET {assignments}
+            WHERE file_path = (SELECT file_path FROM file_records WHERE id = ?)
+        ''', [*columns.values(), file_id])
+
+
+def process_file(file_id):
+    """
+    处理一个素材文件：媒体信息、封面帧、预览视频
+    """
+    with get_connection() as conn:
+        record = conn.execute('SELECT * FROM file_records WHERE id = ?', [file_id]).fetchone()
+    if not record:
+        return
+    file_path = Path(VIDEO_DIR / record['file_path'])
+    # 读取并缓存媒体信息
+    info = get_media_info(file_path)
+    if info.get('media_type') != MEDIA_TYPE_VIDEO:
+        _update(file_id, media_status=MEDIA_SKIPPED)
+        return
+    if not shutil.which(FFMPEG_PATH) or info.get('format_name') is None:
+        _update(file_id, media_status=MEDIA_FAILED, media_error="未找到ffmpeg/ffprobe或无法读取媒体信息")
+        return
+
+    _update(file_id, media_status=MEDIA_PROCESSING, media_error=None)
+    try:
+        poster_name = record['file_path'] + POSTER_SUFFIX
+        preview_name = record['file_path'] + PREVIEW_SUFFIX
+        extract_poster(file_path, Path(VIDEO_DIR / poster_name), info.get('duration'))
+        make_preview(file_path, Path(VIDEO_DIR / preview_name))
+        _update(file_id, poster_path=poster_name, preview_path=preview_name, media_status=MEDIA_DONE)
+        print(f"✅ 素材处理完成: {record['file_path']}")
+    except Exception as e:
+        print(f"⚠️ 素材处理失败: {record['file_path']}: {str(e)}")
+        _update(file_id, media_status=MEDIA_FAILED, media_error=str(e))
+
+
+def _process_file_safe(file_id):
+    try:
+        process_file(file_id)
+    except Exception as e:
+        print(f"⚠️ 素材处理异常: {file_id}: {str(e)}")
+
+
+def submit_media_job(file_id):
+    """
+    提交素材处理任务到后台线程池
+    """
+    _update(file_id, media_status=MEDIA_PENDING)
+    _get_executor().submit(_process_file_safe, file_id)
+
+
+def start_media_workers():
+    """
+    启动时重新提交上次未处理完的素材
+    """
+    with get_connection() as conn:
+        rows = conn.execute('SELECT MIN(id) AS id FROM file_records WHERE media_status IN (?, ?) GROUP BY file_path',
+                            [MEDIA_PENDING, MEDIA_PROCESSING]).fetchall()
+    for row in rows:
+        _get_executor().submit(_process_file_safe, row['id'])
+    if rows:
+        print(f"✅ 重新提交 {len(rows)} 个未处理完的素材")
+
+
+def get_default_thumbnail(file_path):
+    """
+    获取素材的默认封面（后台生成的封面帧），不存在时返回空字符串
+    :param file_path: videoFile下的文件名
+    """
+    poster_path = Path(VIDEO_DIR / (str(file_path) + POSTER_SUFFIX))
+    return str(poster_path) if poster_path.exists() else ''
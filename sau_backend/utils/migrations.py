@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+数据库版本迁移
+
+基础表由 db/createTable.py 创建，之后的结构变更按版本号登记在 MIGRATIONS 中，
+当前版本记录在 PRAGMA user_version，启动时只执行尚未执行过的迁移，可以原地升级已有的 database.db。
+本模块只依赖sqlite3，db/createTable.py 也可以直接调用。
+"""
+import sqlite3
+
+# 迁移依赖的基础表
+REQUIRED_TABLES = ("user_info", "file_records", "publish_task_records")
+
+
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _add_columns(conn, table, columns):
+    """
+    为表补充缺少的列（已存在的列跳过）
+    """
+    existing = _table_columns(conn, table)
+    for column, column_type in columns:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def _migration_1_publish_queue_columns(conn):
+    """
+    发布队列需要的publish_task_records扩展列
+    """
+    _add_columns(conn, "publish_task_records", [
+        ("group_key", "TEXT"),          # 队列单元标识，group_key相同的记录作为一个job执行
+        ("fallback_group", "TEXT"),     # 创建时的队列单元标识，重试后不变，同组账号互为备选只需一个发布成功
+        ("payload", "TEXT"),            # 发布参数(JSON)
+        ("start_time", "DATETIME"),     # 本条记录开始上传的时间
+        ("finish_time", "DATETIME"),    # 本条记录上传结束的时间
+        ("retry_count", "INTEGER DEFAULT 0"),   # 重试次数
+        ("idempotency_key", "TEXT"),    # 幂等键：记录id+重试次数
+    ])
+
+
+def _migration_2_indexes(conn):
+    """
+    常用查询路径的索引
+    """
+    for sql in (
+        # 发布记录列表：按状态/平台筛选并按创建时间排序
+        "CREATE INDEX IF NOT EXISTS idx_publish_task_records_status_platform_time "
+        "ON publish_task_records(status, platform_name, create_time)",
+        "CREATE INDEX IF NOT EXISTS idx_publish_task_records_status_time "
+        "ON publish_task_records(status, create_time)",
+        "CREATE INDEX IF NOT EXISTS idx_publish_task_records_platform_time "
+        "ON publish_task_records(platform_name, create_time)",
+        "CREATE INDEX IF NOT EXISTS idx_publish_task_records_create_time "
+        "ON publish_task_records(create_time)",
+        # 按任务ID查询/取消整个任务
+        "CREATE INDEX IF NOT EXISTS idx_publish_task_records_task_id "
+        "ON publish_task_records(task_id)",
+        # 发布队列按group_key认领job
+        "CREATE INDEX IF NOT EXISTS idx_publish_task_records_group_status "
+        "ON publish_task_records(group_key, status)",
+        # 按cookie文件查找账号
+        "CREATE INDEX IF NOT EXISTS idx_user_info_file_path ON user_info(filePath)",
+        # 登录时按账号名+平台类型查找账号
+        "CREATE INDEX IF NOT EXISTS idx_user_info_name_type ON user_info(userName, type)",
+    ):
+        conn.execute(sql)
+
+
+def _migration_3_publish_task_stats(conn):
+    """
+    发布记录按(状态, 平台)汇总的数量表，由触发器随记录增删改增量维护，
+    发布记录列表的总数直接从这里读取，不再对整张表COUNT(*)
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS publish_task_stats (
+            status TEXT NOT NULL,
+            platform_name TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (status, platform_name)
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_publish_task_stats_insert
+        AFTER INSERT ON publish_task_records
+        BEGIN
+            INSERT INTO publish_task_stats (status, platform_name, count) VALUES (NEW.status, NEW.platform_name, 1)
+            ON CONFLICT(status, platform_name) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_publish_task_stats_delete
+        AFTER DELETE ON publish_task_records
+        BEGIN
+            UPDATE publish_task_stats SET count = count - 1
+            WHERE status = OLD.status AND platform_name = OLD.platform_name;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_publish_task_stats_update
+        AFTER UPDATE OF status, platform_name ON publish_task_records
+        WHEN OLD.status IS NOT NEW.status OR OLD.platform_name IS NOT NEW.platform_name
+        BEGIN
+            UPDATE publish_task_stats SET count = count - 1
+            WHERE status = OLD.status AND platform_name = OLD.platform_name;
+            INSERT INTO publish_task_stats (status, platform_name, count) VALUES (NEW.status, NEW.platform_name, 1)
+            ON CONFLICT(status, platform_name) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    # 用已有记录初始化汇总数据
+    conn.execute("DELETE FROM publish_task_stats")
+    conn.execute('''
+        INSERT INTO publish_task_stats (status, platform_name, count)
+        SELECT status, platform_name, COUNT(*) FROM publish_task_records GROUP BY status, platform_name
+    ''')
+    # 筛选和分页使用迁移2中的(状态/平台, create_time)索引，不再单独为状态、平台建索引
+
+
+# 全文索引：(内容表, FTS5表, 索引列)
+FTS_TABLES = (
+    ("publish_task_records", "publish_task_records_fts", ("filename", "account_name", "error_msg")),
+    ("file_records", "file_records_fts", ("filename",)),
+)
+
+
+def _create_fts_table(conn, table, fts_table, columns):
+    """
+    创建外部内容FTS5表及同步触发器，并用已有数据重建索引
+    使用trigram分词，支持中文和任意位置的子串匹配
+    """
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"NEW.{column}" for column in columns)
+    old_values = ", ".join(f"OLD.{column}" for column in columns)
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+                 f"{column_list}, content='{table}', content_rowid='id', tokenize='trigram')")
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {fts_table} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF {column_list} ON {table}
+        BEGIN
+            INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+            INSERT INTO {fts_table} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+
+def _missing_fts_tables(conn):
+    return [(table, fts_table, columns) for table, fts_table, columns in FTS_TABLES
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", [fts_table]).fetchone() is None]
+
+
+def ensure_full_text_search(conn):
+    """
+    创建缺少的FTS5全文索引，SQLite未编译FTS5或版本不支持trigram分词时跳过（搜索退化为LIKE）
+    不支持时不记录为已完成，每次启动重新检查，升级SQLite后自动补建
+    :return: 本次创建的FTS表名列表
+    """
+    missing = _missing_fts_tables(conn)
+    if not missing:
+        return []
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(content, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.fts5_probe")
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 当前SQLite不支持FTS5 trigram分词({str(e)})，搜索将使用LIKE")
+        return []
+    for table, fts_table, columns in missing:
+        _create_fts_table(conn, table, fts_table, columns)
+    return [fts_table for _, fts_table, _ in missing]
+
+
+def _migration_4_full_text_search(conn):
+    """
+    发布记录(文件名、账号名、错误信息)和文件库(文件名)的FTS5全文索引
+    SQLite不支持时跳过，之后每次启动由run_migrations重新检查
+    """
+    ensure_full_text_search(conn)
+
+
+def _migration_5_upload_sessions(conn):
+    """
+    分片上传会话表，记录断点续传进度
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,                    -- 上传会话ID
+            filename TEXT NOT NULL,                 -- 原始文件名
+            total_size INTEGER NOT NULL,            -- 文件总大小（字节）
+            received INTEGER NOT NULL DEFAULT 0,    -- 已接收的字节数
+            chunk_size INTEGER NOT NULL,            -- 建议的分片大小（字节）
+            status TEXT NOT NULL,                   -- 会话状态：uploading、completed
+            create_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            update_time DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_status_time ON upload_sessions(status, update_time)")
+
+
+def _migration_6_file_dedup(conn):
+    """
+    素材库按内容去重：相同sha256的上传共用同一个文件(file_path)，每次上传仍保留独立记录，
+    删除记录时按引用同一文件的记录数决定是否删除文件
+    已有记录的hash为空，不参与去重
+    """
+    _add_columns(conn, "file_records", [
+        ("hash", "TEXT"),               # 文件内容sha256
+    ])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_file_records_hash ON file_records(hash)")
+
+
+def _migration_7_file_path_index(conn):
+    """
+    素材预览按文件路径查找记录(ETag)
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_file_records_file_path ON file_records(file_path)")
+
+
+def _migration_8_media_processing(conn):
+    """
+    素材后台处理结果：时长、分辨率、封面帧、预览视频
+    """
+    _add_columns(conn, "file_records", [
+        ("duration", "REAL"),           # 时长（秒）
+        ("width", "INTEGER"),           # 视频宽度
+        ("height", "INTEGER"),          # 视频高度
+        ("poster_path", "TEXT"),        # 封面帧文件名（videoFile下）
+        ("preview_path", "TEXT"),       # 预览视频文件名（videoFile下）
+        ("media_status", "TEXT"),       # 处理状态：pending、processing、done、failed、skipped
+        ("media_error", "TEXT"),        # 处理失败原因
+    ])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_file_records_media_status ON file_records(media_status)")
+
+
+def _migration_9_media_metadata(conn):
+    """
+    素材媒体信息缓存，按探测时文件的inode、修改时间、大小判断缓存是否有效
+    时长、宽高列已在版本8中添加
+    """
+    _add_columns(conn, "file_records", [
+        ("media_type", "TEXT"),         # 媒体类型：image、video、audio
+        ("format_name", "TEXT"),        # 容器格式
+        ("video_codec", "TEXT"),        # 视频编码
+        ("audio_codec", "TEXT"),        # 音频编码
+        ("bit_rate", "INTEGER"),        # 总码率（bit/s）
+        ("frame_rate", "REAL"),         # 平均帧率
+        ("probe_inode", "INTEGER"),     # 探测时文件的inode
+        ("probe_mtime", "INTEGER"),     # 探测时文件的修改时间（纳秒）
+        ("probe_size", "INTEGER"),      # 探测时文件的大小（字节）
+    ])
+
+
+def _migration_10_account_checked_at(conn):
+    """
+    账号有效性缓存：上次检测时间
+    """
+    _add_columns(conn, "user_info", [
+        ("last_checked_at", "DATETIME"),    # 上次检测账号有效性的时间（UTC）
+    ])
+
+
+def _migration_11_account_fail_streak(conn):
+    """
+    账号健康巡检：连续检测失败次数
+    """
+    _add_columns(conn, "user_info", [
+        ("fail_streak", "INTEGER DEFAULT 0"),   # 连续检测失效的次数，检测有效时清零
+    ])
+
+
+# (版本号, 说明, 迁移函数)，版本号必须递增，已发布的迁移不要修改，新的结构变更追加到末尾
+MIGRATIONS = [
+    (1, "发布队列扩展列", _migration_1_publish_queue_columns),
+    (2, "发布记录和账号查询索引", _migration_2_indexes),
+    (3, "发布记录数量汇总表和游标分页索引", _migration_3_publish_task_stats),
+    (4, "发布记录和文件库全文索引", _migration_4_full_text_search),
+    (5, "分片上传会话表", _migration_5_upload_sessions),
+    (6, "素材库内容去重", _migration_6_file_dedup),
+    (7, "素材文件路径索引", _migration_7_file_path_index),
+    (8, "素材封面帧和预览视频", _migration_8_media_processing),
+    (9, "素材媒体信息缓存", _migration_9_media_metadata),
+    (10, "账号有效性检测时间", _migration_10_account_checked_at),
+    (11, "账号连续失效次数", _migration_11_account_fail_streak),
+]
+
+# 最新的数据库版本
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn):
+    """
+    按版本号依次执行尚未执行的迁移，每个迁移在独立事务中执行并更新user_version
+    :param conn: sqlite3连接
+    :return: 本次执行的迁移版本号列表
+    """
+    missing = [table for table in REQUIRED_TABLES if not _table_columns(conn, table)]
+    if missing:
+        raise RuntimeError(f"数据库缺少基础表: {', '.join(missing)}，请先运行 db/createTable.py")
+    if conn.in_transaction:
+        conn.commit()
+    applied = []
+    current = get_schema_version(conn)
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(conn)
+            # PRAGMA不支持参数绑定，版本号为代码中的整数常量
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        print(f"✅ 数据库迁移到版本 {version}: {description}")
+        applied.append(version)
+    # 迁移4在SQLite不支持FTS5时不会创建全文索引，每次启动重新检查并补建
+    if current >= 4 and _missing_fts_tables(conn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            created = ensure_full_text_search(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        if created:
+            print(f"✅ 已补建全文索引: {', '.join(created)}")
+    return applied
+
+
+def check_schema(conn):
+    """
+    启动检查：数据库版本是否为最新、基础表是否存在
+    :return: 问题描述列表，为空表示检查通过
+    """
+    problems = []
+    for table in REQUIRED_TABLES:
+        if not _table_columns(conn, table):
+            problems.append(f"缺少数据表 {table}")
+    version = get_schema_version(conn)
+    if version < LATEST_VERSION:
+        problems.append(f"数据库版本 {version} 低于代码要求的版本 {LATEST_VERSION}")
+    elif version > LATEST_VERSION:
+        problems.append(f"数据库版本 {version} 高于代码支持的版本 {LATEST_VERSION}，请升级代码")
+    return problems
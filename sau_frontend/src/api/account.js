@@ -2,7 +2,7 @@ import { http } from '@/utils/request'
 
 // 账号管理相关API
 export const accountApi = {
-  // 获取有效账号列表（带验证）
+  // 获取账号列表（返回缓存状态，过期的账号在后台重新检测，结果通过 /accountStatusEvents 推送）
   getValidAccounts() {
     return http.get('/getValidAccounts')
   },